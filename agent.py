@@ -1,232 +1,492 @@
-"""
-LangChain Agent for E-commerce Customer Service (using Ollama LLaMA 3.1)
-"""
-
-import os
-import traceback
-from typing import Dict, List, Any
-from dotenv import load_dotenv
-
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain_ollama.llms import OllamaLLM
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferWindowMemory
-from langchain_core.messages import HumanMessage, AIMessage
-from tools import get_tools  # Your custom tools
-
-load_dotenv()
-
-class EcommerceAgent:
-    """E-commerce customer service agent using Ollama (LLaMA 3.1)"""
-
-    def __init__(self):
-        # Initialize Ollama LLM
-        self.llm = self._initialize_llm()
-
-        # Load tools
-        self.tools = get_tools()
-        print("Loaded tools:", [tool.name for tool in self.tools])
-
-        # Memory
-        self.memory = ConversationBufferWindowMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            k=10
-        )
-
-        # Prompt setup
-        self.prompt = self._create_prompt()
-
-        # Agent setup
-        self.agent = create_react_agent(
-            llm=self.llm,
-            tools=self.tools,
-            prompt=self.prompt,
-            verbose=True
-        )
-
-        # Agent executor
-        self.agent_executor = AgentExecutor.from_agent_and_tools(
-            agent=self.agent,
-            tools=self.tools,
-            memory=self.memory,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=5,
-            return_intermediate_steps=True
-        )
-
-    def _initialize_llm(self):
-        """Initialize Ollama LLaMA 3.1"""
-        try:
-            print("Initializing Ollama LLaMA 3.1...")
-
-            llm = OllamaLLM(
-                model="llama3.1",  # Ensure Ollama is running this model
-                temperature=0.2,
-                max_tokens=1024,
-                top_p=0.9,
-                request_timeout=60
-            )
-
-            # Test model connection
-            _ = llm.invoke("Hello")
-            print("✅ Ollama LLaMA 3.1 initialized successfully!")
-
-            return llm
-
-        except Exception as e:
-            raise RuntimeError(f"❌ Failed to initialize Ollama: {e}")
-
-    def _create_prompt(self):
-        """Create the system prompt for the agent"""
-
-        template = """You are an AI customer service representative for an e-commerce platform. Your role is to help customers with their inquiries in a friendly, professional, and efficient manner.
-
-**Your Capabilities:**
-- Check order status, cancel orders, and process returns
-- Search for products and provide detailed product information
-- Access customer information and update preferences
-- Get weather information for shipping estimates
-- Provide product recommendations based on weather or preferences
-- Make autonomous decisions about which tools to use
-- Chain multiple tools together when needed
-
-**Guidelines:**
-1. **Be Proactive**: Anticipate customer needs and offer relevant information
-2. **Be Contextual**: Remember previous conversation context and use it appropriately
-3. **Be Autonomous**: Decide which tools to use based on customer queries without asking for permission
-4. **Be Helpful**: If you can't directly solve a problem, offer alternatives or escalation paths
-5. **Be Professional**: Maintain a friendly, helpful tone while being efficient
-6. **Chain Tools**: Use multiple tools in sequence when it provides better customer service
-
-**Tool Usage Examples:**
-- If a customer asks about an order, check order status and optionally get weather for shipping updates
-- If a customer wants to return something, first check order status, then process the return
-- If a customer asks for product recommendations, consider using weather information to provide seasonal suggestions
-- If updating customer preferences, confirm the changes and suggest relevant products
-
-**Important Notes:**
-- Always prioritize customer satisfaction
-- If you're unsure about something, it's better to ask for clarification than make assumptions
-- When handling cancellations or returns, explain the process clearly
-- Provide order IDs, product IDs, and other reference numbers when relevant
-- Be empathetic when dealing with complaints or issues
-- Always include "Final Answer:" even if tools fail
-- Be helpful and specific
-- If tools fail, provide alternative solutions
-- Never leave customer hanging without a response
-You have access to the following tools:{tools}
-
- IMPORTANT INSTRUCTIONS:\n
- - For simple greetings, questions, or general conversation, respond directly without using tools
- - Only use tools when you need specific information (like product details, order status, etc.)
- - When you don't need tools, just provide a helpful response
-            
-            When you DO need to use tools, follow this format:
-              Thought: [your reasoning about what to do] dont rerun
-              Action: [tool name from: {tool_names}] dont rerun,if missing action , just give the final answer as the thought
-              Final Answer: [your response to the user] 
-            
-            When you DON'T need tools, just respond naturally:
-               Thought: [brief reasoning]
-                Final Answer: [your helpful response]
-            
-                Current conversation:
-            Human: {input}
-            {agent_scratchpad}
-
-if there is a mssing Action , return your thought as the final answer
-Previous conversation history:
-{chat_history}
-
-Question: {input}
-Thought: {agent_scratchpad}"""
-
-        return PromptTemplate(
-            template=template,
-            input_variables=["input", "chat_history", "agent_scratchpad"],
-            partial_variables={
-                "tools": "\n".join([f"{tool.name}: {tool.description}" for tool in self.tools]),
-                "tool_names": ", ".join([tool.name for tool in self.tools])
-            }
-        )
-
-    def process_message(self, message: str, customer_context: Dict[str, Any] = None) -> str:
-        """Process a customer message and return response"""
-        try:
-            enhanced_message = message
-            if customer_context:
-                enhanced_message += f"\nCustomer Context: {customer_context}"
-
-            chat_history = ""
-            for msg in self.memory.chat_memory.messages:
-                if isinstance(msg, HumanMessage):
-                    chat_history += f"Human: {msg.content}\n"
-                elif isinstance(msg, AIMessage):
-                    chat_history += f"AI: {msg.content}\n"
-
-            response = self.agent_executor.invoke({
-                "input": enhanced_message,
-                "chat_history": chat_history
-            })
-
-            self.memory.save_context(
-                {"input": message},
-                {"output": response["output"]}
-            )
-
-            return response["output"]
-
-        except Exception as e:
-            error_msg = f"I apologize, but I encountered an error while processing your request: {str(e)}"
-            print(f"Error details: {traceback.format_exc()}")
-
-            self.memory.save_context(
-                {"input": message},
-                {"output": error_msg}
-            )
-            return error_msg
-
-    def reset_conversation(self):
-        """Reset the conversation memory"""
-        self.memory.clear()
-
-    def get_conversation_history(self) -> List[Dict[str, str]]:
-        """Get the conversation history"""
-        history = []
-        for message in self.memory.chat_memory.messages:
-            if isinstance(message, HumanMessage):
-                history.append({"role": "user", "content": message.content})
-            elif isinstance(message, AIMessage):
-                history.append({"role": "assistant", "content": message.content})
-        return history
-
-    def cleanup(self):
-        """Clean up resources"""
-        print("🧹 Session cleaned up")
-
-
-class CustomerContext:
-    """Manage customer context and session information"""
-
-    def __init__(self):
-        self.sessions = {}
-
-    def get_context(self, session_id: str) -> Dict[str, Any]:
-        return self.sessions.get(session_id, {})
-
-    def update_context(self, session_id: str, context: Dict[str, Any]):
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {}
-        self.sessions[session_id].update(context)
-
-    def set_customer_id(self, session_id: str, customer_id: str):
-        self.update_context(session_id, {"customer_id": customer_id})
-
-    def set_customer_email(self, session_id: str, email: str):
-        self.update_context(session_id, {"customer_email": email})
-
-
-# Global context manager
-customer_context_manager = CustomerContext()
+"""
+LangChain Agent for E-commerce Customer Service (using Ollama LLaMA 3.1)
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+from dotenv import load_dotenv
+
+from langchain.agents import AgentExecutor, create_react_agent, create_tool_calling_agent
+from langchain_core.agents import AgentAction, AgentFinish, AgentStep
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import PrivateAttr
+from conversation_memory import ConversationMemory, llm_summarizer
+from customer_prefetch import CustomerPrefetch, await_prefetch, render_customer_context
+from health import get_ollama_monitor
+from llm import create_chat_llm, create_llm
+from prompts import create_react_prompt, create_tool_calling_prompt
+from react_parser import RecoveringReActParser
+from tools import MUTATING_TOOLS, arun_tools, called_mutating_tool, get_tools  # Your custom tools
+from router import IntentRouter
+from response_cache import get_response_cache
+from metrics import metrics
+
+load_dotenv()
+
+# "react": the model writes Thought/Action text that is parsed; "tools": Ollama's native
+# tool calling, with the tools' args_schema models as function schemas
+AGENT_MODES = ("react", "tools")
+
+def agent_mode() -> str:
+    """The agent mode from AGENT_MODE, "react" by default"""
+    mode = os.getenv("AGENT_MODE", "react").lower()
+    if mode not in AGENT_MODES:
+        raise ValueError(f"AGENT_MODE must be one of {', '.join(AGENT_MODES)}, not {mode!r}")
+    return mode
+
+def build_agent(llm, tools: List, mode: str):
+    """The agent runnable and its prompt for a mode; tools mode brings its own chat model"""
+    if mode == "tools":
+        prompt = create_tool_calling_prompt()
+        return create_tool_calling_agent(create_chat_llm(), tools, prompt), prompt
+    prompt = create_react_prompt()
+    # Common format slips are repaired in the parser instead of costing another generation
+    return create_react_agent(llm=llm, tools=tools, prompt=prompt,
+                              output_parser=RecoveringReActParser(tools)), prompt
+
+class EcommerceAgent:
+    """E-commerce customer service agent using Ollama (LLaMA 3.1)"""
+
+    # LLM, tools and executor are stateless and shared by every session in the process
+    _shared: Optional[Dict[str, Any]] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        shared = self.shared_components()
+        self.llm = shared["llm"]
+        self.tools = shared["tools"]
+        self.prompt = shared["prompt"]
+        self.agent = shared["agent"]
+        self.agent_executor = shared["agent_executor"]
+
+        # Fast path for requests that don't need the LLM
+        self.router = shared["router"]
+        self.response_cache = get_response_cache()
+
+        # Memory is the only per-session state; older turns are summarized to stay within budget
+        summarizer = llm_summarizer(self.llm) if os.getenv("MEMORY_SUMMARIZER", "llm").lower() == "llm" else None
+        self.memory = ConversationMemory(
+            max_tokens=int(os.getenv("MEMORY_TOKEN_BUDGET", "1500")),
+            summarizer=summarizer
+        )
+
+    @classmethod
+    def shared_components(cls) -> Dict[str, Any]:
+        """Get the process-wide LLM, tools, router and executor, building them on first use"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls._build_components()
+            return cls._shared
+
+    @classmethod
+    def _build_components(cls) -> Dict[str, Any]:
+        """Build a new LLM, tool set, prompt and agent executor"""
+        llm = cls._initialize_llm()
+
+        tools = get_tools()
+        print("Loaded tools:", [tool.name for tool in tools])
+
+        agent, prompt = build_agent(llm, tools, agent_mode())
+
+        # No memory on the executor so it can serve concurrent sessions
+        agent_executor = MemoizingAgentExecutor.from_agent_and_tools(
+            agent=agent,
+            tools=tools,
+            verbose=True,
+            handle_parsing_errors=True,
+            max_iterations=5,
+            return_intermediate_steps=True
+        )
+        return {
+            "llm": llm,
+            "tools": tools,
+            "prompt": prompt,
+            "agent": agent,
+            "agent_executor": agent_executor,
+            "router": IntentRouter(tools),
+        }
+
+    @staticmethod
+    def _initialize_llm():
+        """Initialize Ollama LLaMA 3.1; the model loads in the background (see health.py)"""
+        try:
+            print("Initializing Ollama LLaMA 3.1...")
+
+            # See llm.py for the cache-related options
+            llm = create_llm()
+
+            # Warm-up and health probes run in the background instead of blocking on a test generation
+            get_ollama_monitor()
+            print("✅ Ollama LLaMA 3.1 configured, model warming up in the background")
+
+            return llm
+
+        except Exception as e:
+            raise RuntimeError(f"❌ Failed to initialize Ollama: {e}")
+
+    def _fast_answer(self, message: str, customer_context: Dict[str, Any] = None) -> Optional[str]:
+        """Answer from the router or response cache without running the agent"""
+        routed = self.router.route(message, customer_context)
+        if routed is not None or len(self.memory):
+            return routed
+        return self.response_cache.get(message, customer_context)
+
+    def _cache_answer(self, message: str, customer_context: Optional[Dict[str, Any]], output: str,
+                      intermediate_steps: List[Tuple[Any, Any]], generation: int):
+        """Cache an agent answer unless it depended on history or changed records"""
+        # Must run before the turn is saved to memory
+        if len(self.memory) or called_mutating_tool(intermediate_steps):
+            return
+        self.response_cache.put(message, customer_context, output, generation=generation, steps=intermediate_steps)
+
+    def _agent_inputs(self, message: str, customer_context: Dict[str, Any] = None) -> Dict[str, str]:
+        """Build the executor inputs for a message"""
+        # Customer context, plus the login snapshot if it is ready by its deadline
+        enhanced_message = message + render_customer_context(customer_context)
+
+        return {"input": enhanced_message, "chat_history": self.memory.render()}
+
+    def process_message(self, message: str, customer_context: Dict[str, Any] = None) -> str:
+        """Process a customer message and return response"""
+        try:
+            fast_answer = self._fast_answer(message, customer_context)
+            if fast_answer is not None:
+                self.memory.add_turn(message, fast_answer)
+                return fast_answer
+
+            generation = self.response_cache.generation
+            start = time.perf_counter()
+            response = self.agent_executor.invoke(self._agent_inputs(message, customer_context))
+            metrics.observe("agent.latency", time.perf_counter() - start)
+            self._cache_answer(message, customer_context, response["output"],
+                               response.get("intermediate_steps", []), generation)
+
+            self.memory.add_turn(message, response["output"])
+
+            return response["output"]
+
+        except Exception as e:
+            error_msg = f"I apologize, but I encountered an error while processing your request: {str(e)}"
+            print(f"Error details: {traceback.format_exc()}")
+
+            self.memory.add_turn(message, error_msg)
+            return error_msg
+
+    async def aprocess_message(self, message: str, customer_context: Dict[str, Any] = None) -> str:
+        """Process a customer message without blocking the event loop"""
+        try:
+            fast_answer = await self.router.aroute(message, customer_context)
+            if fast_answer is None and not len(self.memory):
+                fast_answer = self.response_cache.get(message, customer_context)
+            if fast_answer is not None:
+                self.memory.add_turn(message, fast_answer)
+                return fast_answer
+
+            generation = self.response_cache.generation
+            start = time.perf_counter()
+            await await_prefetch(customer_context)
+            response = await self.agent_executor.ainvoke(self._agent_inputs(message, customer_context))
+            metrics.observe("agent.latency", time.perf_counter() - start)
+            self._cache_answer(message, customer_context, response["output"],
+                               response.get("intermediate_steps", []), generation)
+
+            self.memory.add_turn(message, response["output"])
+            return response["output"]
+
+        except Exception as e:
+            error_msg = f"I apologize, but I encountered an error while processing your request: {str(e)}"
+            print(f"Error details: {traceback.format_exc()}")
+
+            self.memory.add_turn(message, error_msg)
+            return error_msg
+
+    async def arun_tools(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Run independent tool calls, e.g. order status and weather, concurrently"""
+        return await arun_tools(calls, self.tools)
+
+    def stream_message(self, message: str, customer_context: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Process a customer message, yielding tool progress and answer tokens as they arrive
+
+        Ends with a {"type": "final"} event carrying the full answer, see stream_agent_executor.
+        """
+        try:
+            fast_answer = self._fast_answer(message, customer_context)
+            if fast_answer is not None:
+                self.memory.add_turn(message, fast_answer)
+                yield {"type": "final", "content": fast_answer, "ttft": 0.0, "latency": 0.0}
+                return
+
+            generation = self.response_cache.generation
+            output, steps = None, []
+            for event in stream_agent_executor(self.agent_executor, self._agent_inputs(message, customer_context)):
+                if event["type"] == "final":
+                    output, steps = event["content"], event["steps"]
+                yield event
+            self._cache_answer(message, customer_context, output, steps, generation)
+            self.memory.add_turn(message, output)
+
+        except Exception as e:
+            error_msg = f"I apologize, but I encountered an error while processing your request: {str(e)}"
+            print(f"Error details: {traceback.format_exc()}")
+
+            self.memory.add_turn(message, error_msg)
+            yield {"type": "final", "content": error_msg, "ttft": None, "latency": None}
+
+    def reset_conversation(self):
+        """Reset the conversation memory"""
+        self.memory.clear()
+
+    def get_conversation_history(self) -> List[Dict[str, str]]:
+        """Get the conversation history"""
+        return self.memory.messages()
+
+    def cleanup(self):
+        """Clean up resources"""
+        print("🧹 Session cleaned up")
+
+
+# Repeats of earlier actions one run may make before it is ended with the last result
+MAX_REPEATED_ACTIONS = 2
+REPEATED_ACTION_NOTE = "\n(You already ran this action and this is its result. Use it and give the Final Answer.)"
+
+class _Repeat(str):
+    """An observation served from the run's memo; stop marks the repeat that ends the run"""
+
+    def __new__(cls, result: str, stop: bool):
+        observation = super().__new__(cls, result + REPEATED_ACTION_NOTE)
+        observation.result = result
+        observation.stop = stop
+        return observation
+
+def _action_key(action: AgentAction) -> Tuple[str, str]:
+    """The tool and its input, normalized so trivially different spellings match"""
+    tool_input = action.tool_input
+    text = json.dumps(tool_input, sort_keys=True) if isinstance(tool_input, dict) else str(tool_input)
+    return action.tool, " ".join(text.strip().strip("'\"").lower().split())
+
+class MemoizingAgentExecutor(AgentExecutor):
+    """AgentExecutor that runs each distinct tool call at most once per invocation
+
+    A repeated (tool, input) gets the observation of its first run instead
+    of calling the tool again. After MAX_REPEATED_ACTIONS repeats the model
+    is going in circles, so the run ends with that observation as the
+    answer rather than spending the remaining iterations. A state-changing
+    tool clears the memo, so reads after it are fresh. Counters:
+    agent.tool_calls_saved, agent.cycles_stopped and agent.iterations_saved,
+    plus agent.parse_errors for LLM output the agent could not parse (see
+    react_parser.py for the output it repairs).
+    """
+
+    # Chain run id -> {"memo": {action key: observation}, "steps": int, "repeats": int}
+    _runs: Dict[Any, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+
+    def _call(self, inputs: Dict[str, str], run_manager=None) -> Dict[str, Any]:
+        run_id = run_manager.run_id if run_manager else None
+        self._runs[run_id] = {"memo": {}, "steps": 0, "repeats": 0}
+        try:
+            return super()._call(inputs, run_manager)
+        finally:
+            self._runs.pop(run_id, None)
+
+    async def _acall(self, inputs: Dict[str, str], run_manager=None) -> Dict[str, Any]:
+        run_id = run_manager.run_id if run_manager else None
+        self._runs[run_id] = {"memo": {}, "steps": 0, "repeats": 0}
+        try:
+            return await super()._acall(inputs, run_manager)
+        finally:
+            self._runs.pop(run_id, None)
+
+    def _repeat(self, run: Dict[str, Any], action: AgentAction) -> Optional[_Repeat]:
+        """The memoized observation if this action ran before in the run, else None"""
+        run["steps"] += 1
+        result = run["memo"].get(_action_key(action))
+        if result is None:
+            return None
+        run["repeats"] += 1
+        metrics.increment("agent.tool_calls_saved")
+        stop = run["repeats"] >= MAX_REPEATED_ACTIONS
+        if stop:
+            metrics.increment("agent.cycles_stopped")
+            metrics.increment("agent.iterations_saved", max(0, self.max_iterations - run["steps"]))
+        return _Repeat(result, stop)
+
+    @staticmethod
+    def _remember(run: Dict[str, Any], action: AgentAction, observation: Any):
+        if action.tool in MUTATING_TOOLS:
+            run["memo"].clear()
+        run["memo"][_action_key(action)] = str(observation)
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        run = self._runs.get(run_manager.run_id if run_manager else None)
+        repeat = self._repeat(run, agent_action) if run is not None else None
+        if repeat is not None:
+            if run_manager:
+                run_manager.on_agent_action(agent_action, color="green")
+            return AgentStep(action=agent_action, observation=repeat)
+        step = super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if run is not None:
+            self._remember(run, agent_action, step.observation)
+        return step
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action,
+                                     run_manager=None) -> AgentStep:
+        run = self._runs.get(run_manager.run_id if run_manager else None)
+        repeat = self._repeat(run, agent_action) if run is not None else None
+        if repeat is not None:
+            if run_manager:
+                await run_manager.on_agent_action(agent_action, verbose=self.verbose, color="green")
+            return AgentStep(action=agent_action, observation=repeat)
+        step = await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if run is not None:
+            self._remember(run, agent_action, step.observation)
+        return step
+
+    def _consume_next_step(self, values):
+        # handle_parsing_errors turns unparsable LLM output into an _Exception step fed back to the model
+        for value in values:
+            if isinstance(value, AgentStep) and value.action.tool == "_Exception":
+                metrics.increment("agent.parse_errors")
+        return super()._consume_next_step(values)
+
+    def _get_tool_return(self, next_step_output: Tuple[AgentAction, str]) -> Optional[AgentFinish]:
+        _, observation = next_step_output
+        if isinstance(observation, _Repeat) and observation.stop:
+            result = observation.result
+            result = result[len("RESULT: "):] if result.startswith("RESULT: ") else result
+            key = self._action_agent.return_values[0] if self._action_agent.return_values else "output"
+            return AgentFinish({key: f"Here's what I found:\n\n{result.strip()}"}, "Repeated action, answering from its result")
+        return super()._get_tool_return(next_step_output)
+
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+# Progress shown while a tool runs, formatted with the tool input
+TOOL_PROGRESS = {
+    "order_status": "Checking order {input}…",
+    "cancel_order": "Cancelling order {input}…",
+    "process_return": "Starting a return for {input}…",
+    "return_status": "Checking your return…",
+    "search_products": "Searching products for {input}…",
+    "product_details": "Looking up product {input}…",
+    "customer_info": "Looking up your account…",
+    "get_customer_orders": "Fetching your orders…",
+    "search_orders_by_email": "Fetching your orders…",
+    "update_preferences": "Updating your preferences…",
+    "get_weather": "Checking the weather in {input}…",
+    "product_recommendations": "Finding recommendations…",
+}
+
+class _StreamingHandler(BaseCallbackHandler):
+    """Forward tool progress and Final Answer tokens from an executor run to a queue"""
+
+    def __init__(self, events: "queue.Queue"):
+        self.events = events
+        self._buffer = ""
+        self._in_final_answer = False
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any):
+        # Each ReAct iteration is a new generation; only text after the marker is the answer
+        self._buffer = ""
+        self._in_final_answer = False
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any):
+        # Tool-calling mode: tool calls arrive as structured data, so any text is the answer
+        self._buffer = ""
+        self._in_final_answer = True
+
+    def on_llm_new_token(self, token: str, **kwargs: Any):
+        if self._in_final_answer:
+            self.events.put(("token", token))
+            return
+        self._buffer += token
+        marker = self._buffer.find(FINAL_ANSWER_MARKER)
+        if marker != -1:
+            self._in_final_answer = True
+            rest = self._buffer[marker + len(FINAL_ANSWER_MARKER):].lstrip()
+            if rest:
+                self.events.put(("token", rest))
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any):
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        template = TOOL_PROGRESS.get(name, "Running " + name + "…")
+        self.events.put(("tool", template.format(input=str(input_str).strip().strip("'\"")[:60])))
+
+def stream_agent_executor(agent_executor: AgentExecutor, inputs: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Run the executor in a worker thread and yield its progress as it happens
+
+    Yields {"type": "tool", "content": progress} while tools run, then
+    {"type": "token", "content": text} for each Final Answer token and finally
+    {"type": "final", "content": answer, "steps": intermediate steps, "ttft": seconds,
+    "latency": seconds}.
+    The final answer is authoritative; it may differ from the streamed tokens
+    when the executor had to recover from a parsing error.
+    """
+    events: "queue.Queue" = queue.Queue()
+    handler = _StreamingHandler(events)
+
+    def run():
+        try:
+            result = agent_executor.invoke(inputs, config={"callbacks": [handler]})
+            events.put(("done", result))
+        except Exception as e:
+            events.put(("error", e))
+
+    start = time.perf_counter()
+    first_token = None
+    threading.Thread(target=run, name="agent-stream", daemon=True).start()
+    while True:
+        kind, payload = events.get()
+        if kind == "token":
+            if first_token is None:
+                first_token = time.perf_counter() - start
+                metrics.observe("agent.ttft", first_token)
+            yield {"type": "token", "content": payload}
+        elif kind == "tool":
+            yield {"type": "tool", "content": payload}
+        elif kind == "error":
+            raise payload
+        else:
+            latency = time.perf_counter() - start
+            metrics.observe("agent.latency", latency)
+            if first_token is None:
+                # Nothing streamed (e.g. iteration limit), the whole answer arrives at once
+                first_token = latency
+                metrics.observe("agent.ttft", first_token)
+            yield {"type": "final", "content": payload["output"], "steps": payload.get("intermediate_steps", []),
+                   "ttft": first_token, "latency": latency}
+            return
+
+class CustomerContext:
+    """Manage customer context and session information"""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        return self.sessions.get(session_id, {})
+
+    def update_context(self, session_id: str, context: Dict[str, Any]):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = {}
+        self.sessions[session_id].update(context)
+
+    def set_customer_id(self, session_id: str, customer_id: str):
+        """Log a customer in by id and start prefetching their snapshot"""
+        self.update_context(session_id, {"customer_id": customer_id, "prefetch": CustomerPrefetch(customer_id=customer_id)})
+
+    def set_customer_email(self, session_id: str, email: str):
+        """Log a customer in by email and start prefetching their snapshot"""
+        self.update_context(session_id, {"customer_email": email, "prefetch": CustomerPrefetch(email=email)})
+
+    def clear_customer(self, session_id: str):
+        """Log the customer out of a session"""
+        self.sessions.pop(session_id, None)
+
+
+# Global context manager
+customer_context_manager = CustomerContext()
@@ -0,0 +1,746 @@
+"""
+Benchmarks for the e-commerce chatbot
+
+Usage:
+    python benchmark.py search [--sizes 1000 10000 100000 1000000]
+    python benchmark.py recommend [--sizes 10000 1000000]
+    python benchmark.py personalize [--size 100000 --customers 1000]
+    python benchmark.py customers [--count 1000000]
+    python benchmark.py orders [--threads 16 --orders 200 --backend memory|sqlite]
+    python benchmark.py sessions [--counts 1 50 500]   (needs langchain and a reachable Ollama)
+    python benchmark.py weather [--threads 32 --lookups 50]   (local stub weather server)
+    python benchmark.py memory [--turns 50 --budget 1500]
+    python benchmark.py prompt [--live]   (--live needs a reachable Ollama)
+    python benchmark.py agent_loop   (scripted LLM, needs langchain)
+    python benchmark.py parser [--repeat 2000]   (needs langchain)
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from events import change_events
+from metrics import estimate_tokens, metrics
+from mock_databases import MockCustomerDatabase, MockOrderDatabase, MockProductDatabase
+from recommender import PersonalizedRecommender
+from storage import InMemoryStorage, SQLiteStorage
+
+ADJECTIVES = ["Wireless", "Smart", "Portable", "Ergonomic", "Waterproof", "Compact", "Premium", "Classic",
+              "Ultra", "Eco", "Digital", "Foldable", "Insulated", "Gaming", "Organic", "Vintage"]
+NOUNS = ["Headphones", "Watch", "Case", "Stand", "Jacket", "Mouse", "Speaker", "Lamp", "Shoes", "Mug",
+         "Keyboard", "Backpack", "Bottle", "Charger", "Camera", "Chair", "Blender", "Monitor", "Tent", "Scarf"]
+CATEGORIES = ["Electronics", "Accessories", "Office", "Clothing", "Home", "Sports", "Kitchen", "Books"]
+BRANDS = ["TechBrand", "BookCorp", "HomePlus", "OfficeMax", "Fashionista", "Accents", "GamePro", "SoundMaster",
+          "Northwind", "Contoso"]
+FEATURES = ["Waterproof", "Bluetooth 5.0", "Adjustable height", "Insulated", "Wireless charging compatible",
+            "Energy efficient", "Foldable", "Water resistant", "Winter ready", "Lightweight"]
+
+def generate_products(count: int, seed: int = 42) -> List[Dict]:
+    """Generate a synthetic product catalog"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        stock = rng.randint(0, 100)
+        products.append({
+            "product_id": f"SYN{i:07d}",
+            "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(['Pro', 'Max', 'Lite', 'Mini', 'X'])}{rng.randint(1, 999)}",
+            "category": rng.choice(CATEGORIES),
+            "price": round(rng.uniform(5, 500), 2),
+            "availability": "in_stock" if stock > 5 else ("low_stock" if stock else "out_of_stock"),
+            "stock_count": stock,
+            "description": f"Synthetic {rng.choice(NOUNS).lower()} for benchmarking",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "features": rng.sample(FEATURES, 3),
+            "brand": rng.choice(BRANDS)
+        })
+    return products
+
+def generate_customers(count: int, seed: int = 42) -> List[Dict]:
+    """Generate synthetic customer records"""
+    rng = random.Random(seed)
+    return [{
+        "customer_id": f"SYNC{i:07d}",
+        "name": f"Customer {i}",
+        "email": f"customer{i}@example.com",
+        "phone": f"+1-555-{i % 10000:04d}",
+        "address": f"{rng.randint(1, 999)} Synthetic St",
+        "loyalty_points": rng.randint(0, 5000),
+        "tier": rng.choice(["Bronze", "Silver", "Gold"]),
+        "preferences": {"categories": rng.sample(CATEGORIES, 2), "brands": rng.sample(BRANDS, 2), "communication": "email"},
+        "order_history": []
+    } for i in range(count)]
+
+def build_product_db(count: int) -> MockProductDatabase:
+    """Create a product database loaded with a synthetic catalog"""
+    db = MockProductDatabase()
+    for product in generate_products(count):
+        db.add_product(product)
+    return db
+
+def time_per_call(func: Callable, repeat: int) -> float:
+    """Average wall time of func in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def linear_search(products: Dict[str, Dict], query: str, category: str = None, max_price: float = None) -> List[Dict]:
+    """The original substring scan, kept as a baseline"""
+    query_lower = query.lower()
+    return [p for p in products.values()
+            if query_lower in p["name"].lower() and (not category or category.lower() == p["category"].lower())
+            and (max_price is None or p["price"] <= max_price)]
+
+def bench_search(sizes: List[int], repeat: int):
+    """Latency of ranked top-5 searches versus catalog size"""
+    # (query, search filters, baseline arguments)
+    queries = [
+        ("wireless headphones", {}, ("wireless headphones", None)),
+        ("gaming", {"category": "Electronics"}, ("gaming", "Electronics")),
+        ("lamp pro", {}, ("lamp pro", None)),
+        ("tent", {"category": "Sports", "in_stock_only": True}, ("tent", "Sports")),
+        ("electronics", {"max_price": 100}, ("", "Electronics", 100)),
+    ]
+    print(f"{'products':>10} {'build (s)':>10} " + " ".join(f"{q[:14] + ' (ms)':>19}" for q, _, _ in queries)
+          + f" {'scan (ms)':>10}")
+    for size in sizes:
+        start = time.perf_counter()
+        db = build_product_db(size)
+        build = time.perf_counter() - start
+        # The first search for a term also builds its cached impacts
+        for q, filters, _ in queries:
+            assert db.search_products(q, limit=5, **filters), f"no results for {q!r}"
+        ranked = [time_per_call(lambda: db.search_products(q, limit=5, **filters), repeat) for q, filters, _ in queries]
+        scan = sum(time_per_call(lambda: linear_search(db.products, *args), 1) for _, _, args in queries) / len(queries)
+        print(f"{size:>10} {build:>10.2f} " + " ".join(f"{ms:>19.3f}" for ms in ranked) + f" {scan:>10.3f}")
+
+def legacy_recommendations(products: Dict[str, Dict], category: str = None, weather_condition: str = None) -> List[Dict]:
+    """The original per-call recommendation scans, kept as a baseline"""
+    recommendations = []
+    if weather_condition:
+        if "cold" in weather_condition.lower() or "winter" in weather_condition.lower():
+            recommendations = [p for p in products.values() if "winter" in p["name"].lower() or p["category"].lower() == "clothing"]
+        elif "rain" in weather_condition.lower():
+            recommendations = [p for p in products.values() if any("waterproof" in f.lower() for f in p.get("features", []))]
+    if not recommendations and category:
+        recommendations = [p for p in products.values() if p["category"].lower() == category.lower()]
+    if not recommendations:
+        recommendations = sorted(products.values(), key=lambda x: x["rating"], reverse=True)[:3]
+    return recommendations
+
+def bench_recommend(sizes: List[int], repeat: int):
+    """Recommendation latency from the rating-ordered indexes versus the original scans"""
+    requests = [("rain", {"weather_condition": "Light rain"}), ("cold", {"weather_condition": "Cold and windy"}),
+                ("category", {"category": "Kitchen"}), ("top rated", {})]
+    print(f"{'products':>10} {'request':>10} {'indexed (ms)':>13} {'legacy (ms)':>12} {'same top':>9}")
+    for size in sizes:
+        db = build_product_db(size)
+        for label, kwargs in requests:
+            top = db.get_recommendations(**kwargs)
+            legacy = legacy_recommendations(db.products, **kwargs)
+            # The original returned every match unordered; compare its best ratings
+            best = sorted((p["rating"] for p in legacy), reverse=True)[:len(top)]
+            indexed = time_per_call(lambda: db.get_recommendations(**kwargs), repeat)
+            scan = time_per_call(lambda: legacy_recommendations(db.products, **kwargs), 1)
+            print(f"{size:>10} {label:>10} {indexed:>13.3f} {scan:>12.3f} {str([p['rating'] for p in top][:3] == best[:3]):>9}")
+
+def bench_personalize(size: int, customers: int, orders: int):
+    """Personalized recommendation latency, one customer at a time versus batched"""
+    product_db = build_product_db(size)
+    order_db = MockOrderDatabase()
+    customer_db = MockCustomerDatabase()
+    product_ids = [f"SYN{i:07d}" for i in range(size)]
+    rng = random.Random(11)
+    people = generate_customers(customers)
+    for i in range(orders):
+        customer = people[i % customers]
+        order_id = f"SYNO{i:07d}"
+        items = [{"product_id": product_id, "name": product_id, "quantity": 1, "price": 10.0}
+                 for product_id in rng.sample(product_ids, rng.randint(1, 3))]
+        order_db.add_order({"order_id": order_id, "customer_id": customer["customer_id"], "status": "delivered",
+                            "items": items, "total": 10.0 * len(items), "order_date": "2024-01-01",
+                            "shipping_address": customer["address"], "tracking_number": None, "can_cancel": False})
+        customer["order_history"].append(order_id)
+    for customer in people:
+        customer_db.add_customer(customer)
+    recommender = PersonalizedRecommender(product_db, order_db, customer_db)
+
+    start = time.perf_counter()
+    recommender.snapshot()
+    print(f"feature matrix for {size} products, {orders} orders: {time.perf_counter() - start:.2f}s")
+    ids = [customer["customer_id"] for customer in people]
+    start = time.perf_counter()
+    single = {customer_id: recommender.recommend(customer_id) for customer_id in ids}
+    one_at_a_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = recommender.recommend_many(ids)
+    batched = time.perf_counter() - start
+    assert all([p["product_id"] for p in single[i]] == [p["product_id"] for p in batch[i]] for i in ids)
+    print(f"{customers} customers: one at a time {one_at_a_time * 1000 / customers:.2f} ms/customer, "
+          f"batched {batched * 1000 / customers:.2f} ms/customer")
+
+def bench_customers(count: int, repeat: int):
+    """Email lookup latency and correctness with a large customer table"""
+    db = MockCustomerDatabase()
+    start = time.perf_counter()
+    for customer in generate_customers(count):
+        db.add_customer(customer)
+    print(f"loaded {count} customers in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(7)
+    probes = [rng.randrange(count) for _ in range(repeat)]
+    for i in probes:
+        assert db.get_customer_by_email(f"  Customer{i}@Example.COM ")["customer_id"] == f"SYNC{i:07d}"
+    assert db.get_customer_by_email("nobody@example.com") is None
+    db.update_customer("SYNC0000000", {"email": "renamed@example.com"})
+    assert db.get_customer_by_email("customer0@example.com") is None
+    assert db.get_customer_by_email("RENAMED@example.com")["customer_id"] == "SYNC0000000"
+    try:
+        db.update_customer("SYNC0000001", {"email": " Renamed@Example.com"})
+        raise AssertionError("duplicate email was accepted")
+    except ValueError:
+        pass
+    assert db.get_customer_by_email("customer1@example.com")["customer_id"] == "SYNC0000001"
+
+    start = time.perf_counter()
+    for i in probes:
+        db.get_customer_by_email(f"customer{i}@example.com")
+    per_lookup = (time.perf_counter() - start) * 1_000_000 / len(probes)
+    print(f"indexed email lookup: {per_lookup:.2f} us/lookup over {len(probes)} lookups")
+
+def bench_orders(threads: int, orders: int, backend: str):
+    """Concurrent cancels and returns: each succeeds once per order, retries replay the first result
+
+    Also checks that each delivered order ends up with exactly one return record under a unique id.
+    """
+    directory = tempfile.TemporaryDirectory()
+    storage = SQLiteStorage(os.path.join(directory.name, "orders.db")) if backend == "sqlite" else InMemoryStorage()
+    db = MockOrderDatabase(storage)
+    order_ids = [f"SYNO{i:07d}" for i in range(orders)]
+    for i, order_id in enumerate(order_ids):
+        delivered = i % 2 == 1
+        db.add_order({"order_id": order_id, "customer_id": f"SYNC{i:07d}",
+                      "status": "delivered" if delivered else "processing",
+                      "items": [{"product_id": "PROD001", "name": "Wireless Headphones", "quantity": 1, "price": 99.99}],
+                      "total": 99.99, "order_date": "2024-01-01", "shipping_address": "1 Main St",
+                      "tracking_number": None, "can_cancel": not delivered})
+    updates = []
+    on_update = lambda **payload: updates.append(payload["order_id"])
+    change_events.subscribe("order.updated", on_update)
+
+    def worker(n: int) -> List:
+        rng = random.Random(n)
+        calls = []
+        for order_id in rng.sample(order_ids, len(order_ids)):
+            # Even threads retry under a shared key, odd threads send key-less requests
+            key = f"{order_id}-retry" if n % 2 == 0 else None
+            calls.append(("cancel", order_id, key, db.cancel_order(order_id, key)))
+            calls.append(("return", order_id, key and key + "-return", db.process_return(order_id, "benchmark",
+                                                                                         key and key + "-return")))
+        return calls
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        calls = [call for result in pool.map(worker, range(threads)) for call in result]
+    elapsed = time.perf_counter() - start
+    change_events.unsubscribe("order.updated", on_update)
+
+    successes: Dict[tuple, int] = {}
+    first_by_key: Dict[str, Dict] = {}
+    for operation, order_id, key, result in calls:
+        if result["success"] and not result.get("replayed"):
+            successes[(operation, order_id)] = successes.get((operation, order_id), 0) + 1
+        if key:
+            first = first_by_key.setdefault(key, {k: v for k, v in result.items() if k != "replayed"})
+            assert {k: v for k, v in result.items() if k != "replayed"} == first, f"replay of {key} differs"
+    for i, order_id in enumerate(order_ids):
+        expected = ("return", order_id) if i % 2 else ("cancel", order_id)
+        assert successes.get(expected) == 1, f"{expected} succeeded {successes.get(expected, 0)} times"
+        assert db.get_order_status(order_id)["status"] == ("delivered" if i % 2 else "cancelled")
+    assert sum(successes.values()) == orders, "an operation succeeded on the wrong kind of order"
+    assert sorted(updates) == sorted(order_ids), "expected one order.updated per changed order"
+    returns = [record for order_id in order_ids for record in db.get_returns_for_order(order_id)]
+    assert len(returns) == orders // 2, "expected one return record per delivered order"
+    assert len({record["return_id"] for record in returns}) == len(returns), "duplicate return ids"
+    print(f"{backend}: {len(calls)} cancel/return calls from {threads} threads on {orders} orders "
+          f"in {elapsed:.2f}s ({len(calls) / elapsed:.0f} ops/s); one success per order, "
+          f"{sum(1 for *_, r in calls if r.get('replayed'))} replays matched")
+    directory.cleanup()
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # Peak rather than current RSS, but the best portable fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_sessions(mode: str, count: int) -> Dict[str, float]:
+    """Create count agent sessions, either sharing the executor or building one each"""
+    from agent import EcommerceAgent
+
+    baseline = current_rss_mb()
+    sessions, latencies = [], []
+    for _ in range(count):
+        start = time.perf_counter()
+        if mode == "shared":
+            sessions.append(EcommerceAgent())
+        else:
+            sessions.append(EcommerceAgent._build_components())
+        latencies.append(time.perf_counter() - start)
+    return {
+        "first_session_ms": latencies[0] * 1000,
+        "mean_session_ms": sum(latencies) / len(latencies) * 1000,
+        "rss_growth_mb": current_rss_mb() - baseline,
+    }
+
+def bench_sessions(counts: List[int]):
+    """Cold-session latency and RSS with a shared versus per-session executor"""
+    print(f"{'mode':>12} {'sessions':>9} {'first (ms)':>11} {'mean (ms)':>10} {'RSS +MB':>8}")
+    for count in counts:
+        for mode in ("per-session", "shared"):
+            # A fresh interpreter per run keeps RSS numbers independent
+            output = subprocess.run(
+                [sys.executable, __file__, "sessions", "--child", mode, "--counts", str(count)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>12} {count:>9} {result['first_session_ms']:>11.1f} "
+                  f"{result['mean_session_ms']:>10.2f} {result['rss_growth_mb']:>8.1f}")
+
+def start_stub_weather_server(delay: float):
+    """Serve OpenWeatherMap-shaped responses on a free local port"""
+    class Handler(BaseHTTPRequestHandler):
+        requests_served = 0
+
+        def do_GET(self):
+            Handler.requests_served += 1
+            time.sleep(delay)
+            city = parse_qs(urlparse(self.path).query).get("q", ["?"])[0]
+            body = json.dumps({"name": city, "weather": [{"description": "clear sky"}], "main": {"temp": 21.5}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Handler
+
+def bench_weather(threads: int, lookups: int, delay: float):
+    """Weather client cache hit rate, coalescing and latency against a stub server"""
+    from weather import WeatherClient
+
+    server, handler = start_stub_weather_server(delay)
+    client = WeatherClient("stub-key", base_url=f"http://127.0.0.1:{server.server_port}/weather", ttl=60)
+    cities = ["New York", "Houston", "Miami", "Chicago", "Los Angeles"]
+    latencies = []
+
+    def lookup(i: int):
+        start = time.perf_counter()
+        assert client.get(cities[i % len(cities)])["main"]["temp"] == 21.5
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lookup, range(threads * lookups)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    counters = metrics.snapshot()["counters"]
+    print(f"lookups: {len(latencies)} in {elapsed:.2f}s, upstream requests: {handler.requests_served}")
+    print(f"cache hits: {counters.get('weather.cache_hit', 0)}, coalesced: {counters.get('weather.coalesced', 0)}, "
+          f"misses: {counters.get('weather.cache_miss', 0)}")
+    print(f"mean lookup: {sum(latencies) / len(latencies) * 1000:.3f} ms (upstream delay {delay * 1000:.0f} ms)")
+
+CONVERSATION = [
+    ("Hi, what's the status of order {order}?", "Order {order} is {status}. It was placed on 2024-01-{day:02d} and "
+     "ships to 123 Main St, New York, NY. The tracking number is TRK{day:09d}. Is there anything else I can help with?"),
+    ("Can you recommend some {category} products under $100?", "Here are a few {category} picks: Wireless "
+     "Headphones (PROD001, $99.99, rated 4.5), Gaming Mouse (PROD006, $59.99, rated 4.6) and Bluetooth Speaker "
+     "(PROD007, $34.99, rated 4.2). Would you like details on any of them?"),
+    ("I want to return the items from {order}, they arrived damaged.", "I'm sorry about that. I've started a return "
+     "for order {order}; please ship the items back within 30 days using the prepaid label we emailed you."),
+]
+
+def bench_memory(turns: int, budget: int, prefill_rate: float):
+    """History tokens and render cost over a long conversation, full buffer versus token budget"""
+    from conversation_memory import ConversationMemory
+
+    memory = ConversationMemory(max_tokens=budget)
+    full_history: List[Dict[str, str]] = []
+    rng = random.Random(3)
+    print(f"{'turn':>5} {'full tok':>9} {'budget tok':>11} {'full prefill (s)':>17} {'budget prefill (s)':>19} "
+          f"{'rebuild (us)':>13} {'render (us)':>12}")
+    for turn in range(1, turns + 1):
+        user, ai = CONVERSATION[turn % len(CONVERSATION)]
+        fields = {"order": f"ORD{rng.randint(1, 999):03d}", "status": rng.choice(["shipped", "processing"]),
+                  "day": turn % 28 + 1, "category": rng.choice(CATEGORIES)}
+        user, ai = user.format(**fields), ai.format(**fields)
+
+        # Baseline: the history string rebuilt from every stored message each turn
+        start = time.perf_counter()
+        rebuilt = ""
+        for message in full_history:
+            rebuilt += f"{'Human' if message['role'] == 'user' else 'AI'}: {message['content']}\n"
+        rebuild_us = (time.perf_counter() - start) * 1_000_000
+        start = time.perf_counter()
+        rendered = memory.render()
+        render_us = (time.perf_counter() - start) * 1_000_000
+
+        if turn in (1, 10, 25, 50) or turn == turns:
+            full_tokens, budget_tokens = estimate_tokens(rebuilt), estimate_tokens(rendered)
+            print(f"{turn:>5} {full_tokens:>9} {budget_tokens:>11} {full_tokens / prefill_rate:>17.2f} "
+                  f"{budget_tokens / prefill_rate:>19.2f} {rebuild_us:>13.1f} {render_us:>12.1f}")
+        full_history += [{"role": "user", "content": user}, {"role": "assistant", "content": ai}]
+        memory.add_turn(user, ai)
+        # Leave the background summarizer a moment, as a user's think time would
+        time.sleep(0.005)
+    print(f"summary present: {'Summary of earlier conversation' in memory.render()}, "
+          f"turns evicted: {metrics.counter('memory.turns_evicted'):.0f}")
+
+# The agent prompt before prompts.py: {input} and {agent_scratchpad} mid-prompt and again after the history
+LEGACY_REACT_TEMPLATE = """You are an AI customer service representative for an e-commerce platform. Your role is to help customers with their inquiries in a friendly, professional, and efficient manner.
+
+**Your Capabilities:**
+- Check order status, cancel orders, and process returns
+- Search for products and provide detailed product information
+- Access customer information and update preferences
+- Get weather information for shipping estimates
+- Provide product recommendations based on weather or preferences
+- Make autonomous decisions about which tools to use
+- Chain multiple tools together when needed
+
+**Guidelines:**
+1. **Be Proactive**: Anticipate customer needs and offer relevant information
+2. **Be Contextual**: Remember previous conversation context and use it appropriately
+3. **Be Autonomous**: Decide which tools to use based on customer queries without asking for permission
+4. **Be Helpful**: If you can't directly solve a problem, offer alternatives or escalation paths
+5. **Be Professional**: Maintain a friendly, helpful tone while being efficient
+6. **Chain Tools**: Use multiple tools in sequence when it provides better customer service
+
+**Tool Usage Examples:**
+- If a customer asks about an order, check order status and optionally get weather for shipping updates
+- If a customer wants to return something, first check order status, then process the return
+- If a customer asks for product recommendations, consider using weather information to provide seasonal suggestions
+- If updating customer preferences, confirm the changes and suggest relevant products
+
+**Important Notes:**
+- Always prioritize customer satisfaction
+- If you're unsure about something, it's better to ask for clarification than make assumptions
+- When handling cancellations or returns, explain the process clearly
+- Provide order IDs, product IDs, and other reference numbers when relevant
+- Be empathetic when dealing with complaints or issues
+- Always include "Final Answer:" even if tools fail
+- Be helpful and specific
+- If tools fail, provide alternative solutions
+- Never leave customer hanging without a response
+You have access to the following tools:{tools}
+
+ IMPORTANT INSTRUCTIONS:\n
+ - For simple greetings, questions, or general conversation, respond directly without using tools
+ - Only use tools when you need specific information (like product details, order status, etc.)
+ - When you don't need tools, just provide a helpful response
+            
+            When you DO need to use tools, follow this format:
+              Thought: [your reasoning about what to do] dont rerun
+              Action: [tool name from: {tool_names}] dont rerun,if missing action , just give the final answer as the thought
+              Final Answer: [your response to the user] 
+            
+            When you DON'T need tools, just respond naturally:
+               Thought: [brief reasoning]
+                Final Answer: [your helpful response]
+            
+                Current conversation:
+            Human: {input}
+            {agent_scratchpad}
+
+if there is a mssing Action , return your thought as the final answer
+Previous conversation history:
+{chat_history}
+
+Question: {input}
+Thought: {agent_scratchpad}"""
+
+
+# (question, [(tool, tool input)], answer) turns replayed by the prompt benchmark
+PROMPT_SCRIPT = [
+    ("What's the status of order ORD002?", [("order_status", "ORD002")],
+     "Order ORD002 is processing and can still be cancelled."),
+    ("Can you find me some wireless headphones and tell me about the first one?",
+     [("search_products", "wireless headphones"), ("product_details", "PROD001")],
+     "The Wireless Headphones (PROD001) cost $99.99 and have active noise cancellation."),
+    ("What's the weather like in New York for my delivery?", [("get_weather", "New York")],
+     "It's clear in New York, so your delivery should arrive on time."),
+]
+
+def render_script_prompts(template: str) -> List[str]:
+    """Every prompt the agent would send while answering PROMPT_SCRIPT, one per ReAct iteration"""
+    from langchain.agents.format_scratchpad import format_log_to_str
+    from langchain.prompts import PromptTemplate
+    from langchain.tools.render import render_text_description
+    from langchain_core.agents import AgentAction
+    from tools import get_tools
+
+    tools = {tool.name: tool for tool in get_tools()}
+    prompt = PromptTemplate.from_template(template).partial(
+        tools=render_text_description(list(tools.values())), tool_names=", ".join(tools))
+    prompts, history = [], ""
+    for question, calls, answer in PROMPT_SCRIPT:
+        steps = []
+        for name, tool_input in calls:
+            prompts.append(prompt.format(input=question, chat_history=history, agent_scratchpad=format_log_to_str(steps)))
+            log = f" I should use {name}.\nAction: {name}\nAction Input: {tool_input}"
+            steps.append((AgentAction(name, tool_input, log), tools[name].run(tool_input)))
+        prompts.append(prompt.format(input=question, chat_history=history, agent_scratchpad=format_log_to_str(steps)))
+        history += f"Human: {question}\nAI: {answer}\n"
+    return prompts
+
+def bench_prompt(live: bool):
+    """Prompt tokens Ollama can reuse from the previous request, legacy layout versus prompts.py"""
+    from prompts import REACT_TEMPLATE
+
+    for label, template in (("legacy", LEGACY_REACT_TEMPLATE), ("prefix-first", REACT_TEMPLATE)):
+        prompts = render_script_prompts(template)
+        stats = None
+        if live:
+            from llm import OllamaStatsHandler, create_llm
+            stats = OllamaStatsHandler(keep=True)
+            # One output token is enough to measure prompt evaluation
+            llm = create_llm(callbacks=[stats], num_predict=1)
+            for prompt in prompts:
+                llm.invoke(prompt)
+
+        print(f"\n{label}")
+        header = f"{'call':>5} {'prompt tok':>11} {'reusable tok':>13} {'to eval tok':>12}"
+        print(header + (f" {'ollama eval tok':>16} {'prompt eval (ms)':>17}" if live else ""))
+        previous, total, to_eval = "", 0, 0
+        for i, prompt in enumerate(prompts):
+            shared = estimate_tokens(os.path.commonprefix([previous, prompt]))
+            tokens = estimate_tokens(prompt)
+            total, to_eval = total + tokens, to_eval + tokens - shared
+            line = f"{i + 1:>5} {tokens:>11} {shared:>13} {tokens - shared:>12}"
+            if stats:
+                call = stats.calls[i]
+                line += f" {call['prompt_tokens']:>16.0f} {call['prompt_eval'] * 1000:>17.1f}"
+            print(line)
+            previous = prompt
+        print(f"total prompt tokens {total}, needing evaluation {to_eval} ({to_eval / total:.0%})")
+
+def _step(tool: str, tool_input: str) -> str:
+    return f" I should check this.\nAction: {tool}\nAction Input: {tool_input}"
+
+# (case, scripted LLM replies, one per ReAct iteration); the agent runs with max_iterations=5
+AGENT_LOOP_SCRIPTS = [
+    ("single lookup", [_step("order_status", "ORD002"), " Done\nFinal Answer: It is processing."]),
+    ("same action x4", [_step("order_status", "ORD002")] * 4 + [" Done\nFinal Answer: It is processing."]),
+    ("A/B cycle", [_step("order_status", "ORD002"), _step("product_details", "PROD001")] * 2
+     + [" Done\nFinal Answer: It is processing."]),
+    ("read, cancel, read", [_step("order_status", "ORD004"), _step("cancel_order", "ORD004"),
+                            _step("order_status", "ORD004"), " Done\nFinal Answer: Cancelled."]),
+]
+
+def bench_agent_loop():
+    """LLM and tool calls per run for a model that repeats actions, plain versus memoizing executor"""
+    from langchain.agents import AgentExecutor, create_react_agent
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.language_models import FakeListLLM
+    from agent import MemoizingAgentExecutor
+    from prompts import create_react_prompt
+    import tools
+
+    class CountCalls(BaseCallbackHandler):
+        calls = 0
+
+        def on_llm_start(self, *args, **kwargs):
+            self.calls += 1
+
+    print(f"{'case':<20} {'executor':<10} {'LLM calls':>9} {'tool calls':>10}  answer")
+    for case, replies in AGENT_LOOP_SCRIPTS:
+        for name, executor_class in (("plain", AgentExecutor), ("memoizing", MemoizingAgentExecutor)):
+            # Fresh databases, so the cancel in one run does not change the next
+            tools.order_db = MockOrderDatabase()
+            llm = FakeListLLM(responses=replies)
+            executor = executor_class.from_agent_and_tools(
+                agent=create_react_agent(llm, tools.get_tools(), create_react_prompt()), tools=tools.get_tools(),
+                handle_parsing_errors=True, max_iterations=5, return_intermediate_steps=True)
+            metrics.reset()
+            counter = CountCalls()
+            result = executor.invoke({"input": case, "chat_history": ""}, config={"callbacks": [counter]})
+            tool_calls = sum(count for counter, count in metrics.snapshot()["counters"].items()
+                             if counter.startswith("tool.calls."))
+            steps = result["intermediate_steps"]
+            if case == "read, cancel, read":
+                assert "Cancelled" in steps[-1][1], "the read after a cancel must not come from the memo"
+            print(f"{case:<20} {name:<10} {counter.calls:>9} {tool_calls:>10.0f}  {result['output'].splitlines()[0][:40]}")
+        print(f"{'':<20} saved: {metrics.counter('agent.tool_calls_saved'):.0f} tool calls, "
+              f"{metrics.counter('agent.iterations_saved'):.0f} iterations "
+              f"({metrics.counter('agent.cycles_stopped'):.0f} cycles stopped)")
+
+# (case, ReAct output as llama3.1 wrote it, expected parse): ("action", tool, input), ("finish", answer),
+# or None where the model has to be asked again
+PARSER_CORPUS = [
+    ("well formed", " I should check the order.\nAction: order_status\nAction Input: ORD002",
+     ("action", "order_status", "ORD002")),
+    ("final answer", " I now know the final answer\nFinal Answer: Your order has shipped.",
+     ("finish", "Your order has shipped.")),
+    ("thought only", " Hello! I'm happy to help with your orders, products and returns today.",
+     ("finish", "Hello! I'm happy to help with your orders, products and returns today.")),
+    ("thought label only", "Thought: You're welcome! Have a great day.", ("finish", "You're welcome! Have a great day.")),
+    ("thought naming a tool", " I need to use search_products to find headphones.", None),
+    ("tool name case", " Let me look that up.\nAction: Order_Status\nAction Input: ORD002",
+     ("action", "order_status", "ORD002")),
+    ("tool name spaced", " Let me look that up.\nAction: Product Details\nAction Input: PROD001",
+     ("action", "product_details", "PROD001")),
+    ("tool name in backticks", " Searching.\nAction: `search_products`\nAction Input: wireless headphones",
+     ("action", "search_products", "wireless headphones")),
+    ("input on action line", " I should check it.\nAction: order_status ORD003", ("action", "order_status", "ORD003")),
+    ("call syntax", " I should check it.\nAction: get_weather(Chicago)", ("action", "get_weather", "Chicago")),
+    ("JSON input", ' Checking.\nAction: order_status\nAction Input: {"order_id": "ORD002"}',
+     ("action", "order_status", "ORD002")),
+    ("JSON arguments", ' Searching.\nAction: search_products\nAction Input: {"query": "mug", "max_price": 20}',
+     ("action", "search_products", {"query": "mug", "max_price": 20})),
+    ("JSON on action line", ' Searching.\nAction: search_products {"query": "bluetooth speaker"}',
+     ("action", "search_products", "bluetooth speaker")),
+    ("action then guessed answer", " Checking.\nAction: order_status\nAction Input: ORD002\nFinal Answer: It shipped.",
+     ("action", "order_status", "ORD002")),
+    ("no action, then answer", " No tool is needed.\nAction: None\nFinal Answer: Happy to help!",
+     ("finish", "Happy to help!")),
+    ("missing input", " I should check it.\nAction: order_status", None),
+]
+
+def bench_parser(repeat: int):
+    """Corpus check of the recovering ReAct parser, and LLM calls it saves over the stock parser"""
+    from langchain.agents.output_parsers import ReActSingleInputOutputParser
+    from langchain_core.agents import AgentAction
+    from langchain_core.exceptions import OutputParserException
+    from react_parser import RecoveringReActParser
+    from tools import get_tools
+
+    tools = get_tools()
+    names = {tool.name for tool in tools}
+    stock, recovering = ReActSingleInputOutputParser(), RecoveringReActParser(tools)
+
+    def outcome(parser, text):
+        try:
+            result = parser.parse(text)
+        except OutputParserException:
+            return None
+        if isinstance(result, AgentAction):
+            return "action", result.tool, result.tool_input
+        return "finish", result.return_values["output"]
+
+    def costs_a_call(parsed, expected) -> bool:
+        """Another generation follows: a parse error, an unknown tool or an input the tool cannot use"""
+        return parsed is None or parsed[0] == "action" and (parsed[1] not in names or parsed != expected)
+
+    print(f"{'case':<28} {'stock':<10} {'recovering':<10}")
+    stock_calls = recovering_calls = 0
+    for case, text, expected in PARSER_CORPUS:
+        parsed = outcome(recovering, text)
+        assert parsed == expected, f"{case}: parsed {parsed!r}, expected {expected!r}"
+        stock_extra, recovering_extra = costs_a_call(outcome(stock, text), expected), costs_a_call(parsed, expected)
+        stock_calls += stock_extra
+        recovering_calls += recovering_extra
+        print(f"{case:<28} {'re-prompt' if stock_extra else 'ok':<10} {'re-prompt' if recovering_extra else 'ok':<10}")
+    print(f"\nextra LLM calls over {len(PARSER_CORPUS)} outputs: stock {stock_calls}, recovering {recovering_calls}")
+
+    texts = [text for _, text, _ in PARSER_CORPUS]
+    for label, parser in (("stock", stock), ("recovering", recovering)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                outcome(parser, text)
+        print(f"{label:<11} {(time.perf_counter() - start) / (repeat * len(texts)) * 1e6:.1f} us per parse")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search = commands.add_parser("search", help="product search latency vs catalog size")
+    search.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    search.add_argument("--repeat", type=int, default=20)
+
+    recommend = commands.add_parser("recommend", help="recommendation latency, indexed vs original scans")
+    recommend.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    recommend.add_argument("--repeat", type=int, default=200)
+
+    personalize = commands.add_parser("personalize", help="personalized recommendations, single vs batched scoring")
+    personalize.add_argument("--size", type=int, default=100_000, help="catalog size")
+    personalize.add_argument("--customers", type=int, default=1_000)
+    personalize.add_argument("--orders", type=int, default=20_000)
+
+    customers = commands.add_parser("customers", help="email lookup at scale")
+    customers.add_argument("--count", type=int, default=1_000_000)
+    customers.add_argument("--repeat", type=int, default=10_000)
+
+    orders = commands.add_parser("orders", help="concurrent cancel/return correctness and throughput")
+    orders.add_argument("--threads", type=int, default=16)
+    orders.add_argument("--orders", type=int, default=200)
+    orders.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+
+    sessions = commands.add_parser("sessions", help="session creation cost, shared vs per-session agents")
+    sessions.add_argument("--counts", type=int, nargs="+", default=[1, 50, 500])
+    sessions.add_argument("--child", choices=["shared", "per-session"], help=argparse.SUPPRESS)
+
+    weather = commands.add_parser("weather", help="weather cache and coalescing against a stub server")
+    weather.add_argument("--threads", type=int, default=32)
+    weather.add_argument("--lookups", type=int, default=50, help="lookups per thread")
+    weather.add_argument("--delay", type=float, default=0.2, help="stub server latency in seconds")
+
+    memory = commands.add_parser("memory", help="history tokens over a long conversation, full vs token budget")
+    memory.add_argument("--turns", type=int, default=50)
+    memory.add_argument("--budget", type=int, default=1500, help="history token budget")
+    memory.add_argument("--prefill-rate", type=float, default=400, help="assumed prompt-eval tokens/s for estimates")
+
+    prompt = commands.add_parser("prompt", help="prompt-cache reuse per ReAct iteration, legacy vs prefix-first layout")
+    prompt.add_argument("--live", action="store_true", help="also measure Ollama prompt-eval time per call")
+
+    commands.add_parser("agent_loop", help="repeated actions in the ReAct loop, plain vs memoizing executor")
+    parser_check = commands.add_parser("parser", help="ReAct output repairs on a corpus, stock vs recovering parser")
+    parser_check.add_argument("--repeat", type=int, default=2000)
+
+    args = parser.parse_args()
+    if args.command == "search":
+        bench_search(args.sizes, args.repeat)
+    elif args.command == "recommend":
+        bench_recommend(args.sizes, args.repeat)
+    elif args.command == "personalize":
+        bench_personalize(args.size, args.customers, args.orders)
+    elif args.command == "customers":
+        bench_customers(args.count, args.repeat)
+    elif args.command == "orders":
+        bench_orders(args.threads, args.orders, args.backend)
+    elif args.command == "sessions":
+        if args.child:
+            print(json.dumps(run_sessions(args.child, args.counts[0])))
+        else:
+            bench_sessions(args.counts)
+    elif args.command == "weather":
+        bench_weather(args.threads, args.lookups, args.delay)
+    elif args.command == "memory":
+        bench_memory(args.turns, args.budget, args.prefill_rate)
+    elif args.command == "prompt":
+        bench_prompt(args.live)
+    elif args.command == "agent_loop":
+        bench_agent_loop()
+    elif args.command == "parser":
+        bench_parser(args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Token-budgeted conversation memory with background summarization
+
+The history injected into the prompt is kept under a token budget: recent
+turns verbatim, older turns folded into a running summary by a background
+worker so the user never waits on it. The rendered history is maintained
+incrementally as turns are added and evicted, so reading it is O(1).
+"""
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from metrics import estimate_tokens, metrics
+
+# (running summary, evicted turns rendered as text) -> new summary
+Summarizer = Callable[[str, str], str]
+
+ENTITY_ID_RE = re.compile(r"\b(?:ORD|PROD|CUST|RET)\d+\b", re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+SUMMARY_PROMPT = """Update the running summary of a customer service conversation with the new turns.
+Keep every order, product, customer and return id, what the customer wanted and what was resolved.
+Reply with the summary only, at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+# Summaries are short LLM calls; two workers keep them off every request path
+_summarizer_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-summarizer")
+
+def _first_sentence(text: str, max_chars: int = 120) -> str:
+    sentence = SENTENCE_END_RE.split(text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+def extractive_summarizer(summary: str, turns: str) -> str:
+    """Summarize without an LLM: the first sentence of each message plus every entity id mentioned"""
+    lines = [line for line in turns.splitlines() if line.startswith(("Human: ", "AI: "))]
+    speakers = {"Human": "Customer", "AI": "Assistant"}
+    points = [f"{speakers[speaker]}: {_first_sentence(text)}"
+              for speaker, text in (line.split(": ", 1) for line in lines)]
+    ids = sorted({match.upper() for match in ENTITY_ID_RE.findall(summary + " " + turns)})
+    # The ids line is rebuilt each time and kept last, where truncation preserves it
+    lines = [line for line in summary.splitlines() if line and not line.startswith("Ids mentioned: ")]
+    lines.extend(points)
+    if ids:
+        lines.append("Ids mentioned: " + ", ".join(ids))
+    return "\n".join(lines)
+
+def llm_summarizer(llm, max_words: int = 120) -> Summarizer:
+    """Summarizer that asks the LLM to fold new turns into the running summary"""
+    def summarize(summary: str, turns: str) -> str:
+        prompt = SUMMARY_PROMPT.format(max_words=max_words, summary=summary or "(none)", turns=turns)
+        return str(llm.invoke(prompt)).strip()
+    return summarize
+
+def _render_turn(user: str, ai: str) -> str:
+    return f"Human: {user}\nAI: {ai}\n"
+
+class ConversationMemory:
+    """Conversation history bounded by a token budget, with older turns summarized"""
+
+    def __init__(self, max_tokens: int = 1500, summary_tokens: Optional[int] = None,
+                 summarizer: Optional[Summarizer] = None, max_turns: int = 50):
+        self.max_tokens = max_tokens
+        # Share of the budget the running summary may use
+        self.summary_tokens = summary_tokens if summary_tokens is not None else max_tokens // 4
+        self.summarizer = summarizer or extractive_summarizer
+        self._lock = threading.Lock()
+        # Recent turns as (user, ai, rendered text, tokens), oldest first
+        self._recent: Deque[Tuple[str, str, str, int]] = deque()
+        self._recent_text = ""
+        self._recent_tokens = 0
+        self._summary = ""
+        self._summary_text = ""
+        self._pending: List[str] = []
+        self._summarizing = False
+        # Bumped by clear() so a summary computed for an old conversation is discarded
+        self._generation = 0
+        # Full turns kept for display only, never injected into the prompt
+        self._turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+
+    def __len__(self) -> int:
+        """Number of turns remembered, including summarized ones"""
+        return len(self._turns)
+
+    def add_turn(self, user: str, ai: str):
+        """Record a turn, evicting the oldest ones into the summary once over budget"""
+        rendered = _render_turn(user, ai)
+        tokens = estimate_tokens(rendered)
+        with self._lock:
+            self._turns.append((user, ai))
+            self._recent.append((user, ai, rendered, tokens))
+            self._recent_text += rendered
+            self._recent_tokens += tokens
+            self._evict_over_budget()
+            schedule = bool(self._pending) and not self._summarizing
+            if schedule:
+                self._summarizing = True
+            generation = self._generation
+        if schedule:
+            _summarizer_pool.submit(self._summarize, generation)
+
+    def _evict_over_budget(self):
+        """Move the oldest recent turns to the summary queue until within budget, lock held"""
+        budget = self.max_tokens - estimate_tokens(self._summary_text)
+        # The latest turn always stays verbatim, whatever its size
+        while self._recent_tokens > budget and len(self._recent) > 1:
+            _, _, evicted, evicted_tokens = self._recent.popleft()
+            self._recent_text = self._recent_text[len(evicted):]
+            self._recent_tokens -= evicted_tokens
+            self._pending.append(evicted)
+            metrics.increment("memory.turns_evicted")
+
+    def _summarize(self, generation: int):
+        """Fold pending evicted turns into the summary, off the request path"""
+        while True:
+            with self._lock:
+                if generation != self._generation:
+                    return
+                if not self._pending:
+                    self._summarizing = False
+                    return
+                turns, self._pending = "".join(self._pending), []
+                summary = self._summary
+            try:
+                with metrics.timer("memory.summarize"):
+                    summary = self.summarizer(summary, turns)
+            except Exception as e:
+                metrics.increment("memory.summarize_error")
+                print(f"⚠️  Conversation summary failed, keeping ids only: {e}")
+                summary = extractive_summarizer(summary, turns)
+            summary = self._truncate(summary)
+            with self._lock:
+                if generation != self._generation:
+                    return
+                self._summary = summary
+                self._summary_text = f"Summary of earlier conversation: {summary}\n" if summary else ""
+                # A longer summary leaves less room for verbatim turns
+                self._evict_over_budget()
+
+    def _truncate(self, summary: str) -> str:
+        """Cap the summary at its token share, keeping the most recent part"""
+        max_chars = self.summary_tokens * 4
+        return summary if len(summary) <= max_chars else "…" + summary[-max_chars:]
+
+    def render(self) -> str:
+        """History for the prompt: the running summary followed by recent turns verbatim"""
+        with self._lock:
+            return self._summary_text + self._recent_text
+
+    def token_count(self) -> int:
+        """Approximate tokens render() adds to the prompt"""
+        with self._lock:
+            return estimate_tokens(self._summary_text) + self._recent_tokens
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Remembered turns as role/content dicts, oldest first"""
+        with self._lock:
+            turns = list(self._turns)
+        history = []
+        for user, ai in turns:
+            history.append({"role": "user", "content": user})
+            history.append({"role": "assistant", "content": ai})
+        return history
+
+    def clear(self):
+        """Forget the conversation"""
+        with self._lock:
+            self._generation += 1
+            self._recent.clear()
+            self._recent_text = ""
+            self._recent_tokens = 0
+            self._summary = self._summary_text = ""
+            self._pending = []
+            self._summarizing = False
+            self._turns.clear()
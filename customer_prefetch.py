@@ -0,0 +1,143 @@
+"""
+Login-time prefetch of a customer's profile, orders and recommendations
+
+A login starts a background fetch of the customer's profile, their most
+recent orders with status, and personalized recommendations. The result
+is a compact snapshot that goes into the prompt next to the customer
+context. Without it, the agent's first turn nearly always spends an LLM
+iteration on customer_info or get_customer_orders.
+
+Login never waits for the fetch. A message waits for the snapshot at most
+until PREFETCH_DEADLINE seconds after the fetch started; after that it
+goes to the agent without one, and the tools still work as before. When
+the customer's orders, returns or profile change, the snapshot is fetched
+again, and the stale one is not used.
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional
+
+from events import change_events
+from metrics import metrics
+from tools import customer_db, order_db, recommender
+
+# Seconds after a fetch starts that a message may wait for its snapshot
+PREFETCH_DEADLINE = float(os.getenv("CUSTOMER_PREFETCH_DEADLINE", "0.5"))
+SNAPSHOT_ORDERS = 3
+SNAPSHOT_RECOMMENDATIONS = 3
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="customer-prefetch")
+# Customer id -> prefetches of logged-in sessions, refreshed when the customer's records change
+_live: Dict[str, "weakref.WeakSet[CustomerPrefetch]"] = {}
+_live_lock = threading.Lock()
+
+def _order_line(order: Dict[str, Any]) -> str:
+    items = ", ".join(item["name"] + (f" x{item['quantity']}" if item.get("quantity", 1) > 1 else "")
+                      for item in order.get("items", []))
+    line = f"{order['order_id']} {order['order_date']} {order['status']}, ${order['total']:.2f}: {items}"
+    if order.get("tracking_number"):
+        line += f", tracking {order['tracking_number']}"
+    if order.get("can_cancel"):
+        line += ", can be cancelled"
+    if order.get("return_id"):
+        line += f", return {order['return_id']}"
+    return line
+
+def render_snapshot(customer: Dict[str, Any], orders: Dict[str, Any], recommended: List[Dict[str, Any]]) -> str:
+    """The snapshot text for the prompt, one line per part"""
+    preferences = customer.get("preferences", {})
+    lines = [
+        "Customer Snapshot (prefetched at login; use it instead of looking these up):",
+        f"- {customer['name']} ({customer['customer_id']}, {customer['email']}), {customer['tier']} tier, "
+        f"{customer['loyalty_points']} points, ships to {customer['address']}; preferred categories: "
+        f"{', '.join(preferences.get('categories', [])) or 'none'}; brands: {', '.join(preferences.get('brands', [])) or 'none'}",
+    ]
+    if orders["orders"]:
+        lines.append(f"- Orders ({orders['total']} total, newest first): "
+                     + " | ".join(_order_line(order) for order in orders["orders"]))
+    else:
+        lines.append("- No orders yet")
+    if recommended:
+        lines.append("- Recommended: " + " | ".join(f"{product['name']} ({product['product_id']}) ${product['price']:.2f}"
+                                                    for product in recommended))
+    return "\n".join(lines)
+
+class CustomerPrefetch:
+    """The snapshot of one logged-in customer, fetched in the background"""
+
+    def __init__(self, customer_id: Optional[str] = None, email: Optional[str] = None,
+                 deadline: float = PREFETCH_DEADLINE):
+        self.customer_id = customer_id
+        self.email = email
+        self.deadline = deadline
+        self.refresh()
+
+    def refresh(self):
+        """Start fetching the snapshot again; the previous one is no longer used"""
+        self.started = time.monotonic()
+        self._future: Future = _pool.submit(self._fetch)
+
+    def _fetch(self) -> Optional[str]:
+        with metrics.timer("prefetch.latency"):
+            customer = (customer_db.get_customer_info(self.customer_id) if self.customer_id
+                        else customer_db.get_customer_by_email(self.email))
+            if not customer:
+                metrics.increment("prefetch.not_found")
+                return None
+            if self.customer_id is None:
+                self.customer_id = customer["customer_id"]
+            with _live_lock:
+                _live.setdefault(customer["customer_id"], weakref.WeakSet()).add(self)
+            orders = order_db.get_orders_for_customer(customer["customer_id"], limit=SNAPSHOT_ORDERS)
+            recommended = recommender.recommend(customer["customer_id"], limit=SNAPSHOT_RECOMMENDATIONS)
+            return render_snapshot(customer, orders, recommended)
+
+    async def wait(self):
+        """Wait for the fetch until the deadline without blocking the event loop"""
+        remaining = self.started + self.deadline - time.monotonic()
+        if remaining > 0 and not self._future.done():
+            await asyncio.wait([asyncio.wrap_future(self._future)], timeout=remaining)
+
+    def snapshot(self) -> Optional[str]:
+        """The snapshot, waiting for it until the deadline; None if it missed the deadline or failed"""
+        future = self._future
+        try:
+            snapshot = future.result(timeout=max(0.0, self.started + self.deadline - time.monotonic()))
+        except FutureTimeout:
+            metrics.increment("prefetch.missed")
+            return None
+        except Exception as e:
+            print(f"⚠️  Customer prefetch failed: {e}")
+            return None
+        if snapshot is not None:
+            metrics.increment("prefetch.used")
+        return snapshot
+
+def _on_customer_changed(customer_id: Optional[str] = None, **_):
+    with _live_lock:
+        prefetches = list(_live.get(customer_id, ()))
+    for prefetch in prefetches:
+        prefetch.refresh()
+
+for _topic in ("order.updated", "return.updated", "customer.updated"):
+    change_events.subscribe(_topic, _on_customer_changed)
+
+async def await_prefetch(context: Optional[Dict[str, Any]]):
+    """Let a context's snapshot arrive, up to its deadline, before rendering it from async code"""
+    prefetch = (context or {}).get("prefetch")
+    if isinstance(prefetch, CustomerPrefetch):
+        await prefetch.wait()
+
+def render_customer_context(context: Optional[Dict[str, Any]]) -> str:
+    """The customer lines appended to a message: its context fields, then the snapshot once fetched"""
+    if not context:
+        return ""
+    fields = {key: value for key, value in context.items() if not isinstance(value, CustomerPrefetch)}
+    text = f"\nCustomer Context: {fields}" if fields else ""
+    prefetch = context.get("prefetch")
+    snapshot = prefetch.snapshot() if isinstance(prefetch, CustomerPrefetch) else None
+    return text + f"\n{snapshot}" if snapshot else text
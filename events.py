@@ -0,0 +1,40 @@
+"""
+In-process change events for the mock databases
+
+Databases publish a topic (e.g. "order.updated") with the ids of the changed
+record, and caches subscribe to drop only the entries that depend on it.
+"""
+import threading
+from typing import Any, Callable, Dict, List
+
+class EventBus:
+    """Minimal synchronous publish/subscribe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Callable[..., Any]]] = {}
+
+    def subscribe(self, topic: str, callback: Callable[..., Any]):
+        """Call callback(**payload) whenever topic is published"""
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+
+    def unsubscribe(self, topic: str, callback: Callable[..., Any]):
+        """Stop calling callback for topic"""
+        with self._lock:
+            callbacks = self._subscribers.get(topic, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def publish(self, topic: str, **payload):
+        """Notify subscribers of topic, a failing subscriber does not stop the others"""
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, []))
+        for callback in callbacks:
+            try:
+                callback(**payload)
+            except Exception as e:
+                print(f"⚠️  Subscriber for {topic} failed: {e}")
+
+# Process-wide bus the databases publish on
+change_events = EventBus()
@@ -0,0 +1,135 @@
+"""
+Background warm-up and health monitoring of the Ollama endpoint
+
+A daemon thread probes /api/ps every HEALTH_PROBE_INTERVAL seconds. It
+records whether Ollama answers, how long it took and whether the model is
+loaded. When the model is not loaded yet, the thread warms it up with an
+/api/generate request carrying a model and keep_alive but no prompt.
+Ollama loads the model and returns without generating a token, so the
+first customer message does not pay the load time. Nothing waits for the
+warm-up: agent construction returns at once while the model loads. A
+warm-up that failed, or never ran because Ollama was down, is retried at
+the next probe. A model unloaded later (keep_alive expired) is reported,
+not reloaded, so an idle server can still free its memory.
+
+status() returns the latest probe without any network call, for the
+app's sidebar.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+
+from llm import ollama_settings
+from metrics import metrics
+
+# Probes slower than this many seconds report the endpoint as degraded
+SLOW_PROBE = 1.0
+# Loading a large model from disk can take a while
+WARM_UP_TIMEOUT = 300
+
+class OllamaMonitor:
+    """Probe the endpoint periodically, warm the model up once, and cache the status"""
+
+    def __init__(self, base_url: str, model: str, keep_alive: str, interval: float = 30, timeout: float = 2):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._status: Dict[str, Any] = {"state": "starting", "reachable": None, "latency": None,
+                                        "model_loaded": None, "warm_up": "pending", "warm_up_seconds": None,
+                                        "checked_at": None, "error": None}
+
+    def start(self) -> "OllamaMonitor":
+        """Start warm-up and probing in the background; later calls do nothing"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ollama-monitor", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            status = self.probe()
+            # Also covers Ollama coming up after the app, or a warm-up that failed
+            if status["reachable"] and not status["model_loaded"] and status["warm_up"] in ("pending", "failed"):
+                self._update(warm_up="running", state="loading")
+                if self.warm_up():
+                    self.probe()
+            if self._stop.wait(self.interval):
+                return
+
+    def warm_up(self) -> bool:
+        """Load the model with a zero-token request; True once it is loaded"""
+        start = time.perf_counter()
+        try:
+            r = self.session.post(f"{self.base_url}/api/generate",
+                                  json={"model": self.model, "keep_alive": self.keep_alive}, timeout=WARM_UP_TIMEOUT)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            metrics.increment("ollama.warm_up_failed")
+            self._update(warm_up="failed", error=f"warm-up failed: {e}")
+            return False
+        seconds = time.perf_counter() - start
+        metrics.observe("ollama.warm_up", seconds)
+        self._update(warm_up="done", warm_up_seconds=seconds)
+        return True
+
+    def probe(self) -> Dict[str, Any]:
+        """Check the endpoint and whether the model is loaded, and cache the result"""
+        start = time.perf_counter()
+        try:
+            r = self.session.get(f"{self.base_url}/api/ps", timeout=self.timeout)
+            r.raise_for_status()
+            loaded = [model.get("name", "") for model in r.json().get("models", [])]
+        except (requests.RequestException, ValueError) as e:
+            metrics.increment("ollama.probe_failed")
+            return self._update(state="down", reachable=False, latency=None, model_loaded=None,
+                                checked_at=time.time(), error=str(e))
+        latency = time.perf_counter() - start
+        metrics.observe("ollama.probe_latency", latency)
+        model_loaded = any(name == self.model or name.split(":")[0] == self.model for name in loaded)
+        state = "degraded" if latency > SLOW_PROBE else "ready" if model_loaded else "idle"
+        return self._update(state=state, reachable=True, latency=latency, model_loaded=model_loaded,
+                            checked_at=time.time(), error=None)
+
+    def _update(self, **changes: Any) -> Dict[str, Any]:
+        with self._lock:
+            self._status.update(changes)
+            return dict(self._status)
+
+    def status(self) -> Dict[str, Any]:
+        """The latest probe result, without contacting Ollama
+
+        state is "starting" before the first probe, then "ready" (model
+        loaded), "loading" (warm-up still running), "idle" (reachable,
+        model not loaded), "degraded" (slow probe) or "down" (unreachable).
+        """
+        with self._lock:
+            return dict(self._status)
+
+_monitor: Optional[OllamaMonitor] = None
+_monitor_lock = threading.Lock()
+
+def get_ollama_monitor() -> OllamaMonitor:
+    """Get the process-wide monitor for the configured endpoint and model, started"""
+    global _monitor
+    settings = ollama_settings()
+    with _monitor_lock:
+        if _monitor is None or (_monitor.base_url, _monitor.model) != (settings["base_url"].rstrip("/"),
+                                                                       settings["model"]):
+            if _monitor is not None:
+                _monitor.stop()
+            _monitor = OllamaMonitor(settings["base_url"], settings["model"], settings["keep_alive"],
+                                     interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "30")))
+        return _monitor.start()
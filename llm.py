@@ -0,0 +1,87 @@
+"""
+Ollama LLM configuration shared by the agent and the Streamlit app
+
+Ollama reuses the KV cache of the previous request for the longest prompt
+prefix they share, as long as the model stays loaded with the same context
+size. keep_alive holds the model (and its cache) in memory between turns,
+and a fixed num_ctx avoids the reload a changed context size would cause.
+Per-call prompt-eval statistics from Ollama are recorded as metrics.
+
+create_llm is the text-completion model the ReAct agent parses;
+create_chat_llm is the chat model for native tool calling, with the same
+settings so both share the loaded model and its cache.
+"""
+import os
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_ollama import ChatOllama
+from langchain_ollama.llms import OllamaLLM
+
+from metrics import metrics
+
+OLLAMA_BASE_URL = "http://localhost:11434"
+
+def ollama_settings() -> Dict[str, Any]:
+    """Model, endpoint and cache settings from the environment"""
+    return {
+        "model": os.getenv("OLLAMA_MODEL", "llama3.1"),
+        "base_url": os.getenv("OLLAMA_BASE_URL", OLLAMA_BASE_URL),
+        "keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+        "num_ctx": int(os.getenv("OLLAMA_NUM_CTX", "8192")),
+    }
+
+class OllamaStatsHandler(BaseCallbackHandler):
+    """Record Ollama's prompt-eval and generation statistics for every LLM call"""
+
+    def __init__(self, keep: bool = False):
+        # When keep is set, per-call stats are also collected in calls, e.g. for a benchmark
+        self.keep = keep
+        self.calls: List[Dict[str, float]] = []
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                if "prompt_eval_count" not in info and "eval_count" not in info:
+                    continue
+                stats = {
+                    # Ollama omits prompt_eval_count when the whole prompt came from its cache
+                    "prompt_tokens": info.get("prompt_eval_count", 0),
+                    "prompt_eval": info.get("prompt_eval_duration", 0) / 1e9,
+                    "output_tokens": info.get("eval_count", 0),
+                    "eval": info.get("eval_duration", 0) / 1e9,
+                    "load": info.get("load_duration", 0) / 1e9,
+                }
+                metrics.increment("llm.calls")
+                metrics.increment("llm.prompt_tokens", stats["prompt_tokens"])
+                metrics.increment("llm.output_tokens", stats["output_tokens"])
+                metrics.observe("llm.prompt_eval", stats["prompt_eval"])
+                metrics.observe("llm.eval", stats["eval"])
+                if self.keep:
+                    self.calls.append(stats)
+
+def _llm_options(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    settings = ollama_settings()
+    options = dict(
+        model=settings["model"],
+        base_url=settings["base_url"],
+        keep_alive=settings["keep_alive"],
+        num_ctx=settings["num_ctx"],
+        temperature=0.2,
+        top_p=0.9,
+        num_predict=1024,
+        client_kwargs={"timeout": 60},
+        callbacks=[OllamaStatsHandler()],
+    )
+    options.update(overrides)
+    return options
+
+def create_llm(**overrides: Any) -> OllamaLLM:
+    """Create the Ollama LLM with cache-friendly settings; overrides replace any argument"""
+    return OllamaLLM(**_llm_options(overrides))
+
+def create_chat_llm(**overrides: Any) -> ChatOllama:
+    """Create the Ollama chat model used for native tool calling, configured like create_llm"""
+    return ChatOllama(**_llm_options(overrides))
@@ -0,0 +1,491 @@
+"""
+End-to-end load test of the chatbot against a local stub LLM
+
+The stub server speaks the part of Ollama's HTTP API the agent uses:
+/api/generate for the ReAct agent and /api/chat for the tool-calling
+agent (AGENT_MODE, chosen with --mode). It answers each prompt with the
+next step of a scripted transcript for the question in it, so whole agent
+turns run without a model. --malformed-rate makes that share of ReAct
+actions come out malformed, to measure parse-error recovery. Every call
+waits --latency seconds plus --token-delay per streamed chunk. Like Ollama, the stub serves at most
+--parallel requests at once and queues the rest.
+
+The driver runs concurrent sessions. Each session is one customer sending
+a weighted mix of messages (orders, search, returns, weather,
+recommendations) through EcommerceAgent, so the router, response cache,
+memory and tools all take part as in the app. The "stream" flow is the
+app's path. Weather lookups go to a local stub weather server.
+
+Reported: latency percentiles, throughput, LLM calls per request (counted
+by the stub per scenario) and per resolved query, parse failures and time
+spent in each tool. --ollama-url runs the same load against a real Ollama
+instead of the stub; LLM calls are then counted by the app's metrics.
+--login logs each session in as the sidebar does, so its prompts carry the
+prefetched customer snapshot, and the stub skips the lookups it answers.
+
+Usage:
+    python load_test.py [--sessions 20 --turns 5 --flow process|stream|async]
+                        [--latency 0.3 --token-delay 0.005 --parallel 4 --verbose]
+                        [--mode react|tools --malformed-rate 0.2 --ollama-url URL --login]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark import start_stub_weather_server
+from metrics import estimate_tokens, metrics
+
+# (name, weight, message, [(tool, Action Input), ...], Final Answer). Messages, inputs and
+# answers are formatted with the session's customer fields. Messages the router or
+# response cache answer never reach the stub; their script is unused.
+SCENARIOS = [
+    ("order_status", 3, "Where is my order {order_id}?", [], ""),
+    ("order_history", 2, "I ordered a few things recently, what's happening with my orders?",
+     [("get_customer_orders", "{customer_id}")],
+     "Here are your recent orders; let me know if you'd like details on any of them."),
+    ("product_search", 3, "I'm looking for wireless headphones under $150",
+     [("search_products", "wireless headphones under $150")],
+     "The Wireless Headphones (PROD001) are $99.99, rated 4.5/5, with noise cancellation."),
+    ("search_details", 2, "Do you have a bluetooth speaker? Tell me more about the best one",
+     [("search_products", "bluetooth speaker"), ("product_details", "PROD007")],
+     "The Bluetooth Speaker (PROD007) is $34.99 and waterproof, with 12 hours of battery."),
+    ("return", 1, "I'd like to return order {order_id}, it arrived damaged",
+     [("order_status", "{order_id}"), ("process_return", "{order_id}")],
+     "I've started the return for order {order_id}. You'll get the return ID and shipping instructions by email."),
+    ("return_followup", 1, "Has my return for order {order_id} been processed yet?",
+     [("return_status", "{order_id}")],
+     "Here is the latest on the return for order {order_id}."),
+    ("weather", 1, "What's the weather in {city} right now? Will it affect my delivery?",
+     [("get_weather", "{city}")],
+     "It's clear in {city}, so your delivery should arrive on schedule."),
+    # A model stuck repeating the same lookup
+    ("looping_lookup", 1, "Can you look into order {order_id} and confirm the delivery date?",
+     [("order_status", "{order_id}")] * 4, "Order {order_id} is on its way."),
+    ("recommendations", 2, "Can you recommend some products?", [], ""),
+    ("small_talk", 1, "Thanks, that's all I needed!", [],
+     "You're welcome! Let me know if there's anything else I can help with."),
+]
+
+# Customer fields the scenario templates use; set up as the seeded mock data has them
+CUSTOMERS = [
+    {"customer_id": "CUST001", "customer_email": "john.doe@email.com", "order_id": "ORD002", "city": "New York"},
+    {"customer_id": "CUST002", "customer_email": "jane.smith@email.com", "order_id": "ORD003", "city": "Los Angeles"},
+    {"customer_id": "CUST003", "customer_email": "alice.johnson@email.com", "order_id": "ORD004", "city": "Chicago"},
+    {"customer_id": "CUST004", "customer_email": "bob.brown@email.com", "order_id": "ORD005", "city": "Houston"},
+    {"customer_id": "CUST005", "customer_email": "carol.white@email.com", "order_id": "ORD006", "city": "Miami"},
+]
+
+ERROR_PREFIX = "I apologize, but I encountered an error"
+# Start of the answer AgentExecutor gives when max_iterations ran out
+UNRESOLVED_PREFIX = "Agent stopped due to iteration limit"
+QUESTION_MARKER = "\nQuestion: "
+CONTEXT_FIELD_RE = re.compile(r"'(\w+)': '([^']*)'")
+SNAPSHOT_MARKER = "\nCustomer Snapshot"
+# Lookups the login snapshot answers
+SNAPSHOT_TOOLS = {"customer_info", "get_customer_orders", "search_orders_by_email"}
+CHUNK_RE = re.compile(r"\s*\S+")
+WELL_FORMED_ACTION = " I should use {tool} for this.\nAction: {tool}\nAction Input: {input}"
+# ReAct slips for --malformed-rate: the parser repairs the first two, the last costs another LLM call
+MALFORMED_ACTIONS = [
+    " I should use {tool} for this.\nAction: {tool} {input}",
+    " I should use {tool} for this.\nAction: {title}\nAction Input: {input}",
+    " I should use {tool} with {input} for this.",
+]
+# Start of the observation handle_parsing_errors feeds back for a broken Action block
+PARSE_ERROR_OBSERVATION = "\nObservation: Invalid Format"
+OTHER_REPLY = "The customer asked about their orders and products; the assistant answered from the tools."
+
+def _template_regex(template: str) -> "re.Pattern":
+    """A regex matching a message template, with a named group per {field}"""
+    parts = re.split(r"\{(\w+)\}", template)
+    pattern = "".join(re.escape(part) if i % 2 == 0 else f"(?P<{part}>.+?)" for i, part in enumerate(parts))
+    return re.compile(pattern + r"(?:\nCustomer Context: (?P<context>.*))?$", re.DOTALL)
+
+class StubOllama:
+    """Scripted Ollama-compatible /api/generate and /api/chat server on a free local port
+
+    /api/generate serves the ReAct agent: replies are Thought/Action text,
+    and a malformed_rate share of actions has one of the MALFORMED_ACTIONS
+    format slips real models make. /api/chat serves the tool-calling
+    agent: actions come back as structured tool calls, which Ollama parses
+    itself, so there is no text format to break. /api/ps and a generate
+    request without a prompt serve health.py's probes and warm-up.
+    """
+
+    def __init__(self, latency: float, token_delay: float, parallel: int, malformed_rate: float = 0.0,
+                 seed: int = 1):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.malformed_rate = malformed_rate
+        self._rng = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(parallel)
+        self._lock = threading.Lock()
+        self._scripts = [(name, _template_regex(message), steps, answer)
+                         for name, _, message, steps, answer in SCENARIOS]
+        # LLM calls by scenario ("other" for prompts of no scenario, e.g. summaries), and queue waits
+        self.calls: Dict[str, int] = {}
+        self.queue_wait = 0.0
+        # Models loaded by a warm-up request, listed by /api/ps
+        self.loaded = set()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self.send_error(404)
+                    return
+                if self.path == "/api/generate" and "prompt" not in body:
+                    # Warm-up: Ollama loads the model and generates nothing
+                    stub.loaded.add(body.get("model"))
+                    self._json({"model": body.get("model"), "created_at": "", "response": "", "done": True,
+                                "done_reason": "load"})
+                    return
+                stub.respond(self, self.path, body)
+
+            def do_GET(self):
+                if self.path != "/api/ps":
+                    self.send_error(404)
+                    return
+                self._json({"models": [{"name": f"{model}:latest", "model": f"{model}:latest"}
+                                       for model in sorted(stub.loaded)]})
+
+            def _json(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "StubOllama":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.queue_wait = 0.0
+
+    def script(self, question: str, step: int) -> Tuple[str, Optional[Tuple[str, str]], str]:
+        """The scenario of a question and its step-th (tool, input), or None and the final answer"""
+        for name, regex, steps, answer in self._scripts:
+            match = regex.match(question.strip())
+            if not match:
+                continue
+            context, _, snapshot = (match.group("context") or "").partition(SNAPSHOT_MARKER)
+            fields = dict(CONTEXT_FIELD_RE.findall(context))
+            fields.update({key: value for key, value in match.groupdict().items() if key != "context" and value})
+            if snapshot:
+                # Like a model reading the login snapshot: no lookups of what it already shows
+                steps = [(tool, tool_input) for tool, tool_input in steps
+                         if tool not in SNAPSHOT_TOOLS and not (tool == "order_status"
+                                                                and tool_input.format(**fields) in snapshot)]
+            if step < len(steps):
+                tool, tool_input = steps[step]
+                return name, (tool, tool_input.format(**fields)), ""
+            return name, None, answer.format(**fields)
+        return "other", None, OTHER_REPLY
+
+    def react_reply(self, prompt: str) -> Tuple[str, str]:
+        """The scenario of a ReAct prompt and the text of its next step"""
+        question, marker, scratchpad = prompt.rpartition(QUESTION_MARKER)[2].partition("\nThought:")
+        if not marker:
+            return "other", OTHER_REPLY
+        # Observations of parse errors do not advance the script
+        step = scratchpad.count("\nObservation:") - scratchpad.count(PARSE_ERROR_OBSERVATION)
+        scenario, action, answer = self.script(question, step)
+        if action is None:
+            return scenario, f" I now know the final answer\nFinal Answer: {answer}"
+        tool, tool_input = action
+        with self._lock:
+            malformed = self._rng.random() < self.malformed_rate
+            template = self._rng.choice(MALFORMED_ACTIONS) if malformed else WELL_FORMED_ACTION
+        return scenario, template.format(tool=tool, title=tool.replace("_", " ").title(), input=tool_input)
+
+    def chat_reply(self, body: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """The scenario of a chat request and its next assistant message"""
+        messages = body.get("messages", [])
+        users = [i for i, message in enumerate(messages) if message.get("role") == "user"]
+        if not users:
+            return "other", {"role": "assistant", "content": OTHER_REPLY}
+        step = sum(1 for message in messages[users[-1] + 1:] if message.get("role") == "tool")
+        scenario, action, answer = self.script(messages[users[-1]].get("content", ""), step)
+        schemas = {tool["function"]["name"]: tool["function"]["parameters"] for tool in body.get("tools") or []}
+        if action is None or action[0] not in schemas:
+            return scenario, {"role": "assistant", "content": answer}
+        tool, tool_input = action
+        # A scripted input is the tool's first argument, as a ReAct Action Input would be
+        argument = next(iter(schemas[tool].get("properties", {})))
+        return scenario, {"role": "assistant", "content": "",
+                          "tool_calls": [{"function": {"name": tool, "arguments": {argument: tool_input}}}]}
+
+    def respond(self, handler: BaseHTTPRequestHandler, path: str, body: Dict[str, Any]):
+        if path == "/api/generate":
+            scenario, text = self.react_reply(body.get("prompt", ""))
+            message = None
+            prompt_tokens = estimate_tokens(body.get("prompt", ""))
+        else:
+            scenario, message = self.chat_reply(body)
+            text = message["content"]
+            prompt_tokens = estimate_tokens(json.dumps(body.get("messages", [])))
+        chunks = CHUNK_RE.findall(text)
+
+        queued = time.perf_counter()
+        with self._slots:
+            waited = time.perf_counter() - queued
+            with self._lock:
+                self.calls[scenario] = self.calls.get(scenario, 0) + 1
+                self.queue_wait += waited
+            start = time.perf_counter()
+            time.sleep(self.latency)
+            first_token = time.perf_counter() - start
+            done = {
+                "model": body.get("model"), "created_at": "", "done": True, "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(first_token * 1e9),
+                "eval_count": len(chunks), "eval_duration": int(len(chunks) * self.token_delay * 1e9),
+                "load_duration": 0,
+            }
+            if not body.get("stream", True):
+                # Ollama answers requests with tools in one JSON object
+                time.sleep(len(chunks) * self.token_delay)
+                payload = dict(done, total_duration=int((time.perf_counter() - start) * 1e9))
+                payload.update({"message": message} if message is not None else {"response": text})
+                data = json.dumps(payload).encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(data)))
+                handler.end_headers()
+                handler.wfile.write(data)
+                return
+
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/x-ndjson")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+            for chunk in chunks:
+                piece = ({"message": {"role": "assistant", "content": chunk}} if message is not None
+                         else {"response": chunk})
+                self._write(handler, {"model": body.get("model"), "created_at": "", "done": False, **piece})
+                time.sleep(self.token_delay)
+            if message is not None and message.get("tool_calls"):
+                self._write(handler, {"model": body.get("model"), "created_at": "", "done": False,
+                                      "message": {**message, "content": ""}})
+            final = {"message": {"role": "assistant", "content": ""}} if message is not None else {"response": ""}
+            self._write(handler, dict(done, total_duration=int((time.perf_counter() - start) * 1e9), **final))
+            handler.wfile.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _write(handler: BaseHTTPRequestHandler, payload: Dict[str, Any]):
+        line = (json.dumps(payload) + "\n").encode()
+        handler.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        handler.wfile.flush()
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile, 0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+# One finished request: (scenario, latency seconds, outcome: "ok", "error" or "unresolved")
+Result = Tuple[str, float, str]
+
+def outcome(answer: str) -> str:
+    if answer.startswith(ERROR_PREFIX):
+        return "error"
+    return "unresolved" if answer.startswith(UNRESOLVED_PREFIX) else "ok"
+
+def session_plan(n: int, turns: int, seed: int) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+    """A session's customer context and its (scenario, message) turns"""
+    rng = random.Random(seed + n)
+    customer = CUSTOMERS[n % len(CUSTOMERS)]
+    picks = rng.choices(SCENARIOS, weights=[scenario[1] for scenario in SCENARIOS], k=turns)
+    context = {key: customer[key] for key in ("customer_id", "customer_email")}
+    return context, [(name, message.format(**customer)) for name, _, message, _, _ in picks]
+
+def run_session(agent, flow: str, context: Dict[str, str], plan: List[Tuple[str, str]]) -> List[Result]:
+    results = []
+    for scenario, message in plan:
+        start = time.perf_counter()
+        if flow == "stream":
+            answer = ""
+            for event in agent.stream_message(message, context):
+                if event["type"] == "final":
+                    answer = event["content"]
+        else:
+            answer = agent.process_message(message, context)
+        results.append((scenario, time.perf_counter() - start, outcome(answer)))
+    return results
+
+async def arun_session(agent, context: Dict[str, str], plan: List[Tuple[str, str]]) -> List[Result]:
+    results = []
+    for scenario, message in plan:
+        start = time.perf_counter()
+        answer = await agent.aprocess_message(message, context)
+        results.append((scenario, time.perf_counter() - start, outcome(answer)))
+    return results
+
+def log_in(n: int, context: Dict[str, str]) -> Dict[str, Any]:
+    """Log a session's customer in as the sidebar does, starting the prefetch of their snapshot"""
+    from agent import customer_context_manager
+
+    session_id = f"load-test-{n}"
+    customer_context_manager.set_customer_id(session_id, context["customer_id"])
+    customer_context_manager.update_context(session_id, {"customer_email": context["customer_email"]})
+    return customer_context_manager.get_context(session_id)
+
+def run_load(stub: Optional[StubOllama], sessions: int, turns: int, flow: str, seed: int,
+             login: bool = False) -> Tuple[List[Result], float]:
+    """Run every session concurrently; returns the results and the wall time"""
+    from agent import EcommerceAgent
+
+    plans = [session_plan(n, turns, seed) for n in range(sessions)]
+    agents = [EcommerceAgent() for _ in range(sessions)]
+    # Count from here; the background warm-up and health probes are not LLM calls
+    metrics.reset()
+    if stub:
+        stub.reset()
+    start = time.perf_counter()
+    if login:
+        # Sessions log in as the load starts, so first messages race their prefetch
+        plans = [(log_in(n, context), plan) for n, (context, plan) in enumerate(plans)]
+    if flow == "async":
+        async def run_all():
+            return await asyncio.gather(*(arun_session(agent, context, plan)
+                                          for agent, (context, plan) in zip(agents, plans)))
+        per_session = asyncio.run(run_all())
+    else:
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            per_session = list(pool.map(lambda args: run_session(args[0], flow, *args[1]), zip(agents, plans)))
+    return [result for results in per_session for result in results], time.perf_counter() - start
+
+def report(results: List[Result], elapsed: float, stub: Optional[StubOllama]):
+    latencies = [latency for _, latency, _ in results]
+    outcomes = [result for *_, result in results]
+    print(f"{len(results)} requests in {elapsed:.2f}s: {len(results) / elapsed:.1f} requests/s, "
+          f"{outcomes.count('error')} errors, {outcomes.count('unresolved')} hit the iteration limit")
+    print(f"latency (ms): p50 {percentile(latencies, 50) * 1000:.0f}  p95 {percentile(latencies, 95) * 1000:.0f}  "
+          f"p99 {percentile(latencies, 99) * 1000:.0f}  max {max(latencies) * 1000:.0f}")
+
+    print(f"\n{'scenario':<16} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'LLM calls/req':>14}")
+    for name, *_ in SCENARIOS:
+        times = [latency for scenario, latency, _ in results if scenario == name]
+        if times:
+            print(f"{name:<16} {len(times):>8} {percentile(times, 50) * 1000:>8.0f} {percentile(times, 95) * 1000:>8.0f} "
+                  + (f"{stub.calls.get(name, 0) / len(times):>14.2f}" if stub else f"{'-':>14}"))
+
+    if stub:
+        llm_calls = sum(stub.calls.values())
+        print(f"\nLLM calls: {llm_calls} ({llm_calls / len(results):.2f} per request, {stub.calls.get('other', 0)} "
+              f"outside agent turns), mean queue wait {stub.queue_wait / max(llm_calls, 1) * 1000:.0f} ms")
+    else:
+        llm_calls = int(metrics.counter("llm.calls"))
+        print(f"\nLLM calls: {llm_calls} ({llm_calls / len(results):.2f} per request)")
+    resolved = outcomes.count("ok")
+    parse_errors = metrics.counter("agent.parse_errors")
+    print(f"{llm_calls / max(resolved, 1):.2f} LLM calls per resolved query; {parse_errors:.0f} parse failures "
+          f"({parse_errors / max(llm_calls, 1):.1%} of LLM calls)")
+    print(f"ReAct output parser: {metrics.counter('agent.llm_calls_saved'):.0f} LLM calls saved by repairing "
+          f"malformed output")
+    print(f"answered without the LLM: router {metrics.counter('router.hit'):.0f}, response cache "
+          f"{metrics.counter('cache.hit.exact') + metrics.counter('cache.hit.similar'):.0f}")
+
+    if metrics.counter("prefetch.used") or metrics.counter("prefetch.missed"):
+        prefetch = metrics.snapshot()["timings"].get("prefetch.latency", {})
+        print(f"login prefetch: snapshot in {metrics.counter('prefetch.used'):.0f} prompts, missed the deadline "
+              f"in {metrics.counter('prefetch.missed'):.0f}; {prefetch.get('count', 0)} fetches, "
+              f"mean {prefetch.get('mean', 0) * 1000:.1f} ms")
+    print(f"repeated actions: {metrics.counter('agent.tool_calls_saved'):.0f} tool calls served from the run memo, "
+          f"{metrics.counter('agent.cycles_stopped'):.0f} cycles stopped, "
+          f"{metrics.counter('agent.iterations_saved'):.0f} LLM iterations saved")
+
+    from health import get_ollama_monitor
+    health = get_ollama_monitor().status()
+    print(f"Ollama health: {health['state']}, model loaded {health['model_loaded']}, warm-up {health['warm_up']}"
+          + (f", probe {health['latency'] * 1000:.1f} ms" if health["latency"] is not None else ""))
+
+    timings = {name[len("tool.latency."):]: timing for name, timing in metrics.snapshot()["timings"].items()
+               if name.startswith("tool.latency.")}
+    print(f"\n{'tool':<24} {'calls':>6} {'mean ms':>8} {'max ms':>8} {'total ms':>9}")
+    for name, timing in sorted(timings.items(), key=lambda item: -item[1]["total"]):
+        print(f"{name:<24} {timing['count']:>6} {timing['mean'] * 1000:>8.2f} {timing['max'] * 1000:>8.2f} "
+              f"{timing['total'] * 1000:>9.1f}")
+    agent_time = metrics.snapshot()["timings"].get("agent.latency", {}).get("total", 0.0)
+    if agent_time:
+        tool_time = sum(timing["total"] for timing in timings.values())
+        print(f"tools took {tool_time / agent_time:.1%} of the time spent in agent runs")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--turns", type=int, default=5, help="messages per session")
+    parser.add_argument("--flow", choices=["process", "stream", "async"], default="process",
+                        help="process_message, stream_message (the app's path) or aprocess_message")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub LLM seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="stub LLM seconds per streamed chunk")
+    parser.add_argument("--parallel", type=int, default=4, help="requests the stub LLM serves at once")
+    parser.add_argument("--weather-delay", type=float, default=0.1, help="stub weather server latency in seconds")
+    parser.add_argument("--mode", choices=["react", "tools"], default="react",
+                        help="AGENT_MODE: text ReAct on /api/generate or native tool calls on /api/chat")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="share of stub ReAct actions sent without their Action Input line")
+    parser.add_argument("--ollama-url", help="load a real Ollama at this URL instead of the stub")
+    parser.add_argument("--login", action="store_true",
+                        help="log sessions in as the app does, prefetching a customer snapshot into the prompt")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show the agent's own output")
+    args = parser.parse_args()
+
+    stub = None if args.ollama_url else StubOllama(args.latency, args.token_delay, args.parallel,
+                                                   args.malformed_rate, args.seed).start()
+    weather_server, _ = start_stub_weather_server(args.weather_delay)
+    os.environ.update({
+        "AGENT_MODE": args.mode,
+        "OLLAMA_BASE_URL": args.ollama_url or stub.url,
+        "WEATHER_API_KEY": "stub-key",
+        "WEATHER_API_URL": f"http://127.0.0.1:{weather_server.server_port}/weather",
+    })
+    if stub:
+        llm = (f"stub LLM {args.latency:.2f}s + {args.token_delay * 1000:.0f} ms/chunk, {args.parallel} at a time, "
+               f"{args.malformed_rate:.0%} malformed ReAct actions")
+    else:
+        llm = f"Ollama at {args.ollama_url}"
+    print(f"{args.mode} agent, flow {args.flow}, {args.sessions} sessions x {args.turns} turns; {llm}")
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        results, elapsed = run_load(stub, args.sessions, args.turns, args.flow, args.seed, args.login)
+    report(results, elapsed, stub)
+    if stub:
+        stub.stop()
+    weather_server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Lightweight in-process metrics for the e-commerce chatbot
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+class Metrics:
+    """Thread-safe counters and timing summaries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Add value to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        """Record one duration for a timing"""
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {"count": 0, "total": 0.0, "max": 0.0}
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> float:
+        """Get the current value of a counter"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def mean(self, name: str) -> float:
+        """Get the mean of a timing in seconds, 0 if never observed"""
+        with self._lock:
+            timing = self._timings.get(name)
+            return timing["total"] / timing["count"] if timing else 0.0
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Get a copy of all counters and timings"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {name: dict(timing, mean=timing["total"] / timing["count"])
+                            for name, timing in self._timings.items()}
+            }
+
+    def reset(self):
+        """Clear all counters and timings"""
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count, about 4 characters per token for English text"""
+    return (len(text) + 3) // 4
+
+# Process-wide metrics registry
+metrics = Metrics()
@@ -1,380 +1,1127 @@
-"""
-Mock database classes for the e-commerce chatbot
-"""
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union
-import random
-
-class MockOrderDatabase:
-    """Mock order management system"""
-    
-    def __init__(self):
-        self.orders = {
-            "ORD001": {
-                "order_id": "ORD001",
-                "customer_id": "CUST001",
-                "status": "shipped",
-                "items": [
-                    {"product_id": "PROD001", "name": "Wireless Headphones", "quantity": 1, "price": 99.99}
-                ],
-                "total": 99.99,
-                "order_date": "2024-01-15",
-                "shipping_address": "123 Main St, New York, NY",
-                "tracking_number": "TRK123456789",
-                "can_cancel": False
-            },
-            "ORD002": {
-                "order_id": "ORD002",
-                "customer_id": "CUST001",
-                "status": "processing",
-                "items": [
-                    {"product_id": "PROD002", "name": "Smart Watch", "quantity": 1, "price": 249.99},
-                    {"product_id": "PROD003", "name": "Phone Case", "quantity": 2, "price": 19.99}
-                ],
-                "total": 289.97,
-                "order_date": "2024-01-20",
-                "shipping_address": "123 Main St, New York, NY",
-                "tracking_number": None,
-                "can_cancel": True
-            },
-            "ORD003": {
-                "order_id": "ORD003",
-                "customer_id": "CUST002",
-                "status": "delivered",
-                "items": [
-                    {"product_id": "PROD004", "name": "Laptop Stand", "quantity": 1, "price": 45.99}
-                ],
-                "total": 45.99,
-                "order_date": "2024-01-10",
-                "shipping_address": "456 Oak Ave, Los Angeles, CA",
-                "tracking_number": "TRK987654321",
-                "can_cancel": False
-            },
-            "ORD004": {
-                "order_id": "ORD004",
-                "customer_id": "CUST003",
-                "status": "processing",
-                "items": [
-                    {"product_id": "PROD005", "name": "Winter Jacket", "quantity": 1, "price": 89.99}
-                ],
-                "total": 89.99,
-                "order_date": "2024-01-22",
-                "shipping_address": "789 Pine Rd, Chicago, IL",
-                "tracking_number": None,
-                "can_cancel": True
-            },
-            "ORD005": {
-                "order_id": "ORD005",
-                "customer_id": "CUST004",
-                "status": "delivered",
-                "items": [
-                    {"product_id": "PROD006", "name": "Gaming Mouse", "quantity": 1, "price": 59.99}
-                ],
-                "total": 59.99,
-                "order_date": "2024-01-18",
-                "shipping_address": "321 Elm St, Houston, TX",
-                "tracking_number": "TRK2468101214",
-                "can_cancel": False
-            },
-            "ORD006": {
-                "order_id": "ORD006",
-                "customer_id": "CUST005",
-                "status": "processing",
-                "items": [
-                    {"product_id": "PROD007", "name": "Bluetooth Speaker", "quantity": 2, "price": 34.99}
-                ],
-                "total": 69.98,
-                "order_date": "2024-01-21",
-                "shipping_address": "654 Maple Ln, Miami, Florida",
-                "tracking_number": None,
-                "can_cancel": True
-            }
-        }
-    
-    def get_order_status(self, order_id: str) -> Optional[Dict]:
-        """Get order status by order ID"""
-        return self.orders.get(order_id)
-    
-    def cancel_order(self, order_id: str) -> Dict[str, Union[bool, str]]:
-        """Cancel an order if possible"""
-        order = self.orders.get(order_id)
-        if not order:
-            return {"success": False, "message": "Order not found"}
-        
-        if not order["can_cancel"]:
-            return {"success": False, "message": "Order cannot be cancelled (already shipped/delivered)"}
-        
-        order["status"] = "cancelled"
-        order["can_cancel"] = False
-        return {"success": True, "message": "Order cancelled successfully"}
-    
-    def process_return(self, order_id: str, reason: str = "") -> Dict[str, Union[bool, str]]:
-        """Process a return request"""
-        order = self.orders.get(order_id)
-        if not order:
-            return {"success": False, "message": "Order not found"}
-        
-        if order["status"] not in ["delivered"]:
-            return {"success": False, "message": "Order must be delivered to process return"}
-        
-        # Mock return processing
-        return {
-            "success": True, 
-            "message": f"Return request processed. Return ID: RET{random.randint(1000, 9999)}. Please ship items back within 30 days."
-        }
-
-class MockProductDatabase:
-    """Mock product information system"""
-    
-    def __init__(self):
-        self.products = {
-            "PROD001": {
-                "product_id": "PROD001",
-                "name": "Wireless Headphones",
-                "category": "Electronics",
-                "price": 99.99,
-                "availability": "in_stock",
-                "stock_count": 25,
-                "description": "High-quality wireless headphones with noise cancellation",
-                "rating": 4.5,
-                "features": ["Bluetooth 5.0", "30-hour battery", "Active noise cancellation"]
-            },
-            "PROD002": {
-                "product_id": "PROD002",
-                "name": "Smart Watch",
-                "category": "Electronics",
-                "price": 249.99,
-                "availability": "in_stock",
-                "stock_count": 12,
-                "description": "Feature-rich smartwatch with health monitoring",
-                "rating": 4.3,
-                "features": ["Heart rate monitor", "GPS", "Water resistant", "7-day battery"]
-            },
-            "PROD003": {
-                "product_id": "PROD003",
-                "name": "Phone Case",
-                "category": "Accessories",
-                "price": 19.99,
-                "availability": "in_stock",
-                "stock_count": 100,
-                "description": "Durable protective phone case",
-                "rating": 4.1,
-                "features": ["Drop protection", "Wireless charging compatible", "Clear design"]
-            },
-            "PROD004": {
-                "product_id": "PROD004",
-                "name": "Laptop Stand",
-                "category": "Office",
-                "price": 45.99,
-                "availability": "low_stock",
-                "stock_count": 3,
-                "description": "Adjustable laptop stand for ergonomic working",
-                "rating": 4.7,
-                "features": ["Adjustable height", "Foldable", "Heat dissipation", "Universal compatibility"]
-            },
-            "PROD005": {
-                "product_id": "PROD005",
-                "name": "Winter Jacket",
-                "category": "Clothing",
-                "price": 89.99,
-                "availability": "in_stock",
-                "stock_count": 15,
-                "description": "Warm and waterproof winter jacket",
-                "rating": 4.4,
-                "features": ["Waterproof", "Insulated", "Multiple pockets", "Wind resistant"]
-            },
-            "PROD006": {
-                "product_id": "PROD006",
-                "name": "Gaming Mouse",
-                "category": "Electronics",
-                "price": 59.99,
-                "availability": "in_stock",
-                "stock_count": 40,
-                "description": "Ergonomic gaming mouse with customizable buttons",
-                "rating": 4.6,
-                "features": ["RGB lighting", "High precision sensor", "Wireless and wired modes"]
-            },
-            "PROD007": {
-                "product_id": "PROD007",
-                "name": "Bluetooth Speaker",
-                "category": "Electronics",
-                "price": 34.99,
-                "availability": "in_stock",
-                "stock_count": 50,
-                "description": "Portable Bluetooth speaker with rich bass",
-                "rating": 4.2,
-                "features": ["Water resistant", "12-hour battery", "Compact design"]
-            },
-            "PROD008": {
-                "product_id": "PROD008",
-                "name": "Desk Lamp",
-                "category": "Office",
-                "price": 29.99,
-                "availability": "in_stock",
-                "stock_count": 20,
-                "description": "LED desk lamp with adjustable brightness",
-                "rating": 4.0,
-                "features": ["Adjustable brightness", "Touch control", "Energy efficient"]
-            },
-            "PROD009": {
-                "product_id": "PROD009",
-                "name": "Running Shoes",
-                "category": "Clothing",
-                "price": 75.99,
-                "availability": "in_stock",
-                "stock_count": 30,
-                "description": "Lightweight running shoes for everyday use",
-                "rating": 4.3,
-                "features": ["Breathable material", "Cushioned sole", "Durable outsole"]
-            },
-            "PROD010": {
-                "product_id": "PROD010",
-                "name": "Coffee Mug",
-                "category": "Accessories",
-                "price": 14.99,
-                "availability": "in_stock",
-                "stock_count": 60,
-                "description": "Ceramic coffee mug with a sleek design",
-                "rating": 4.5,
-                "features": ["Microwave safe", "Dishwasher safe", "350ml capacity"]
-            }
-        }
-    
-    def search_products(self, query: str, category: str = None) -> List[Dict]:
-        """Search products by name or category"""
-        results = []
-        query_lower = query.lower()
-        
-        for product in self.products.values():
-            match = False
-            
-            # Check name match
-            if query_lower in product["name"].lower():
-                match = True
-            
-            # Check category match if specified
-            if category and category.lower() != product["category"].lower():
-                match = False
-            
-            if match:
-                results.append(product)
-        
-        return results
-    
-    def get_product_details(self, product_id: str) -> Optional[Dict]:
-        """Get detailed product information"""
-        return self.products.get(product_id)
-    
-    def get_recommendations(self, category: str = None, weather_condition: str = None) -> List[Dict]:
-        """Get product recommendations based on category or weather"""
-        recommendations = []
-        
-        if weather_condition:
-            if "cold" in weather_condition.lower() or "winter" in weather_condition.lower():
-                # Recommend winter items
-                recommendations = [p for p in self.products.values() if "winter" in p["name"].lower() or p["category"].lower() == "clothing"]
-            elif "rain" in weather_condition.lower():
-                # Recommend waterproof items
-                recommendations = [p for p in self.products.values() if any("waterproof" in f.lower() for f in p.get("features", []))]
-        
-        if not recommendations and category:
-            recommendations = [p for p in self.products.values() if p["category"].lower() == category.lower()]
-        
-        if not recommendations:
-            # Default recommendations (top rated)
-            recommendations = sorted(self.products.values(), key=lambda x: x["rating"], reverse=True)[:3]
-        
-        return recommendations
-
-class MockCustomerDatabase:
-    """Mock customer database"""
-    
-    def __init__(self):
-        self.customers = {
-            "CUST001": {
-                "customer_id": "CUST001",
-                "name": "John Doe",
-                "email": "john.doe@email.com",
-                "phone": "+1-555-0123",
-                "address": "123 Main St, New York, NY",
-                "loyalty_points": 1250,
-                "tier": "Gold",
-                "preferences": {
-                    "categories": ["Electronics", "Books"],
-                    "brands": ["TechBrand", "BookCorp"],
-                    "communication": "email"
-                },
-                "order_history": ["ORD001", "ORD002"]
-            },
-            "CUST002": {
-                "customer_id": "CUST002",
-                "name": "Jane Smith",
-                "email": "jane.smith@email.com",
-                "phone": "+1-555-0456",
-                "address": "456 Oak Ave, Los Angeles, CA",
-                "loyalty_points": 750,
-                "tier": "Silver",
-                "preferences": {
-                    "categories": ["Home", "Office"],
-                    "brands": ["HomePlus", "OfficeMax"],
-                    "communication": "sms"
-                },
-                "order_history": ["ORD003"]
-            },
-            "CUST003": {
-                "customer_id": "CUST003",
-                "name": "Alice Johnson",
-                "email": "alice.johnson@email.com",
-                "phone": "+1-555-0789",
-                "address": "789 Pine Rd, Chicago, Illinois",
-                "loyalty_points": 300,
-                "tier": "Bronze",
-                "preferences": {
-                    "categories": ["Clothing", "Accessories"],
-                    "brands": ["Fashionista", "Accents"],
-                    "communication": "email"
-                },
-                "order_history": ["ORD004"]
-            },
-            "CUST004": {
-                "customer_id": "CUST004",
-                "name": "Bob Brown",
-                "email": "bob.brown@email.com",
-                "phone": "+1-555-0110",
-                "address": "321 Elm St, Houston, Texas",
-                "loyalty_points": 980,
-                "tier": "Gold",
-                "preferences": {
-                    "categories": ["Electronics", "Gaming"],
-                    "brands": ["GamePro", "TechBrand"],
-                    "communication": "sms"
-                },
-                "order_history": ["ORD005"]
-            },
-            "CUST005": {
-                "customer_id": "CUST005",
-                "name": "Carol White",
-                "email": "carol.white@email.com",
-                "phone": "+1-555-0222",
-                "address": "654 Maple Ln, Miami, Florida",
-                "loyalty_points": 450,
-                "tier": "Silver",
-                "preferences": {
-                    "categories": ["Electronics", "Home"],
-                    "brands": ["HomePlus", "SoundMaster"],
-                    "communication": "email"
-                },
-                "order_history": ["ORD006"]
-            }
-        }
-    
-    def get_customer_info(self, customer_id: str) -> Optional[Dict]:
-        """Get customer information"""
-        return self.customers.get(customer_id)
-    
-    def get_customer_by_email(self, email: str) -> Optional[Dict]:
-        """Get customer by email"""
-        for customer in self.customers.values():
-            if customer["email"].lower() == email.lower():
-                return customer
-        return None
+"""
+Mock database classes for the e-commerce chatbot
+"""
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+import heapq
+import math
+import re
+import threading
+
+from events import change_events
+from storage import Filter, InMemoryStorage, Storage, boost_score, matches_filters
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Product search relevance: BM25 over weighted fields, plus boosts on rating and availability
+SEARCH_FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "features": 1.5, "description": 1.0}
+SEARCH_BOOSTS = {"rating": 0.5, "availability": {"in_stock": 1.0, "low_stock": 0.5, "out_of_stock": -2.0}}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A query word also matches longer words it starts, at a discount
+PREFIX_MATCH_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_EXPANSIONS = 50
+# Weather keywords -> recommendation tags (words of a product's name or features)
+# and categories of the products to recommend for it
+WEATHER_RECOMMENDATIONS = [
+    (("cold", "winter"), ["winter"], ["clothing"]),
+    (("rain",), ["waterproof"], []),
+]
+RECOMMENDATION_TAGS = {tag for _, tags, _ in WEATHER_RECOMMENDATIONS for tag in tags}
+RECOMMENDATION_LIMIT = 5
+# Cached term impacts are recomputed once the average product length moves this much
+IMPACT_LENGTH_DRIFT = 0.1
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+def _normalize_email(email: str) -> str:
+    """Normalize an email address for index lookups"""
+    return email.strip().lower()
+
+# Idempotency keys remembered per order
+MAX_IDEMPOTENCY_KEYS = 20
+
+# Return statuses -> statuses a return can move to next
+RETURN_TRANSITIONS = {
+    "requested": ["label_sent", "cancelled"],
+    "label_sent": ["in_transit", "cancelled"],
+    "in_transit": ["received"],
+    "received": ["refunded", "rejected"],
+    "refunded": [],
+    "rejected": [],
+    "cancelled": [],
+}
+
+# Allowed preference keys: (value kind, allowed values or None for free text)
+PREFERENCE_SCHEMA = {
+    "categories": ("list", None),
+    "brands": ("list", None),
+    "communication": ("choice", {"email", "sms", "phone", "none"}),
+}
+MAX_PREFERENCE_ITEMS = 20
+
+def validate_preferences(preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Check preference changes against PREFERENCE_SCHEMA, returning them normalized
+
+    Lists accept a list or a comma-separated string and are de-duplicated
+    case-insensitively. Raises ValueError naming the first problem.
+    """
+    if not isinstance(preferences, dict) or not preferences:
+        raise ValueError("no preferences given")
+    normalized: Dict[str, Any] = {}
+    for key, value in preferences.items():
+        key = str(key).strip().lower()
+        if key not in PREFERENCE_SCHEMA:
+            raise ValueError(f"unknown preference '{key}' (allowed: {', '.join(PREFERENCE_SCHEMA)})")
+        kind, allowed = PREFERENCE_SCHEMA[key]
+        if kind == "list":
+            items = value.split(",") if isinstance(value, str) else value
+            if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                raise ValueError(f"'{key}' must be a list of names")
+            unique: Dict[str, str] = {}
+            for item in (item.strip() for item in items):
+                if item:
+                    unique.setdefault(item.lower(), item)
+            if len(unique) > MAX_PREFERENCE_ITEMS:
+                raise ValueError(f"'{key}' allows at most {MAX_PREFERENCE_ITEMS} entries")
+            normalized[key] = list(unique.values())
+        else:
+            choice = str(value).strip().lower()
+            if choice not in allowed:
+                raise ValueError(f"'{key}' must be one of: {', '.join(sorted(allowed))}")
+            normalized[key] = choice
+    return normalized
+
+def _preferred_categories(customer: Dict) -> Set[str]:
+    """Lowercase categories in a customer's preferences"""
+    return {str(category).lower() for category in customer.get("preferences", {}).get("categories", [])}
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+def _parse_order_cursor(cursor: str) -> Tuple[str, str]:
+    """Split an "order_date|order_id" page cursor, raises ValueError if malformed"""
+    order_date, separator, order_id = cursor.strip().partition("|")
+    try:
+        datetime.strptime(order_date, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}") from None
+    if not separator or not order_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return order_date, order_id
+
+class _RankedIndex:
+    """Item ids per key in ascending (rank, id) order
+
+    Appends are sorted lazily on the next read of their list: they land after a
+    sorted run, which sort() merges in near-linear time, so bulk loads stay cheap.
+    """
+
+    def __init__(self):
+        self._lists: Dict[str, List[Tuple[float, str]]] = {}
+        self._unsorted: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, key: str, rank: float, item_id: str):
+        with self._lock:
+            self._lists.setdefault(key, []).append((rank, item_id))
+            self._unsorted.add(key)
+
+    def remove(self, key: str, rank: float, item_id: str):
+        with self._lock:
+            ranked = self._sorted(key)
+            position = bisect_left(ranked, (rank, item_id))
+            if position < len(ranked) and ranked[position] == (rank, item_id):
+                del ranked[position]
+            if not ranked:
+                self._lists.pop(key, None)
+
+    def ranked(self, key: str) -> List[Tuple[float, str]]:
+        """The (rank, id) list for a key, best first; empty if the key has no items"""
+        with self._lock:
+            return self._sorted(key)
+
+    def _sorted(self, key: str) -> List[Tuple[float, str]]:
+        ranked = self._lists.get(key, [])
+        if key in self._unsorted:
+            ranked.sort()
+            self._unsorted.discard(key)
+        return ranked
+
+def _first_ids(ranked: Iterable[Tuple[float, str]], limit: int) -> List[str]:
+    """The first limit distinct ids of (rank, id) pairs"""
+    top: List[str] = []
+    for _, item_id in ranked:
+        if item_id not in top:
+            top.append(item_id)
+            if len(top) >= limit:
+                break
+    return top
+
+class MockOrderDatabase:
+    """Mock order management system"""
+    
+    def __init__(self, storage: Optional[Storage] = None):
+        storage = storage or InMemoryStorage()
+        self._shared_storage = storage.shared
+        self.orders = storage.collection("orders")
+        self.orders.seed({
+            "ORD001": {
+                "order_id": "ORD001",
+                "customer_id": "CUST001",
+                "status": "shipped",
+                "items": [
+                    {"product_id": "PROD001", "name": "Wireless Headphones", "quantity": 1, "price": 99.99}
+                ],
+                "total": 99.99,
+                "order_date": "2024-01-15",
+                "shipping_address": "123 Main St, New York, NY",
+                "tracking_number": "TRK123456789",
+                "can_cancel": False
+            },
+            "ORD002": {
+                "order_id": "ORD002",
+                "customer_id": "CUST001",
+                "status": "processing",
+                "items": [
+                    {"product_id": "PROD002", "name": "Smart Watch", "quantity": 1, "price": 249.99},
+                    {"product_id": "PROD003", "name": "Phone Case", "quantity": 2, "price": 19.99}
+                ],
+                "total": 289.97,
+                "order_date": "2024-01-20",
+                "shipping_address": "123 Main St, New York, NY",
+                "tracking_number": None,
+                "can_cancel": True
+            },
+            "ORD003": {
+                "order_id": "ORD003",
+                "customer_id": "CUST002",
+                "status": "delivered",
+                "items": [
+                    {"product_id": "PROD004", "name": "Laptop Stand", "quantity": 1, "price": 45.99}
+                ],
+                "total": 45.99,
+                "order_date": "2024-01-10",
+                "shipping_address": "456 Oak Ave, Los Angeles, CA",
+                "tracking_number": "TRK987654321",
+                "can_cancel": False
+            },
+            "ORD004": {
+                "order_id": "ORD004",
+                "customer_id": "CUST003",
+                "status": "processing",
+                "items": [
+                    {"product_id": "PROD005", "name": "Winter Jacket", "quantity": 1, "price": 89.99}
+                ],
+                "total": 89.99,
+                "order_date": "2024-01-22",
+                "shipping_address": "789 Pine Rd, Chicago, IL",
+                "tracking_number": None,
+                "can_cancel": True
+            },
+            "ORD005": {
+                "order_id": "ORD005",
+                "customer_id": "CUST004",
+                "status": "delivered",
+                "items": [
+                    {"product_id": "PROD006", "name": "Gaming Mouse", "quantity": 1, "price": 59.99}
+                ],
+                "total": 59.99,
+                "order_date": "2024-01-18",
+                "shipping_address": "321 Elm St, Houston, TX",
+                "tracking_number": "TRK2468101214",
+                "can_cancel": False
+            },
+            "ORD006": {
+                "order_id": "ORD006",
+                "customer_id": "CUST005",
+                "status": "processing",
+                "items": [
+                    {"product_id": "PROD007", "name": "Bluetooth Speaker", "quantity": 2, "price": 34.99}
+                ],
+                "total": 69.98,
+                "order_date": "2024-01-21",
+                "shipping_address": "654 Maple Ln, Miami, Florida",
+                "tracking_number": None,
+                "can_cancel": True
+            }
+        })
+        self._customer_orders: Dict[str, List[Tuple[str, str]]] = {}
+        # Other processes write to shared storage, so its SQL indexes serve customer pages instead
+        if not self._shared_storage:
+            for order in self.orders.values():
+                insort(self._customer_orders.setdefault(order["customer_id"], []), (order["order_date"], order["order_id"]))
+
+        self.returns = storage.collection("returns")
+        # Return ids come from a stored counter, so they never repeat across restarts or processes
+        self._sequences = storage.collection("sequences")
+        self._sequences.seed({"returns": {"next": 1}})
+        # order/customer id -> return ids, oldest first; SQL indexes serve these on shared storage
+        self._order_returns: Dict[str, List[str]] = {}
+        self._customer_returns: Dict[str, List[str]] = {}
+        self._returns_lock = threading.Lock()
+        if not self._shared_storage:
+            for record in self.returns.values():
+                self._index_return(record)
+    
+    def add_order(self, order: Dict):
+        """Add an order and index it under its customer"""
+        existing = self.orders.get(order["order_id"])
+        if existing and not self._shared_storage:
+            keys = self._customer_orders[existing["customer_id"]]
+            keys.remove((existing["order_date"], existing["order_id"]))
+        self.orders[order["order_id"]] = order
+        change_events.publish("order.updated", order_id=order["order_id"], customer_id=order["customer_id"])
+        if not self._shared_storage:
+            insort(self._customer_orders.setdefault(order["customer_id"], []), (order["order_date"], order["order_id"]))
+
+    def get_orders_for_customer(self, customer_id: str, limit: int = 10, cursor: Optional[str] = None) -> Dict:
+        """Get a page of a customer's orders, newest first
+
+        Pass the returned next_cursor back in to fetch the following page.
+        Raises ValueError for a limit below 1 or a cursor that was not
+        produced by this method.
+        """
+        if limit < 1:
+            raise ValueError(f"Invalid limit: {limit}")
+        before = _parse_order_cursor(cursor) if cursor else None
+        if self._shared_storage:
+            # One extra row tells whether an older page exists
+            orders = self.orders.find_page("customer_id", customer_id, "order_date", limit + 1, before)
+            has_more = len(orders) > limit
+            orders = orders[:limit]
+            return {
+                "orders": orders,
+                "next_cursor": f"{orders[-1]['order_date']}|{orders[-1]['order_id']}" if has_more else None,
+                "total": self.orders.count("customer_id", customer_id)
+            }
+
+        keys = self._customer_orders.get(customer_id, [])
+        end = bisect_left(keys, before) if before else len(keys)
+        start = max(0, end - limit)
+        return {
+            "orders": self.orders.get_many(order_id for _, order_id in reversed(keys[start:end])),
+            "next_cursor": "|".join(keys[start]) if start > 0 else None,
+            "total": len(keys)
+        }
+
+    def get_order_status(self, order_id: str) -> Optional[Dict]:
+        """Get order status by order ID"""
+        return self.orders.get(order_id)
+    
+    def _mutate(self, order_id: str, operation: str, idempotency_key: Optional[str],
+                apply: Callable[[Dict], Dict[str, Any]]) -> Dict[str, Any]:
+        """Run apply(order) -> result atomically on one order, honouring an idempotency key
+
+        A key seen before on this order returns the first result again (with
+        replayed=True) without re-running the operation. order.updated is
+        published after the write, and only when the order changed.
+        """
+        outcome: Dict[str, Any] = {}
+
+        def change(order: Dict) -> Optional[Dict]:
+            seen = order.get("idempotency_keys", {})
+            if idempotency_key and idempotency_key in seen:
+                previous = seen[idempotency_key]
+                if previous["operation"] != operation:
+                    outcome.update(success=False, message=f"Idempotency key {idempotency_key} was already used "
+                                                          f"for a {previous['operation']} request")
+                else:
+                    outcome.update(previous["result"], replayed=True)
+                return None
+            outcome.update(apply(order))
+            if idempotency_key:
+                seen = dict(seen)
+                seen[idempotency_key] = {"operation": operation, "result": dict(outcome)}
+                # Keep the most recent keys only; retries come soon after the original request
+                order["idempotency_keys"] = dict(list(seen.items())[-MAX_IDEMPOTENCY_KEYS:])
+            # apply only changes the order when it succeeds
+            return order if idempotency_key or outcome["success"] else None
+
+        order = self.orders.modify(order_id, change)
+        if order is None:
+            return {"success": False, "message": "Order not found"}
+        if outcome["success"] and not outcome.get("replayed"):
+            change_events.publish("order.updated", order_id=order_id, customer_id=order["customer_id"])
+        return outcome
+
+    def cancel_order(self, order_id: str, idempotency_key: Optional[str] = None) -> Dict[str, Union[bool, str]]:
+        """Cancel an order if possible, atomically; a repeated idempotency key returns the first result"""
+        def cancel(order: Dict) -> Dict[str, Any]:
+            if order["status"] == "cancelled":
+                return {"success": False, "message": "Order is already cancelled"}
+            if not order["can_cancel"]:
+                return {"success": False, "message": "Order cannot be cancelled (already shipped/delivered)"}
+            order["status"] = "cancelled"
+            order["can_cancel"] = False
+            return {"success": True, "message": "Order cancelled successfully"}
+
+        return self._mutate(order_id, "cancel", idempotency_key, cancel)
+    
+    def process_return(self, order_id: str, reason: str = "",
+                       idempotency_key: Optional[str] = None) -> Dict[str, Union[bool, str]]:
+        """Open a return for a delivered order, at most one open return per order
+
+        The return is stored as a record (see get_return). A repeated
+        idempotency key returns the first result.
+        """
+        order = self.orders.get(order_id)
+        replay = order is not None and idempotency_key in order.get("idempotency_keys", {})
+        # Only number requests that look like they will succeed; losing a race leaves a gap in the ids
+        return_id = (self._next_return_id()
+                     if order and not replay and order["status"] == "delivered" and not order.get("return_id")
+                     else None)
+
+        def request_return(order: Dict) -> Dict[str, Any]:
+            if order.get("return_id"):
+                return {"success": False, "message": f"A return was already requested for this order. Return ID: {order['return_id']}"}
+            if order["status"] not in ["delivered"] or return_id is None:
+                return {"success": False, "message": "Order must be delivered to process return"}
+            order["return_id"] = return_id
+            return {
+                "success": True,
+                "return_id": return_id,
+                "message": f"Return request processed. Return ID: {return_id}. Please ship items back within 30 days."
+            }
+
+        result = self._mutate(order_id, "return", idempotency_key, request_return)
+        if result["success"] and not result.get("replayed"):
+            now = _now()
+            self._add_return({
+                "return_id": return_id,
+                "order_id": order_id,
+                "customer_id": order["customer_id"],
+                "reason": reason,
+                "status": "requested",
+                "items": order["items"],
+                "refund_amount": order["total"],
+                "created_at": now,
+                "updated_at": now,
+                "history": [{"status": "requested", "at": now}]
+            })
+        return result
+
+    def _next_return_id(self) -> str:
+        counter = self._sequences.modify("returns", lambda counter: {"next": counter["next"] + 1})
+        return f"RET{counter['next'] - 1:06d}"
+
+    def _index_return(self, record: Dict):
+        with self._returns_lock:
+            insort(self._order_returns.setdefault(record["order_id"], []), record["return_id"])
+            insort(self._customer_returns.setdefault(record["customer_id"], []), record["return_id"])
+
+    def _add_return(self, record: Dict):
+        self.returns[record["return_id"]] = record
+        if not self._shared_storage:
+            self._index_return(record)
+        change_events.publish("return.updated", return_id=record["return_id"], order_id=record["order_id"],
+                              customer_id=record["customer_id"])
+
+    def get_return(self, return_id: str) -> Optional[Dict]:
+        """Get a return record by return ID"""
+        return self.returns.get(return_id)
+
+    def _returns_by(self, field: str, value: str, index: Dict[str, List[str]]) -> List[Dict]:
+        if self._shared_storage:
+            return sorted(self.returns.find(field, value), key=itemgetter("return_id"), reverse=True)
+        return self.returns.get_many(reversed(index.get(value, [])))
+
+    def get_returns_for_order(self, order_id: str) -> List[Dict]:
+        """Get an order's returns, newest first"""
+        return self._returns_by("order_id", order_id, self._order_returns)
+
+    def get_returns_for_customer(self, customer_id: str) -> List[Dict]:
+        """Get a customer's returns, newest first"""
+        return self._returns_by("customer_id", customer_id, self._customer_returns)
+
+    def update_return_status(self, return_id: str, status: str, note: str = "") -> Dict[str, Union[bool, str]]:
+        """Move a return to its next status, as allowed by RETURN_TRANSITIONS
+
+        A cancelled return frees its order for a new return request.
+        """
+        outcome: Dict[str, Any] = {}
+
+        def change(record: Dict) -> Optional[Dict]:
+            if status not in RETURN_TRANSITIONS.get(record["status"], []):
+                allowed = ", ".join(RETURN_TRANSITIONS.get(record["status"], [])) or "none"
+                outcome.update(success=False, message=f"Return {return_id} is {record['status']} and cannot become "
+                                                      f"{status} (allowed: {allowed})")
+                return None
+            now = _now()
+            record["status"] = status
+            record["updated_at"] = now
+            record["history"].append({"status": status, "at": now, **({"note": note} if note else {})})
+            outcome.update(success=True, message=f"Return {return_id} is now {status}")
+            return record
+
+        record = self.returns.modify(return_id, change)
+        if record is None:
+            return {"success": False, "message": f"Return {return_id} not found"}
+        if outcome["success"]:
+            if status == "cancelled":
+                self.orders.modify(record["order_id"], lambda order: {**order, "return_id": None}
+                                   if order.get("return_id") == return_id else None)
+                change_events.publish("order.updated", order_id=record["order_id"], customer_id=record["customer_id"])
+            change_events.publish("return.updated", return_id=return_id, order_id=record["order_id"],
+                                  customer_id=record["customer_id"])
+        return outcome
+
+class MockProductDatabase:
+    """Mock product information system"""
+    
+    def __init__(self, storage: Optional[Storage] = None):
+        storage = storage or InMemoryStorage()
+        self._shared_storage = storage.shared
+        self.products = storage.collection("products")
+        # Held while the in-memory indexes change or are read, so a search never sees half an update
+        self._index_lock = threading.Lock()
+        self.products.seed({
+            "PROD001": {
+                "product_id": "PROD001",
+                "name": "Wireless Headphones",
+                "category": "Electronics",
+                "brand": "SoundMaster",
+                "price": 99.99,
+                "availability": "in_stock",
+                "stock_count": 25,
+                "description": "High-quality wireless headphones with noise cancellation",
+                "rating": 4.5,
+                "features": ["Bluetooth 5.0", "30-hour battery", "Active noise cancellation"]
+            },
+            "PROD002": {
+                "product_id": "PROD002",
+                "name": "Smart Watch",
+                "category": "Electronics",
+                "brand": "TechBrand",
+                "price": 249.99,
+                "availability": "in_stock",
+                "stock_count": 12,
+                "description": "Feature-rich smartwatch with health monitoring",
+                "rating": 4.3,
+                "features": ["Heart rate monitor", "GPS", "Water resistant", "7-day battery"]
+            },
+            "PROD003": {
+                "product_id": "PROD003",
+                "name": "Phone Case",
+                "category": "Accessories",
+                "brand": "Accents",
+                "price": 19.99,
+                "availability": "in_stock",
+                "stock_count": 100,
+                "description": "Durable protective phone case",
+                "rating": 4.1,
+                "features": ["Drop protection", "Wireless charging compatible", "Clear design"]
+            },
+            "PROD004": {
+                "product_id": "PROD004",
+                "name": "Laptop Stand",
+                "category": "Office",
+                "brand": "OfficeMax",
+                "price": 45.99,
+                "availability": "low_stock",
+                "stock_count": 3,
+                "description": "Adjustable laptop stand for ergonomic working",
+                "rating": 4.7,
+                "features": ["Adjustable height", "Foldable", "Heat dissipation", "Universal compatibility"]
+            },
+            "PROD005": {
+                "product_id": "PROD005",
+                "name": "Winter Jacket",
+                "category": "Clothing",
+                "brand": "Fashionista",
+                "price": 89.99,
+                "availability": "in_stock",
+                "stock_count": 15,
+                "description": "Warm and waterproof winter jacket",
+                "rating": 4.4,
+                "features": ["Waterproof", "Insulated", "Multiple pockets", "Wind resistant"]
+            },
+            "PROD006": {
+                "product_id": "PROD006",
+                "name": "Gaming Mouse",
+                "category": "Electronics",
+                "brand": "GamePro",
+                "price": 59.99,
+                "availability": "in_stock",
+                "stock_count": 40,
+                "description": "Ergonomic gaming mouse with customizable buttons",
+                "rating": 4.6,
+                "features": ["RGB lighting", "High precision sensor", "Wireless and wired modes"]
+            },
+            "PROD007": {
+                "product_id": "PROD007",
+                "name": "Bluetooth Speaker",
+                "category": "Electronics",
+                "brand": "SoundMaster",
+                "price": 34.99,
+                "availability": "in_stock",
+                "stock_count": 50,
+                "description": "Portable Bluetooth speaker with rich bass",
+                "rating": 4.2,
+                "features": ["Water resistant", "12-hour battery", "Compact design"]
+            },
+            "PROD008": {
+                "product_id": "PROD008",
+                "name": "Desk Lamp",
+                "category": "Office",
+                "brand": "HomePlus",
+                "price": 29.99,
+                "availability": "in_stock",
+                "stock_count": 20,
+                "description": "LED desk lamp with adjustable brightness",
+                "rating": 4.0,
+                "features": ["Adjustable brightness", "Touch control", "Energy efficient"]
+            },
+            "PROD009": {
+                "product_id": "PROD009",
+                "name": "Running Shoes",
+                "category": "Clothing",
+                "brand": "Fashionista",
+                "price": 75.99,
+                "availability": "in_stock",
+                "stock_count": 30,
+                "description": "Lightweight running shoes for everyday use",
+                "rating": 4.3,
+                "features": ["Breathable material", "Cushioned sole", "Durable outsole"]
+            },
+            "PROD010": {
+                "product_id": "PROD010",
+                "name": "Coffee Mug",
+                "category": "Accessories",
+                "brand": "HomePlus",
+                "price": 14.99,
+                "availability": "in_stock",
+                "stock_count": 60,
+                "description": "Ceramic coffee mug with a sleek design",
+                "rating": 4.5,
+                "features": ["Microwave safe", "Dishwasher safe", "350ml capacity"]
+            }
+        })
+        self._build_indexes()
+    
+    def _build_indexes(self):
+        """Build the search indexes from the loaded catalog"""
+        # BM25 postings: token -> {product id: field-weighted term frequency}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._vocabulary: List[str] = []
+        # Per-term BM25 impacts (relevance before idf) by id and best first, computed on
+        # first use against _impact_length and dropped when the term's postings change
+        self._impacts: Dict[str, Tuple[Dict[str, float], List[Tuple[str, float]]]] = {}
+        self._impact_length = 0.0
+        self._category_index: Dict[str, Set[str]] = {}
+        # Product ids by descending search boost, per lowercase category and "" for all
+        self._boosts: Dict[str, float] = {}
+        self._by_boost = _RankedIndex()
+        # Product ids by descending rating for recommendations: "" for all, then
+        # "category:<name>" and "tag:<recommendation tag>"
+        self._by_rating = _RankedIndex()
+        # Other processes write to shared storage, so its SQL indexes serve searches instead
+        if self._shared_storage:
+            return
+        for product in self.products.values():
+            self._index_product(product)
+
+    @staticmethod
+    def _field_tokens(product: Dict) -> Dict[str, float]:
+        """Field-weighted term frequencies of a product's searchable text"""
+        frequencies: Dict[str, float] = {}
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            value = product.get(field) or ""
+            text = " ".join(value) if isinstance(value, list) else str(value)
+            for token in _tokenize(text):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+        return frequencies
+
+    def _index_product(self, product: Dict):
+        """Add a product to the search, category and ranking indexes"""
+        if self._shared_storage:
+            return
+        product_id = product["product_id"]
+        frequencies = self._field_tokens(product)
+        for token, frequency in frequencies.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._vocabulary, token)
+            postings[product_id] = frequency
+            self._impacts.pop(token, None)
+        length = sum(frequencies.values())
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        category = product["category"].lower()
+        self._category_index.setdefault(category, set()).add(product_id)
+
+        boost = boost_score(product, SEARCH_BOOSTS)
+        self._boosts[product_id] = boost
+        for key in ("", category):
+            self._by_boost.add(key, -boost, product_id)
+        for key in self._rating_keys(product):
+            self._by_rating.add(key, -product["rating"], product_id)
+
+    def _unindex_product(self, product: Dict):
+        """Remove a product from the search, category and ranking indexes"""
+        if self._shared_storage:
+            return
+        product_id = product["product_id"]
+        for token in self._field_tokens(product):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            self._impacts.pop(token, None)
+            if not postings:
+                del self._postings[token]
+                del self._vocabulary[bisect_left(self._vocabulary, token)]
+        self._total_length -= self._doc_lengths.pop(product_id, 0.0)
+        category = product["category"].lower()
+        category_ids = self._category_index.get(category)
+        if category_ids is not None:
+            category_ids.discard(product_id)
+            if not category_ids:
+                del self._category_index[category]
+
+        boost = self._boosts.pop(product_id, 0.0)
+        for key in ("", category):
+            self._by_boost.remove(key, -boost, product_id)
+        for key in self._rating_keys(product):
+            self._by_rating.remove(key, -product["rating"], product_id)
+
+    @staticmethod
+    def _rating_keys(product: Dict) -> List[str]:
+        """The recommendation lists a product belongs to"""
+        words = set(_tokenize(product["name"] + " " + " ".join(product.get("features", []))))
+        return (["", f"category:{product['category'].lower()}"]
+                + [f"tag:{tag}" for tag in sorted(RECOMMENDATION_TAGS & words)])
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Indexed tokens a query token matches, with their weight: exact, then as a prefix"""
+        expansions = [(token, 1.0)] if token in self._postings else []
+        if len(token) < MIN_PREFIX_LENGTH:
+            return expansions
+        position = bisect_right(self._vocabulary, token)
+        while (position < len(self._vocabulary) and self._vocabulary[position].startswith(token)
+               and len(expansions) < MAX_PREFIX_EXPANSIONS):
+            expansions.append((self._vocabulary[position], PREFIX_MATCH_WEIGHT))
+            position += 1
+        return expansions
+
+    def _term_impacts(self, term: str) -> Tuple[Dict[str, float], List[Tuple[str, float]]]:
+        """BM25 term-frequency impacts of a term's postings by id and best first, cached"""
+        average_length = self._total_length / len(self._doc_lengths)
+        # Impacts depend on the average length; recompute them all once it drifts
+        if abs(average_length - self._impact_length) > IMPACT_LENGTH_DRIFT * self._impact_length:
+            self._impacts = {}
+            self._impact_length = average_length
+        cached = self._impacts.get(term)
+        if cached is None:
+            lengths, average_length = self._doc_lengths, self._impact_length
+            impacts = {
+                product_id: frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * lengths[product_id] / average_length))
+                for product_id, frequency in self._postings[term].items()
+            }
+            cached = self._impacts[term] = (impacts, sorted(impacts.items(), key=itemgetter(1), reverse=True))
+        return cached
+
+    def _top_matches(self, tokens: List[str], category: Optional[str], filters: List[Filter],
+                     wanted: int) -> List[str]:
+        """Ids of the best matches for query tokens, best first, at most wanted of them
+
+        Fagin's threshold algorithm: each term's postings are read best first and
+        every newly seen product is fully scored. No unseen product can beat the
+        sum of the impacts at the current depth plus the highest boost, so the
+        walk stops as soon as the wanted-th best reaches that bound.
+        """
+        count = len(self._doc_lengths)
+        terms = []
+        for token in dict.fromkeys(tokens):
+            for term, weight in self._expand(token):
+                document_frequency = len(self._postings[term])
+                idf = weight * math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+                terms.append((idf, *self._term_impacts(term)))
+        ranked = self._by_boost.ranked(category.lower() if category else "")
+        if not terms or not ranked or wanted <= 0:
+            return []
+
+        top_boost = -ranked[0][0]
+        boosts, products = self._boosts, self.products
+        category_ids = self._category_index.get(category.lower(), set()) if category else None
+        best: List[Tuple[float, str]] = []
+        seen: Set[str] = set()
+        for depth in range(max(len(ordered) for _, _, ordered in terms)):
+            bound = top_boost
+            for idf, _, ordered in terms:
+                if depth >= len(ordered):
+                    continue
+                product_id, impact = ordered[depth]
+                bound += idf * impact
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                if category_ids is not None and product_id not in category_ids:
+                    continue
+                if filters and not matches_filters(products[product_id], filters):
+                    continue
+                score = boosts[product_id] + sum(idf * impacts.get(product_id, 0.0) for idf, impacts, _ in terms)
+                if len(best) < wanted:
+                    heapq.heappush(best, (score, product_id))
+                elif score > best[0][0]:
+                    heapq.heapreplace(best, (score, product_id))
+            if len(best) >= wanted and best[0][0] >= bound:
+                break
+        return [product_id for _, product_id in sorted(best, key=lambda item: (-item[0], item[1]))]
+
+    def add_product(self, product: Dict):
+        """Add a product to the catalog"""
+        with self._index_lock:
+            existing = self.products.get(product["product_id"])
+            if existing:
+                self._unindex_product(existing)
+            self.products[product["product_id"]] = product
+            self._index_product(product)
+        change_events.publish("product.updated", product_id=product["product_id"])
+
+    def update_product(self, product_id: str, updates: Dict) -> Optional[Dict]:
+        """Update fields of an existing product
+
+        The stored record is replaced, not changed in place, so readers holding
+        it never see a half-applied update; the index entries move to the new
+        version under the same lock.
+        """
+        previous: List[Dict] = []
+
+        def change(product: Dict) -> Dict:
+            previous.append(dict(product))
+            return {**product, **updates}
+
+        with self._index_lock:
+            product = self.products.modify(product_id, change)
+            if product is None:
+                return None
+            self._unindex_product(previous[0])
+            self._index_product(product)
+        change_events.publish("product.updated", product_id=product_id)
+        return product
+
+    def categories(self) -> Set[str]:
+        """Lowercase names of the categories in the catalog"""
+        if self._shared_storage:
+            return self.products.distinct("category", ignore_case=True)
+        with self._index_lock:
+            return set(self._category_index)
+
+    def search_products(self, query: str, category: str = None, min_price: Optional[float] = None,
+                        max_price: Optional[float] = None, in_stock_only: bool = False,
+                        min_rating: Optional[float] = None, limit: Optional[int] = None,
+                        offset: int = 0) -> List[Dict]:
+        """Search products, most relevant first
+
+        Relevance is BM25 over name, category, features and description (query
+        words also match as prefixes) plus boosts for rating and availability.
+        A query word naming a category filters on it when no category is given,
+        so "electronics" browses the category by boost. Results can be limited
+        to a price range, in-stock products or a minimum rating, and paged with
+        limit/offset. Shared storage ranks with SQLite FTS5's bm25(), so close
+        scores can come out in a different order there.
+        """
+        tokens = _tokenize(query)
+        if not category and tokens:
+            categories = self.categories()
+            named = [token for token in tokens if token in categories]
+            if len(named) == 1:
+                category = named[0]
+                tokens = [token for token in tokens if token != category]
+
+        filters: List[Filter] = []
+        if category:
+            filters.append(("category", "ieq", category))
+        if min_price is not None:
+            filters.append(("price", "ge", min_price))
+        if max_price is not None:
+            filters.append(("price", "le", max_price))
+        if in_stock_only:
+            filters.append(("availability", "ne", "out_of_stock"))
+        if min_rating is not None:
+            filters.append(("rating", "ge", min_rating))
+
+        if self._shared_storage:
+            return self.products.search(tokens, SEARCH_FIELD_WEIGHTS, filters, SEARCH_BOOSTS, limit, offset)
+
+        end = None if limit is None else offset + limit
+        if not tokens:
+            # No relevance to compute: walk the boost-ordered list until the page is full
+            matches = []
+            with self._index_lock:
+                for _, product_id in self._by_boost.ranked(category.lower() if category else ""):
+                    product = self.products.get(product_id)
+                    if product is not None and matches_filters(product, filters):
+                        matches.append(product)
+                        if end is not None and len(matches) >= end:
+                            break
+            return matches[offset:end]
+
+        with self._index_lock:
+            best = self._top_matches(tokens, category, filters, len(self._doc_lengths) if end is None else end)
+        return self.products.get_many(best[offset:])
+    
+    def get_product_details(self, product_id: str) -> Optional[Dict]:
+        """Get detailed product information"""
+        return self.products.get(product_id)
+    
+    def get_recommendations(self, category: str = None, weather_condition: str = None,
+                            limit: int = RECOMMENDATION_LIMIT) -> List[Dict]:
+        """Get the top-rated products for the weather, else for a category, else overall"""
+        recommendations = []
+        if weather_condition:
+            condition = weather_condition.lower()
+            for keywords, tags, categories in WEATHER_RECOMMENDATIONS:
+                if any(keyword in condition for keyword in keywords):
+                    recommendations = self._top_rated(tags, categories, limit)
+                    break
+        if not recommendations and category:
+            recommendations = self._top_rated([], [category], limit)
+        if not recommendations:
+            recommendations = self._top_rated([], [], limit)
+        return recommendations
+
+    def _top_rated(self, tags: List[str], categories: List[str], limit: int) -> List[Dict]:
+        """Top-rated products having any tag or in any category; the whole catalog without either"""
+        if self._shared_storage:
+            lists = [self.products.search([tag], {"name": 0.0, "features": 0.0}, boosts={"rating": 1.0},
+                                          limit=limit, prefix=False) for tag in tags]
+            lists += [self.products.search([], {}, [("category", "ieq", category)], {"rating": 1.0}, limit)
+                      for category in categories]
+            if not tags and not categories:
+                lists.append(self.products.search([], {}, boosts={"rating": 1.0}, limit=limit))
+            ranked = heapq.merge(*[[(-product["rating"], product["product_id"]) for product in products]
+                                   for products in lists])
+            found = {product["product_id"]: product for products in lists for product in products}
+            return [found[product_id] for product_id in _first_ids(ranked, limit)]
+
+        keys = [f"tag:{tag}" for tag in tags] + [f"category:{category.lower()}" for category in categories]
+        with self._index_lock:
+            # Each list is already in rating order, so merging them costs O(limit) per list
+            top = _first_ids(heapq.merge(*[self._by_rating.ranked(key) for key in keys or [""]]), limit)
+        return self.products.get_many(top)
+
+class MockCustomerDatabase:
+    """Mock customer database"""
+    
+    def __init__(self, storage: Optional[Storage] = None):
+        storage = storage or InMemoryStorage()
+        self._shared_storage = storage.shared
+        self.customers = storage.collection("customers")
+        self.customers.seed({
+            "CUST001": {
+                "customer_id": "CUST001",
+                "name": "John Doe",
+                "email": "john.doe@email.com",
+                "phone": "+1-555-0123",
+                "address": "123 Main St, New York, NY",
+                "loyalty_points": 1250,
+                "tier": "Gold",
+                "preferences": {
+                    "categories": ["Electronics", "Books"],
+                    "brands": ["TechBrand", "BookCorp"],
+                    "communication": "email"
+                },
+                "order_history": ["ORD001", "ORD002"]
+            },
+            "CUST002": {
+                "customer_id": "CUST002",
+                "name": "Jane Smith",
+                "email": "jane.smith@email.com",
+                "phone": "+1-555-0456",
+                "address": "456 Oak Ave, Los Angeles, CA",
+                "loyalty_points": 750,
+                "tier": "Silver",
+                "preferences": {
+                    "categories": ["Home", "Office"],
+                    "brands": ["HomePlus", "OfficeMax"],
+                    "communication": "sms"
+                },
+                "order_history": ["ORD003"]
+            },
+            "CUST003": {
+                "customer_id": "CUST003",
+                "name": "Alice Johnson",
+                "email": "alice.johnson@email.com",
+                "phone": "+1-555-0789",
+                "address": "789 Pine Rd, Chicago, Illinois",
+                "loyalty_points": 300,
+                "tier": "Bronze",
+                "preferences": {
+                    "categories": ["Clothing", "Accessories"],
+                    "brands": ["Fashionista", "Accents"],
+                    "communication": "email"
+                },
+                "order_history": ["ORD004"]
+            },
+            "CUST004": {
+                "customer_id": "CUST004",
+                "name": "Bob Brown",
+                "email": "bob.brown@email.com",
+                "phone": "+1-555-0110",
+                "address": "321 Elm St, Houston, Texas",
+                "loyalty_points": 980,
+                "tier": "Gold",
+                "preferences": {
+                    "categories": ["Electronics", "Gaming"],
+                    "brands": ["GamePro", "TechBrand"],
+                    "communication": "sms"
+                },
+                "order_history": ["ORD005"]
+            },
+            "CUST005": {
+                "customer_id": "CUST005",
+                "name": "Carol White",
+                "email": "carol.white@email.com",
+                "phone": "+1-555-0222",
+                "address": "654 Maple Ln, Miami, Florida",
+                "loyalty_points": 450,
+                "tier": "Silver",
+                "preferences": {
+                    "categories": ["Electronics", "Home"],
+                    "brands": ["HomePlus", "SoundMaster"],
+                    "communication": "email"
+                },
+                "order_history": ["ORD006"]
+            }
+        })
+        self._email_index: Dict[str, str] = {}
+        # Lowercase preferred category -> ids of customers who prefer it
+        self._category_fans: Dict[str, Set[str]] = {}
+        # Serializes read-modify-write of records; stored records are never mutated in place
+        self._lock = threading.RLock()
+        # Other processes write to shared storage, so its SQL index serves email lookups instead
+        if not self._shared_storage:
+            for customer in self.customers.values():
+                self._index_customer(customer)
+    
+    def _index_customer(self, customer: Dict):
+        """Add a customer to the email and preferred-category indexes"""
+        if self._shared_storage:
+            return
+        customer_id = customer["customer_id"]
+        self._email_index[_normalize_email(customer["email"])] = customer_id
+        for category in _preferred_categories(customer):
+            self._category_fans.setdefault(category, set()).add(customer_id)
+
+    def _unindex_customer(self, customer: Dict):
+        """Remove a customer from the email and preferred-category indexes"""
+        if self._shared_storage:
+            return
+        customer_id = customer["customer_id"]
+        if self._email_index.get(_normalize_email(customer["email"])) == customer_id:
+            del self._email_index[_normalize_email(customer["email"])]
+        for category in _preferred_categories(customer):
+            fans = self._category_fans.get(category)
+            if fans is not None:
+                fans.discard(customer_id)
+                if not fans:
+                    del self._category_fans[category]
+
+    def _replace(self, existing: Optional[Dict], customer: Dict, fields: List[str]):
+        """Store a new version of a customer record, re-index it and announce the change"""
+        self.customers[customer["customer_id"]] = customer
+        self._reindex(existing, customer, fields)
+
+    def _modify(self, customer_id: str, updates: Callable[[Dict], Dict], fields: List[str]) -> Optional[Dict]:
+        """Apply updates(current record) -> changed fields atomically, then re-index and announce
+
+        The read and write happen in one storage transaction, so concurrent
+        updates from other processes on shared storage are merged, not lost.
+        """
+        previous: List[Dict] = []
+
+        def change(customer: Dict) -> Dict:
+            previous.append(dict(customer))
+            return {**customer, **updates(customer)}
+
+        customer = self.customers.modify(customer_id, change)
+        if customer is not None:
+            self._reindex(previous[0], customer, fields)
+        return customer
+
+    def _reindex(self, existing: Optional[Dict], customer: Dict, fields: List[str]):
+        """Move the indexes from the old to the new version of a record and announce the change"""
+        if existing:
+            self._unindex_customer(existing)
+        self._index_customer(customer)
+        emails = [customer["email"]] + ([existing["email"]] if existing and existing["email"] != customer["email"] else [])
+        change_events.publish("customer.updated", customer_id=customer["customer_id"], emails=emails, fields=fields)
+
+    def _email_owner(self, email: str) -> Optional[str]:
+        """Get the id of the customer registered with this email, if any"""
+        customer = self.get_customer_by_email(email)
+        return customer["customer_id"] if customer else None
+
+    def _check_email_available(self, email: str, customer_id: str):
+        """Raise ValueError if another customer already uses this email"""
+        owner = self._email_owner(email)
+        if owner is not None and owner != customer_id:
+            raise ValueError(f"Email {email} is already registered to customer {owner}")
+
+    def add_customer(self, customer: Dict):
+        """Add a customer record, raises ValueError if the email is already taken"""
+        with self._lock:
+            self._check_email_available(customer["email"], customer["customer_id"])
+            existing = self.customers.get(customer["customer_id"])
+            self._replace(existing, customer, sorted(customer))
+
+    def update_customer(self, customer_id: str, updates: Dict) -> Optional[Dict]:
+        """Update fields of an existing customer, raises ValueError if the new email is already taken"""
+        with self._lock:
+            customer = self.customers.get(customer_id)
+            if not customer:
+                return None
+            if "email" in updates:
+                self._check_email_available(updates["email"], customer_id)
+            # Copy on write: readers holding the previous record keep a consistent version
+            return self._modify(customer_id, lambda _: updates, sorted(updates))
+
+    def update_preferences(self, customer_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and merge preference changes into a customer's preferences
+
+        Keys given replace the current values; others are kept. Invalid
+        input is reported in the result rather than raised.
+        """
+        try:
+            changes = validate_preferences(preferences)
+        except ValueError as e:
+            return {"success": False, "message": f"Preferences not updated: {e}"}
+        with self._lock:
+            customer = self._modify(customer_id, lambda current: {
+                "preferences": {**current.get("preferences", {}), **changes}}, ["preferences"])
+        if not customer:
+            return {"success": False, "message": f"Customer {customer_id} not found"}
+        merged = customer["preferences"]
+        summary = "; ".join(f"{key}: {', '.join(value) if isinstance(value, list) else value}"
+                            for key, value in changes.items())
+        return {"success": True, "message": f"Preferences updated for {customer_id} ({summary})", "preferences": merged}
+
+    def get_customers_by_preferred_category(self, category: str) -> List[Dict]:
+        """Customers whose preferences include a category, by id"""
+        category = category.strip().lower()
+        if self._shared_storage:
+            return [customer for _, customer in sorted(self.customers.items())
+                    if category in _preferred_categories(customer)]
+        return self.customers.get_many(sorted(self._category_fans.get(category, ())))
+
+    def get_customer_info(self, customer_id: str) -> Optional[Dict]:
+        """Get customer information"""
+        return self.customers.get(customer_id)
+    
+    def get_customer_by_email(self, email: str) -> Optional[Dict]:
+        """Get customer by email"""
+        if self._shared_storage:
+            matches = self.customers.find("email", _normalize_email(email), ignore_case=True)
+            return matches[0] if matches else None
+        customer_id = self._email_index.get(_normalize_email(email))
+        return self.customers.get(customer_id) if customer_id else None
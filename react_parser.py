@@ -0,0 +1,163 @@
+"""
+Recovering output parser for the ReAct agent
+
+With handle_parsing_errors, output the stock ReAct parser rejects becomes
+an error observation, and the model is asked again: one more Ollama
+generation for a slip in the format. This parser repairs the common slips
+locally instead:
+
+- a Thought with no Action or Final Answer becomes the Final Answer, as
+  the prompt's format rules ask, unless it names a tool (the model meant
+  to act and should be asked again)
+- an Action naming a tool with the wrong case, spaces or quoting, e.g.
+  "Order Status" or `order_status`, maps to the real tool
+- an input written on the Action line, e.g. "Action: order_status ORD002"
+  or "order_status(ORD002)", is used when there is no Action Input line
+- a JSON object input becomes the tool's arguments
+- an Action followed by a guessed Final Answer runs the Action, as the
+  model had not seen its result yet; when the Action names no tool
+  ("Action: None"), the Final Answer stands
+
+Anything else is rejected as before. Each repaired output saves an LLM call
+and counts agent.llm_calls_saved, with agent.parse_repairs.<kind> per
+repair.
+"""
+import json
+import re
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from langchain.agents.output_parsers.react_single_input import (
+    MISSING_ACTION_AFTER_THOUGHT_ERROR_MESSAGE,
+    MISSING_ACTION_INPUT_AFTER_ACTION_ERROR_MESSAGE,
+    ReActSingleInputOutputParser,
+)
+from langchain.tools import BaseTool
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.exceptions import OutputParserException
+from pydantic import PrivateAttr
+
+from metrics import metrics
+
+ACTION_RE = re.compile(r"^[ \t]*Action\s*\d*\s*:[ \t]*(?P<action>.*?)[ \t]*$", re.IGNORECASE | re.MULTILINE)
+ACTION_INPUT_RE = re.compile(r"^[ \t]*Action\s*\d*\s*Input\s*\d*\s*:[ \t]*(?P<input>.*)",
+                             re.IGNORECASE | re.MULTILINE | re.DOTALL)
+FINAL_ANSWER_RE = re.compile(r"Final\s+Answer\s*:", re.IGNORECASE)
+# Text the model wrote past its action, e.g. an imagined observation
+CONTINUATION_RE = re.compile(r"\n[ \t]*(?:Observation|Thought|Final\s+Answer)\s*:", re.IGNORECASE)
+THOUGHT_LABEL_RE = re.compile(r"^\s*Thought\s*:\s*", re.IGNORECASE)
+# Brackets an inline input may be wrapped in after the tool name
+INLINE_BRACKETS = {"(": ")", "[": "]"}
+QUOTES = "\"'`"
+
+class _ToolIndex:
+    """Tool names, their argument names and the patterns that find them, built once per tool set"""
+
+    def __init__(self, tools: Sequence[BaseTool]):
+        # Tool name -> its argument names, first argument first
+        self.fields: Dict[str, List[str]] = {tool.name: list(tool.args) for tool in tools}
+        self.by_spelling = {name.lower(): name for name in self.fields}
+        # Longest names first, so a tool whose name extends another's wins; "_" also matches a space or "-"
+        names = sorted(self.fields, key=len, reverse=True)
+        alternatives = "|".join(r"[\s_-]?".join(map(re.escape, name.split("_"))) for name in names)
+        self.tool_re = re.compile(rf"^[{QUOTES}*\s]*(?P<tool>{alternatives})(?![\w-])[{QUOTES}*]*\s*(?P<rest>.*)$",
+                                  re.IGNORECASE | re.DOTALL)
+        self.mention_re = re.compile(rf"(?<![\w-])(?:{'|'.join(map(re.escape, names)) or '(?!)'})(?![\w-])",
+                                     re.IGNORECASE)
+
+    def match(self, value: str) -> Tuple[str, str]:
+        """The tool an Action line names and any input written after it"""
+        if value in self.fields:
+            return value, ""
+        match = self.tool_re.match(value)
+        if not match:
+            return value.strip(QUOTES + " "), ""
+        tool = self.by_spelling[re.sub(r"[\s-]", "_", match.group("tool")).lower()]
+        rest = match.group("rest").strip()
+        if rest[:1] in INLINE_BRACKETS and rest.endswith(INLINE_BRACKETS[rest[0]]):
+            rest = rest[1:-1]
+        return tool, rest.lstrip(":").strip()
+
+    def tool_input(self, tool: str, raw: str) -> Tuple[Union[str, Dict[str, Any]], bool]:
+        """The input to pass to the tool, and whether it was read from a JSON object"""
+        raw = raw.strip()
+        if raw.startswith("{") and raw.endswith("}"):
+            try:
+                arguments = json.loads(raw)
+            except ValueError:
+                arguments = None
+            fields = self.fields.get(tool, [])
+            if isinstance(arguments, dict) and arguments and set(arguments) <= set(fields):
+                if list(arguments) == fields[:1] and isinstance(arguments[fields[0]], str):
+                    # Same input as the plain spelling, so the run memo sees one action
+                    return arguments[fields[0]], True
+                return arguments, True
+        return raw.strip(" ").strip('"').strip("`"), False
+
+class RecoveringReActParser(ReActSingleInputOutputParser):
+    """ReAct output parser that repairs common format slips instead of re-prompting"""
+
+    _tools: _ToolIndex = PrivateAttr()
+
+    def __init__(self, tools: Sequence[BaseTool], **kwargs: Any):
+        super().__init__(**kwargs)
+        self._tools = _ToolIndex(tools)
+
+    def parse(self, text: str) -> Union[AgentAction, AgentFinish]:
+        tools = self._tools
+        answer = FINAL_ANSWER_RE.search(text)
+        action = ACTION_RE.search(text)
+        if action and answer and answer.start() < action.start():
+            action = None
+        if action is None:
+            if answer:
+                return AgentFinish({"output": text[answer.end():].strip()}, text)
+            return self._thought_as_answer(tools, text)
+
+        tool, inline = tools.match(action.group("action"))
+        if tool not in tools.fields and answer:
+            # "Action: None" and the like before the answer
+            return AgentFinish({"output": text[answer.end():].strip()}, text)
+        repairs = ["action_and_answer"] if answer else []
+        if tool != action.group("action"):
+            repairs.append("tool_name")
+
+        rest = text[action.end():]
+        continuation = CONTINUATION_RE.search(rest)
+        if continuation:
+            rest = rest[:continuation.start()]
+        input_match = ACTION_INPUT_RE.search(rest)
+        if input_match:
+            raw = input_match.group("input")
+        elif inline:
+            raw = inline
+            repairs.append("inline_input")
+        else:
+            raise OutputParserException(f"Could not parse LLM output: `{text}`",
+                                        observation=MISSING_ACTION_INPUT_AFTER_ACTION_ERROR_MESSAGE,
+                                        llm_output=text, send_to_llm=True)
+
+        tool_input, from_json = tools.tool_input(tool, raw)
+        if from_json:
+            repairs.append("json_input")
+        if tool not in tools.fields:
+            # The executor reports the unknown tool to the model, as with the stock parser
+            repairs = []
+        _count(repairs)
+        return AgentAction(tool, tool_input, text)
+
+    @staticmethod
+    def _thought_as_answer(tools: _ToolIndex, text: str) -> AgentFinish:
+        thought = THOUGHT_LABEL_RE.sub("", text).strip()
+        if not thought or tools.mention_re.search(thought):
+            raise OutputParserException(f"Could not parse LLM output: `{text}`",
+                                        observation=MISSING_ACTION_AFTER_THOUGHT_ERROR_MESSAGE,
+                                        llm_output=text, send_to_llm=True)
+        _count(["thought_only"])
+        return AgentFinish({"output": thought}, text)
+
+def _count(repairs: List[str]):
+    if not repairs:
+        return
+    metrics.increment("agent.llm_calls_saved")
+    for repair in repairs:
+        metrics.increment(f"agent.parse_repairs.{repair}")
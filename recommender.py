@@ -0,0 +1,224 @@
+"""
+Personalized product recommendations with vectorized scoring
+
+Every product is a row of a feature matrix with one-hot category and brand
+columns. A customer becomes a vector over the same columns, built from
+their preferred categories and brands plus those of the products they
+bought before. One matrix-vector product then scores the whole catalog.
+Two more terms are added to the score: a rating/availability prior, and
+co-purchase counts, which favour products that other orders bought
+together with the customer's past purchases.
+
+The matrix and co-purchase counts are built on first use and rebuilt after
+a product or order change. On shared storage, other processes' writes
+publish no events here, so the snapshot is also rebuilt after max_age
+seconds. A customer's results are cached for the current snapshot and
+dropped when that customer changes. recommend_many scores a batch of customers as one matrix product,
+e.g. for email campaigns.
+"""
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from events import change_events
+from metrics import metrics
+from mock_databases import MockCustomerDatabase, MockOrderDatabase, MockProductDatabase
+
+# Weight of each signal in a product's score
+SIGNAL_WEIGHTS = {
+    "category": 1.0,          # category in the customer's preferences
+    "brand": 1.5,             # brand in the customer's preferences
+    "history": 0.5,           # category/brand of a product they bought, per purchase
+    "co_purchase": 1.0,       # log(1 + times bought together with one of their products)
+    "rating": 0.2,            # per rating point
+}
+AVAILABILITY_PRIOR = {"in_stock": 0.2, "low_stock": 0.1}
+# Customers scored per matrix product in recommend_many, bounding the score block to
+# about BATCH_CELLS floats
+BATCH_CELLS = 16_000_000
+# Customers whose results are kept; the cache starts over beyond this
+MAX_CACHED_CUSTOMERS = 10_000
+
+class _CatalogSnapshot:
+    """The product feature matrix and co-purchase counts at one point in time"""
+
+    def __init__(self, products: Sequence[Dict], orders: Sequence[Dict]):
+        self.product_ids = [product["product_id"] for product in products]
+        self.positions = {product_id: i for i, product_id in enumerate(self.product_ids)}
+        categories = sorted({product["category"].lower() for product in products})
+        brands = sorted({product["brand"].lower() for product in products if product.get("brand")})
+        self.columns = {f"category:{name}": i for i, name in enumerate(categories)}
+        self.columns.update({f"brand:{name}": len(categories) + i for i, name in enumerate(brands)})
+
+        rows = np.arange(len(products))
+        self.features = np.zeros((len(products), len(self.columns)), dtype=np.float32)
+        self.features[rows, [self.columns[f"category:{p['category'].lower()}"] for p in products]] = 1.0
+        branded = [i for i, product in enumerate(products) if product.get("brand")]
+        self.features[branded, [self.columns[f"brand:{products[i]['brand'].lower()}"] for i in branded]] = 1.0
+
+        self.prior = np.array([SIGNAL_WEIGHTS["rating"] * product.get("rating", 0)
+                               + AVAILABILITY_PRIOR.get(product.get("availability"), 0.0)
+                               for product in products], dtype=np.float32)
+        # Out-of-stock products are never recommended
+        self.prior[[i for i, product in enumerate(products) if product.get("availability") == "out_of_stock"]] = -np.inf
+
+        # Sparse co-purchase counts: product position -> {other product position: orders with both}
+        self.co_purchases: Dict[int, Dict[int, int]] = {}
+        for order in orders:
+            items = {self.positions[item["product_id"]] for item in order.get("items", [])
+                     if item.get("product_id") in self.positions}
+            for a in items:
+                counts = self.co_purchases.setdefault(a, {})
+                for b in items - {a}:
+                    counts[b] = counts.get(b, 0) + 1
+        self.built = time.monotonic()
+
+class PersonalizedRecommender:
+    """Score the whole catalog for customers from preferences, purchases and co-purchases"""
+
+    def __init__(self, product_db: MockProductDatabase, order_db: MockOrderDatabase,
+                 customer_db: MockCustomerDatabase, max_age: Optional[float] = None):
+        self.product_db = product_db
+        self.order_db = order_db
+        self.customer_db = customer_db
+        self.max_age = max_age
+        self._snapshot: Optional[_CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        # customer id -> {(limit, category): (snapshot scored against, product ids)}
+        self._results: Dict[str, Dict[Tuple[int, Optional[str]], Tuple[_CatalogSnapshot, List[str]]]] = {}
+
+    def subscribe(self) -> "PersonalizedRecommender":
+        """Rebuild the snapshot after product or order changes, drop a customer's results when they change"""
+        change_events.subscribe("product.updated", self._invalidate)
+        change_events.subscribe("order.updated", self._invalidate)
+        change_events.subscribe("customer.updated", self._on_customer_updated)
+        return self
+
+    def _invalidate(self, **_):
+        self._snapshot = None
+
+    def _on_customer_updated(self, customer_id: str, **_):
+        self._results.pop(customer_id, None)
+
+    def snapshot(self) -> _CatalogSnapshot:
+        """The current feature matrix, built if missing or older than max_age"""
+        snapshot = self._snapshot
+        if snapshot is not None and (self.max_age is None or time.monotonic() - snapshot.built < self.max_age):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or (self.max_age is not None and time.monotonic() - snapshot.built >= self.max_age):
+                with metrics.timer("recommender.build"):
+                    snapshot = _CatalogSnapshot(list(self.product_db.products.values()),
+                                                list(self.order_db.orders.values()))
+                self._snapshot = snapshot
+            return snapshot
+
+    def _purchases(self, customer: Dict) -> List[str]:
+        """Ids of the products in a customer's past orders"""
+        product_ids = []
+        for order_id in customer.get("order_history", []):
+            order = self.order_db.get_order_status(order_id)
+            if order:
+                product_ids.extend(item["product_id"] for item in order["items"] if item.get("product_id"))
+        return product_ids
+
+    @staticmethod
+    def _customer_vector(snapshot: _CatalogSnapshot, customer: Dict, purchased: List[int]) -> np.ndarray:
+        vector = np.zeros(len(snapshot.columns), dtype=np.float32)
+        preferences = customer.get("preferences", {})
+        for kind, weight in (("category", SIGNAL_WEIGHTS["category"]), ("brand", SIGNAL_WEIGHTS["brand"])):
+            for name in preferences.get(f"{kind}s", []):
+                column = snapshot.columns.get(f"{kind}:{str(name).lower()}")
+                if column is not None:
+                    vector[column] += weight
+        if purchased:
+            vector += SIGNAL_WEIGHTS["history"] * snapshot.features[purchased].sum(axis=0)
+        return vector
+
+    @staticmethod
+    def _add_co_purchases(snapshot: _CatalogSnapshot, scores: np.ndarray, purchased: List[int]):
+        counts: Dict[int, int] = {}
+        for position in purchased:
+            for other, count in snapshot.co_purchases.get(position, {}).items():
+                counts[other] = counts.get(other, 0) + count
+        if counts:
+            others = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+            values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            scores[others] += SIGNAL_WEIGHTS["co_purchase"] * np.log1p(values)
+
+    @staticmethod
+    def _top(snapshot: _CatalogSnapshot, scores: np.ndarray, limit: int) -> List[List[str]]:
+        """Ids of the best-scoring products for each row of scores, best first
+
+        argpartition finds every row's top limit in one pass instead of sorting the catalog.
+        """
+        limit = min(limit, scores.shape[1])
+        if limit <= 0:
+            return [[] for _ in scores]
+        best = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+        tops = []
+        for row, columns in zip(scores, best):
+            columns = columns[np.isfinite(row[columns])]
+            columns = columns[np.lexsort((columns, -row[columns]))]
+            tops.append([snapshot.product_ids[i] for i in columns])
+        return tops
+
+    def _prepare(self, snapshot: _CatalogSnapshot, customer: Dict) -> Tuple[np.ndarray, List[int]]:
+        """The customer vector and the positions of the products they bought"""
+        purchased = [snapshot.positions[product_id] for product_id in self._purchases(customer)
+                     if product_id in snapshot.positions]
+        return self._customer_vector(snapshot, customer, purchased), purchased
+
+    def _adjust(self, snapshot: _CatalogSnapshot, scores: np.ndarray, purchased: List[int]):
+        """Add co-purchase signals to a customer's scores and rule out what they already bought"""
+        self._add_co_purchases(snapshot, scores, purchased)
+        scores[purchased] = -np.inf
+
+    def recommend(self, customer_id: str, limit: int = 5, category: Optional[str] = None) -> List[Dict]:
+        """Top products for one customer, optionally within a category; [] for unknown customers"""
+        snapshot = self.snapshot()
+        key = (limit, category.lower() if category else None)
+        cached = self._results.get(customer_id, {}).get(key)
+        if cached is not None and cached[0] is snapshot:
+            metrics.increment("recommender.cache_hit")
+            return self.product_db.products.get_many(cached[1])
+
+        customer = self.customer_db.get_customer_info(customer_id)
+        if not customer:
+            return []
+        with metrics.timer("recommender.score"):
+            vector, purchased = self._prepare(snapshot, customer)
+            scores = snapshot.features @ vector + snapshot.prior
+            self._adjust(snapshot, scores, purchased)
+            if category:
+                column = snapshot.columns.get(f"category:{category.lower()}")
+                if column is None:
+                    return []
+                scores[snapshot.features[:, column] == 0] = -np.inf
+            top = self._top(snapshot, scores[np.newaxis], limit)[0]
+        if len(self._results) >= MAX_CACHED_CUSTOMERS:
+            self._results = {}
+        self._results.setdefault(customer_id, {})[key] = (snapshot, top)
+        return self.product_db.products.get_many(top)
+
+    def recommend_many(self, customer_ids: Sequence[str], limit: int = 5) -> Dict[str, List[Dict]]:
+        """Top products for each of many customers, scoring them in blocks of one matrix product"""
+        snapshot = self.snapshot()
+        customers = [customer for customer in (self.customer_db.get_customer_info(customer_id)
+                                               for customer_id in customer_ids) if customer]
+        results: Dict[str, List[Dict]] = {}
+        block = max(1, BATCH_CELLS // max(1, len(snapshot.product_ids)))
+        for start in range(0, len(customers), block):
+            chunk = customers[start:start + block]
+            prepared = [self._prepare(snapshot, customer) for customer in chunk]
+            with metrics.timer("recommender.score_batch"):
+                scores = np.stack([vector for vector, _ in prepared]) @ snapshot.features.T + snapshot.prior
+                for row, (_, purchased) in zip(scores, prepared):
+                    self._adjust(snapshot, row, purchased)
+                tops = self._top(snapshot, scores, limit)
+            for customer, top in zip(chunk, tops):
+                results[customer["customer_id"]] = self.product_db.products.get_many(top)
+        return results
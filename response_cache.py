@@ -0,0 +1,275 @@
+"""
+Response cache in front of the agent executor
+
+Answers are keyed on the normalized message plus the customer context. A
+lookup first tries an exact match, then the most similar cached message for
+the same customer that mentions exactly the same order/product/customer ids.
+Entries expire after a TTL, are evicted least-recently-used once the memory
+cap is reached, and are dropped when a record they mention or were built
+from (the ids in the agent's tool inputs and observations), or the
+customer they were answered for, changes. Callers skip the cache for
+answers that depend on conversation history or that changed records.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from events import change_events
+from metrics import metrics
+
+ENTITY_ID_RE = re.compile(r"\b(?:ORD|PROD|CUST|RET)\d+\b", re.IGNORECASE)
+WORD_RE = re.compile(r"[a-z0-9]+")
+# Requests that change state must always reach the tools
+NO_CACHE_RE = re.compile(r"\b(cancel|return|refund|update|change|set|add|remove|delete)\b", re.IGNORECASE)
+
+EMBEDDING_DIMENSIONS = 256
+# Function words carry no intent, dropping them lets paraphrases hash alike
+STOPWORDS = frozenset("""a about am an are can could d do does for hi hello i is it like ll m me
+my of on please s some the there to up us was what whats would you your""".split())
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(WORD_RE.findall(message.lower()))
+
+def hashed_embedding(text: str) -> List[float]:
+    """Cheap local embedding: hashed content-word unigrams and bigrams, L2-normalized"""
+    words = [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for gram in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        vector[zlib.crc32(gram.encode()) % EMBEDDING_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+def _context_key(context: Optional[Dict[str, Any]]) -> str:
+    if not context:
+        return ""
+    return json.dumps({k: v for k, v in context.items() if isinstance(v, (str, int, float, bool))}, sort_keys=True)
+
+class ResponseCache:
+    """Two-tier (exact, then embedding similarity) LRU cache of agent answers"""
+
+    def __init__(self, ttl: float = 300, max_bytes: int = 8 * 1024 * 1024,
+                 similarity_threshold: float = 0.9,
+                 embed: Optional[Callable[[str], List[float]]] = hashed_embedding,
+                 resolve_customer: Optional[Callable[[str], Optional[str]]] = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        # Maps a customer_email context to its customer id, so email sessions are invalidated too
+        self.resolve_customer = resolve_customer
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_context: Dict[str, Set[str]] = {}
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        # Bumped on every invalidation so in-flight answers computed before it are not stored
+        self.generation = 0
+
+    @staticmethod
+    def _entities(text: str) -> FrozenSet[str]:
+        return frozenset(match.upper() for match in ENTITY_ID_RE.findall(text))
+
+    def cacheable(self, message: str) -> bool:
+        """Whether answers to this message may be cached at all"""
+        return not NO_CACHE_RE.search(message)
+
+    def get(self, message: str, context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Get a cached answer for the message, or None"""
+        if not self.cacheable(message):
+            return None
+        normalized = normalize_message(message)
+        context_key = _context_key(context)
+        key = f"{context_key}\x00{normalized}"
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires"] > now:
+                self._entries.move_to_end(key)
+                metrics.increment("cache.hit.exact")
+                return entry["answer"]
+            if entry:
+                self._remove(key)
+
+        if self.embed and normalized:
+            vector = self.embed(normalized)
+            entities = self._entities(message)
+            best_key, best_score = None, self.similarity_threshold
+            with self._lock:
+                for candidate in list(self._by_context.get(context_key, ())):
+                    entry = self._entries[candidate]
+                    if entry["expires"] <= now:
+                        self._remove(candidate)
+                        continue
+                    if entry["entities"] != entities or entry["vector"] is None:
+                        continue
+                    score = _cosine(vector, entry["vector"])
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key:
+                    self._entries.move_to_end(best_key)
+                    metrics.increment("cache.hit.similar")
+                    return self._entries[best_key]["answer"]
+
+        metrics.increment("cache.miss")
+        return None
+
+    def _step_tags(self, steps: Sequence[Tuple[Any, Any]]) -> Set[str]:
+        """Ids in the tool inputs and observations an answer was built from"""
+        tags = set()
+        for action, observation in steps:
+            tool_input = getattr(action, "tool_input", "")
+            text = " ".join(map(str, tool_input.values())) if isinstance(tool_input, dict) else str(tool_input)
+            tags.update(self._entities(text))
+            tags.update(self._entities(str(observation)))
+        return tags
+
+    def put(self, message: str, context: Optional[Dict[str, Any]], answer: str,
+            ttl: Optional[float] = None, generation: Optional[int] = None,
+            steps: Sequence[Tuple[Any, Any]] = ()):
+        """Cache an answer; pass the generation read before computing it to avoid storing stale answers
+
+        steps are the agent run's intermediate steps; the records they looked
+        up invalidate the answer even when it does not name their ids.
+        """
+        # AgentExecutor's give-up message is not an answer worth replaying
+        if not self.cacheable(message) or not answer or answer.startswith("Agent stopped"):
+            return
+        normalized = normalize_message(message)
+        context_key = _context_key(context)
+        key = f"{context_key}\x00{normalized}"
+        tags = set(self._entities(message) | self._entities(answer))
+        tags.update(self._context_tags(context))
+        tags.update(self._step_tags(steps))
+        vector = self.embed(normalized) if self.embed and normalized else None
+        size = len(key) + len(answer) + (8 * len(vector) if vector else 0) + 256
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "answer": answer,
+                "expires": time.monotonic() + (self.ttl if ttl is None else ttl),
+                "context": context_key,
+                "entities": self._entities(message),
+                "tags": tags,
+                "vector": vector,
+                "size": size,
+            }
+            self._by_context.setdefault(context_key, set()).add(key)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                metrics.increment("cache.evict")
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        keys = self._by_context.get(entry["context"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[entry["context"]]
+        for tag in entry["tags"]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def _context_tags(self, context: Optional[Dict[str, Any]]) -> Set[str]:
+        """Tags for the customer an answer was given to"""
+        context = context or {}
+        tags = set()
+        if context.get("customer_id"):
+            tags.add(str(context["customer_id"]).upper())
+        email = context.get("customer_email")
+        if email:
+            tags.add(str(email).strip().upper())
+            customer_id = self.resolve_customer(email) if self.resolve_customer else None
+            if customer_id:
+                tags.add(customer_id.upper())
+        return tags
+
+    def invalidate(self, *tags: str):
+        """Drop every entry mentioning any of the given ids"""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(str(tag).strip().upper(), ())):
+                    self._remove(key)
+                    metrics.increment("cache.invalidate")
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _on_order_updated(self, order_id: str, customer_id: Optional[str] = None, **_):
+        self.invalidate(*[tag for tag in (order_id, customer_id) if tag])
+
+    def _on_return_updated(self, return_id: str, order_id: Optional[str] = None,
+                           customer_id: Optional[str] = None, **_):
+        self.invalidate(*[tag for tag in (return_id, order_id, customer_id) if tag])
+
+    def _on_product_updated(self, product_id: str, **_):
+        self.invalidate(product_id)
+
+    def _on_customer_updated(self, customer_id: str, emails: List[str] = (), **_):
+        self.invalidate(customer_id, *emails)
+
+    def subscribe(self):
+        """Invalidate entries when the databases report changed records"""
+        change_events.subscribe("order.updated", self._on_order_updated)
+        change_events.subscribe("return.updated", self._on_return_updated)
+        change_events.subscribe("product.updated", self._on_product_updated)
+        change_events.subscribe("customer.updated", self._on_customer_updated)
+        return self
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache configured from the environment"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            from tools import customer_db
+
+            def resolve_customer(email: str) -> Optional[str]:
+                customer = customer_db.get_customer_by_email(email)
+                return customer["customer_id"] if customer else None
+
+            embed = hashed_embedding
+            if os.getenv("RESPONSE_CACHE_EMBEDDINGS", "hash").lower() == "ollama":
+                from langchain_ollama import OllamaEmbeddings
+                embed = OllamaEmbeddings(model=os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")).embed_query
+            _response_cache = ResponseCache(
+                ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+                max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+                similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.9")),
+                embed=embed,
+                resolve_customer=resolve_customer
+            ).subscribe()
+        return _response_cache
@@ -0,0 +1,216 @@
+"""
+Deterministic fast path for structured customer requests
+
+Messages that name an order, product or return id, or that match a sidebar quick
+action, are answered by calling the matching tool directly with a templated
+reply. An order status plus weather request needs two independent lookups,
+which aroute runs concurrently. Anything the router is not sure about
+returns None and goes to the LLM agent as before.
+"""
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain.tools import BaseTool
+from metrics import metrics
+from tools import arun_tools, customer_db, order_db, storage
+
+ORDER_ID_RE = re.compile(r"\bORD\d+\b", re.IGNORECASE)
+PRODUCT_ID_RE = re.compile(r"\bPROD\d+\b", re.IGNORECASE)
+RETURN_ID_RE = re.compile(r"\bRET\d+\b", re.IGNORECASE)
+CANCEL_RE = re.compile(r"\bcancel\b", re.IGNORECASE)
+# Only a bare imperative is routed; any other phrasing of a cancel goes to the agent
+CANCEL_COMMAND_RE = re.compile(r"^\s*(please\s+)?cancel\s+(my\s+)?(order\s+)?(ORD\d+)\s*(,?\s*please)?\s*[.!]?\s*$", re.IGNORECASE)
+STATUS_RE = re.compile(r"\b(status|where|track|tracking|check|shipped|shipping|delivery|delivered|arrive)\b", re.IGNORECASE)
+PRODUCT_INFO_RE = re.compile(r"\b(details?|info|information|about|describe|show|what is|what's)\b", re.IGNORECASE)
+WEATHER_RE = re.compile(r"\bweather\b", re.IGNORECASE)
+# Words that signal a second intent the templates cannot answer
+OTHER_INTENT_RE = re.compile(r"\b(return|refund|recommend|similar|weather|compare|cheaper|and|also|but)\b", re.IGNORECASE)
+# Same, minus the words a "status and weather" request is made of
+COMPOUND_OTHER_INTENT_RE = re.compile(r"\b(return|refund|recommend|similar|compare|cheaper|but)\b", re.IGNORECASE)
+NON_WORD_RE = re.compile(r"[^a-z0-9 ]+")
+
+TEMPLATES = {
+    "order_status": "Here's the latest on your order:\n\n{result}",
+    "return_status": "Here's the latest on your return:\n\n{result}",
+    "cancel_order": "I've processed your cancellation request for order {order_id}: {result}",
+    "product_details": "Here are the details you asked for:\n\n{result}",
+    "customer_orders": "Here are your orders:\n\n{result}\nLet me know if you'd like details on any of them.",
+    "recommendations": "{result}\n\nWould you like more details on any of these?",
+    "weather": "Here's the current shipping weather for your area:\n\n{result}",
+    "order_weather": "Here's the latest on your order:\n\n{result}\n\nAnd the weather at the shipping address:\n{result_2}",
+}
+
+# (intent, [(tool name, tool input), ...], extra template fields)
+Match = Tuple[str, List[Tuple[str, Dict[str, Any]]], Dict[str, str]]
+
+def _normalize(message: str) -> str:
+    """Lowercase and drop punctuation for exact phrase matching"""
+    return " ".join(NON_WORD_RE.sub(" ", message.lower()).split())
+
+# Sidebar quick actions in app.py, by normalized prompt
+QUICK_ACTIONS = {
+    _normalize("I'd like to check the status of my order"): "customer_orders",
+    _normalize("Can you help me track my package?"): "customer_orders",
+    _normalize("Can you recommend some products?"): "recommendations",
+    _normalize("What's the weather like for shipping?"): "weather",
+}
+
+def _strip_result(observation: str) -> str:
+    return observation[len("RESULT: "):] if observation.startswith("RESULT: ") else observation
+
+def _address_city(address: str) -> Optional[str]:
+    """Get the city from an address like '123 Main St, New York, NY'"""
+    parts = [part.strip() for part in address.split(",")]
+    return parts[1] if len(parts) >= 3 and parts[1] else None
+
+class IntentRouter:
+    """Answer high-confidence, pattern-identifiable requests without the LLM"""
+
+    def __init__(self, tools: List[BaseTool]):
+        self.tools = {tool.name: tool for tool in tools}
+
+    def _match(self, message: str, context: Dict[str, Any]) -> Optional[Match]:
+        """Get the intent and tool calls for a message, or None if unsure"""
+        quick_action = QUICK_ACTIONS.get(_normalize(message))
+        if quick_action:
+            return self._match_quick_action(quick_action, context)
+
+        order_ids = {oid.upper() for oid in ORDER_ID_RE.findall(message)}
+        product_ids = {pid.upper() for pid in PRODUCT_ID_RE.findall(message)}
+        return_ids = {rid.upper() for rid in RETURN_ID_RE.findall(message)}
+        if return_ids:
+            # A return id is a follow-up on an existing return; anything else goes to the agent
+            if len(return_ids) != 1 or order_ids or product_ids or CANCEL_RE.search(message):
+                return None
+            return_id = return_ids.pop()
+            if message.strip(" ?.!").upper() == return_id or STATUS_RE.search(message):
+                return "return_status", [("return_status", {"return_id": return_id})], {}
+            return None
+        if len(order_ids) + len(product_ids) != 1:
+            return None
+        if OTHER_INTENT_RE.search(message):
+            return self._match_compound(message, order_ids)
+        bare_id = message.strip(" ?.!").upper() in order_ids | product_ids
+
+        if order_ids:
+            order_id = order_ids.pop()
+            if CANCEL_RE.search(message):
+                if not CANCEL_COMMAND_RE.match(message):
+                    return None
+                return "cancel_order", [("cancel_order", {"order_id": order_id})], {"order_id": order_id}
+            if bare_id or STATUS_RE.search(message):
+                return "order_status", [("order_status", {"order_id": order_id})], {}
+            return None
+
+        product_id = product_ids.pop()
+        if bare_id or PRODUCT_INFO_RE.search(message):
+            return "product_details", [("product_details", {"product_id": product_id})], {}
+        return None
+
+    def _match_compound(self, message: str, order_ids: Set[str]) -> Optional[Match]:
+        """Order status plus weather at its shipping address, two independent tool calls"""
+        if len(order_ids) != 1 or not WEATHER_RE.search(message) or not STATUS_RE.search(message):
+            return None
+        if CANCEL_RE.search(message) or COMPOUND_OTHER_INTENT_RE.search(message):
+            return None
+        order_id = next(iter(order_ids))
+        order = order_db.get_order_status(order_id)
+        city = _address_city(order["shipping_address"]) if order else None
+        if not city:
+            return None
+        return "order_weather", [("order_status", {"order_id": order_id}), ("get_weather", {"city": city})], {}
+
+    def _match_quick_action(self, intent: str, context: Dict[str, Any]) -> Optional[Match]:
+        customer_id = context.get("customer_id")
+        email = context.get("customer_email")
+        if intent == "customer_orders":
+            if customer_id:
+                return intent, [("get_customer_orders", {"customer_id": customer_id})], {}
+            if email:
+                return intent, [("search_orders_by_email", {"email": email})], {}
+            return None
+        if intent == "recommendations":
+            if not customer_id and email:
+                customer = customer_db.get_customer_by_email(email)
+                customer_id = customer["customer_id"] if customer else None
+            return intent, [("product_recommendations", {"customer_id": customer_id} if customer_id else {})], {}
+        if intent == "weather":
+            customer = None
+            if customer_id:
+                customer = customer_db.get_customer_info(customer_id)
+            elif email:
+                customer = customer_db.get_customer_by_email(email)
+            city = _address_city(customer.get("address", "")) if customer else None
+            return (intent, [("get_weather", {"city": city})], {}) if city else None
+        return None
+
+    def _prepare(self, message: str, context: Optional[Dict[str, Any]]) -> Optional[Match]:
+        try:
+            match = self._match(message, context or {})
+        except Exception:
+            # A failed lookup while matching means the agent should handle it
+            match = None
+        if match is None or any(name not in self.tools for name, _ in match[1]):
+            metrics.increment("router.fallback")
+            return None
+        return match
+
+    def _answer(self, match: Match, observations: List[str], start: float) -> str:
+        intent, _, fields = match
+        results = {"result" if i == 0 else f"result_{i + 1}": _strip_result(observation).strip()
+                   for i, observation in enumerate(observations)}
+        answer = TEMPLATES[intent].format(**results, **fields)
+
+        elapsed = time.perf_counter() - start
+        metrics.increment("router.hit")
+        metrics.increment(f"router.intent.{intent}")
+        metrics.observe("router.latency", elapsed)
+        # Estimated against the mean latency of messages the agent did handle
+        saved = metrics.mean("agent.latency") - elapsed
+        if saved > 0:
+            metrics.increment("router.latency_saved", saved)
+        return answer
+
+    def route(self, message: str, context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Answer the message directly, or return None to fall back to the agent"""
+        start = time.perf_counter()
+        match = self._prepare(message, context)
+        if match is None:
+            return None
+        try:
+            observations = [self.tools[name].run(tool_input) for name, tool_input in match[1]]
+        except Exception:
+            metrics.increment("router.fallback")
+            return None
+        return self._answer(match, observations, start)
+
+    async def aroute(self, message: str, context: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Async route; independent tool calls of a compound request run concurrently"""
+        start = time.perf_counter()
+        # Matching may read orders and customers; keep shared-storage reads off the event loop
+        if storage.shared:
+            match = await asyncio.to_thread(self._prepare, message, context)
+        else:
+            match = self._prepare(message, context)
+        if match is None:
+            return None
+        try:
+            observations = await arun_tools(match[1], list(self.tools.values()), raise_errors=True)
+        except Exception:
+            metrics.increment("router.fallback")
+            return None
+        return self._answer(match, observations, start)
+
+    @staticmethod
+    def stats() -> Dict[str, float]:
+        """Get hit rate and estimated seconds saved"""
+        hits = metrics.counter("router.hit")
+        total = hits + metrics.counter("router.fallback")
+        return {
+            "hits": hits,
+            "total": total,
+            "hit_rate": hits / total if total else 0.0,
+            "latency_saved": metrics.counter("router.latency_saved"),
+        }
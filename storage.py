@@ -0,0 +1,620 @@
+"""
+Storage backends for the mock databases
+
+Each database keeps its records in named collections. A collection behaves
+like a dict of record id -> record, so the in-memory backend is a thin
+wrapper around plain dicts. The SQLite backend persists records across
+restarts and shares them between app processes. Records read from SQLite
+are copies, so callers must assign a modified record back to save it.
+Read-check-write sequences go through modify, which is atomic per record:
+striped per-key locks in memory, an immediate transaction in SQLite.
+
+Besides point reads, collections answer field lookups, keyset pages and
+ranked full-text searches. The in-memory backend scans for these, since the
+databases keep their own in-process indexes for it. The SQLite backend
+serves them from SQL indexes, so every process sharing the file sees
+other processes' writes.
+"""
+import copy
+import json
+import operator
+import os
+import queue
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, MutableMapping, Optional, Sequence, Set, Tuple, Union
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# A condition on a top-level field, as (field, op, value); "ieq" is case-insensitive equality
+Filter = Tuple[str, str, Any]
+# Score added per record: weight * numeric field, or a score per field value
+Boosts = Mapping[str, Union[float, Mapping[Any, float]]]
+
+_FILTER_OPS = {
+    "eq": (operator.eq, "="),
+    "ne": (operator.ne, "!="),
+    "lt": (operator.lt, "<"),
+    "le": (operator.le, "<="),
+    "gt": (operator.gt, ">"),
+    "ge": (operator.ge, ">="),
+    "ieq": (operator.eq, "="),
+}
+
+def _matches(record: Dict, field: str, value, ignore_case: bool) -> bool:
+    actual = record.get(field)
+    if ignore_case and isinstance(actual, str) and isinstance(value, str):
+        return actual.lower() == value.lower()
+    return actual == value
+
+def matches_filters(record: Dict, filters: Sequence[Filter]) -> bool:
+    """True if the record meets every filter; a missing field meets none, as in SQL"""
+    for field, op, value in filters:
+        actual = record.get(field)
+        if actual is None:
+            return False
+        if op == "ieq":
+            if str(actual).lower() != str(value).lower():
+                return False
+        elif not _FILTER_OPS[op][0](actual, value):
+            return False
+    return True
+
+def boost_score(record: Dict, boosts: Optional[Boosts]) -> float:
+    """The boost part of a record's search score"""
+    score = 0.0
+    for field, boost in (boosts or {}).items():
+        value = record.get(field)
+        if isinstance(boost, Mapping):
+            score += boost.get(value, 0.0)
+        elif isinstance(value, (int, float)):
+            score += boost * value
+    return score
+
+class Collection(MutableMapping):
+    """A named set of JSON-like records keyed by id"""
+
+    @abstractmethod
+    def find(self, field: str, value, ignore_case: bool = False) -> List[Dict]:
+        """Get records whose top-level field equals value"""
+
+    @abstractmethod
+    def seed(self, records: Mapping[str, Dict]) -> bool:
+        """Load records only if the collection is empty, returns True if loaded"""
+
+    @abstractmethod
+    def modify(self, key: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        """Atomically read, change and write back the record at key
+
+        change gets a private copy of the record and returns the record to
+        store, or None to leave it unchanged. It runs while the record is
+        locked, so it must not touch storage itself. Returns the record as
+        stored afterwards, or None (without calling change) if key is missing.
+        """
+
+    def get_many(self, keys: Iterable[str]) -> List[Dict]:
+        """Get the records for keys in order, skipping missing ones"""
+        return [record for record in (self.get(key) for key in keys) if record is not None]
+
+    def count(self, field: str, value) -> int:
+        """Count records whose top-level field equals value"""
+        return len(self.find(field, value))
+
+    def find_page(self, field: str, value, sort_field: str, limit: int,
+                  before: Optional[Tuple[Any, str]] = None) -> List[Dict]:
+        """Get up to limit records whose field equals value, newest (sort_field, key) first
+
+        Pass the (sort value, key) of the last record seen as before to get the next page.
+        """
+        keyed = sorted(((record[sort_field], key), record) for key, record in self.items()
+                       if record.get(field) == value)
+        if before is not None:
+            keyed = [item for item in keyed if item[0] < tuple(before)]
+        return [record for _, record in reversed(keyed[-limit:])] if limit > 0 else []
+
+    def distinct(self, field: str, ignore_case: bool = False) -> Set:
+        """Get the distinct non-null values of a top-level field, lowercased with ignore_case"""
+        values = {record.get(field) for record in self.values()} - {None}
+        return {str(value).lower() for value in values} if ignore_case else values
+
+    def search(self, terms: List[str], fields: Mapping[str, float], filters: Sequence[Filter] = (),
+               boosts: Optional[Boosts] = None, limit: Optional[int] = None, offset: int = 0,
+               prefix: bool = True) -> List[Dict]:
+        """Get records matching any term in fields, best first
+
+        Terms match whole words, or also word prefixes with prefix. Relevance
+        weighs term matches by field; boosts are added to it, and without terms
+        records are ranked on boosts alone. Ties go by key.
+        """
+        scored = []
+        for key, record in self.items():
+            if not matches_filters(record, filters):
+                continue
+            matched, relevance = not terms, 0.0
+            for field, weight in fields.items():
+                value = record.get(field) or ""
+                words = _WORD_RE.findall((" ".join(value) if isinstance(value, list) else str(value)).lower())
+                hits = sum(1 for word in words
+                           if any(word.startswith(term) if prefix else word == term for term in terms))
+                matched = matched or hits > 0
+                relevance += weight * hits
+            if matched:
+                scored.append((-(relevance + boost_score(record, boosts)), key, record))
+        scored.sort(key=lambda item: item[:2])
+        end = None if limit is None else offset + limit
+        return [record for _, _, record in scored[offset:end]]
+
+class Storage(ABC):
+    """A storage backend that hands out collections by name"""
+
+    # True when other processes can write to the same store
+    shared = False
+
+    @abstractmethod
+    def collection(self, name: str) -> Collection:
+        """Get (creating if needed) the collection with this name"""
+
+    def close(self):
+        """Release backend resources"""
+
+# ====================== In-memory backend ======================
+
+class MemoryCollection(Collection):
+    """Collection backed by a plain dict"""
+
+    # Locks for modify, shared by keys that hash alike
+    LOCK_STRIPES = 64
+
+    def __init__(self):
+        self._records: Dict[str, Dict] = {}
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def __getitem__(self, key: str) -> Dict:
+        return self._records[key]
+
+    def __setitem__(self, key: str, record: Dict):
+        self._records[key] = record
+
+    def __delitem__(self, key: str):
+        del self._records[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, key: str, default=None):
+        return self._records.get(key, default)
+
+    def values(self):
+        return self._records.values()
+
+    def items(self):
+        return self._records.items()
+
+    def find(self, field: str, value, ignore_case: bool = False) -> List[Dict]:
+        return [record for record in self._records.values() if _matches(record, field, value, ignore_case)]
+
+    def seed(self, records: Mapping[str, Dict]) -> bool:
+        if self._records:
+            return False
+        self._records.update(records)
+        return True
+
+    def modify(self, key: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        with self._locks[hash(key) % self.LOCK_STRIPES]:
+            record = self._records.get(key)
+            if record is None:
+                return None
+            # Copy on write: readers holding the old record never see a half-applied change
+            updated = change(copy.deepcopy(record))
+            if updated is None:
+                return record
+            self._records[key] = updated
+            return updated
+
+class InMemoryStorage(Storage):
+    """Process-local storage, rebuilt on every start"""
+
+    def __init__(self):
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def collection(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection()
+        return self._collections[name]
+
+# ====================== SQLite backend ======================
+
+class _ConnectionPool:
+    """Fixed-size pool of SQLite connections shared between threads"""
+
+    def __init__(self, path: str, size: int):
+        self._path = path
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._path, timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+
+class SQLiteCollection(Collection):
+    """Collection stored as JSON rows in a shared SQLite table"""
+
+    _GET = "SELECT data FROM records WHERE collection = ? AND key = ?"
+    _UPSERT = ("INSERT INTO records (collection, key, data) VALUES (?, ?, ?) "
+               "ON CONFLICT (collection, key) DO UPDATE SET data = excluded.data")
+    _DELETE = "DELETE FROM records WHERE collection = ? AND key = ?"
+    _KEYS = "SELECT key FROM records WHERE collection = ? ORDER BY key"
+    _ITEMS = "SELECT key, data FROM records WHERE collection = ? ORDER BY key"
+    _COUNT = "SELECT COUNT(*) FROM records WHERE collection = ?"
+    _GET_MANY = ("SELECT r.key, r.data FROM json_each(?2) AS j "
+                 "JOIN records AS r ON r.collection = ?1 AND r.key = j.value")
+
+    def __init__(self, storage: "SQLiteStorage", name: str):
+        self._storage = storage
+        self.name = name
+
+    def __getitem__(self, key: str) -> Dict:
+        with self._storage.pool.connection() as conn:
+            row = conn.execute(self._GET, (self.name, key)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, record: Dict):
+        with self._storage.pool.connection() as conn:
+            conn.execute(self._UPSERT, (self.name, key, _dumps(record)))
+
+    def __delitem__(self, key: str):
+        with self._storage.pool.connection() as conn:
+            if conn.execute(self._DELETE, (self.name, key)).rowcount == 0:
+                raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._storage.pool.connection() as conn:
+            keys = [row[0] for row in conn.execute(self._KEYS, (self.name,))]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self._storage.pool.connection() as conn:
+            return conn.execute(self._COUNT, (self.name,)).fetchone()[0]
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self) -> List[Tuple[str, Dict]]:
+        with self._storage.pool.connection() as conn:
+            return [(key, json.loads(data)) for key, data in conn.execute(self._ITEMS, (self.name,))]
+
+    def values(self) -> List[Dict]:
+        return [record for _, record in self.items()]
+
+    def update(self, records: Mapping[str, Dict] = (), **kwargs):
+        rows = [(self.name, key, _dumps(record)) for key, record in dict(records, **kwargs).items()]
+        with self._storage.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(self._UPSERT, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def get_many(self, keys: Iterable[str]) -> List[Dict]:
+        keys = list(keys)
+        if not keys:
+            return []
+        # One statement for any number of keys: the ids travel as a single JSON array
+        with self._storage.pool.connection() as conn:
+            found = dict(conn.execute(self._GET_MANY, (self.name, json.dumps(keys))))
+        return [json.loads(found[key]) for key in keys if key in found]
+
+    def find(self, field: str, value, ignore_case: bool = False) -> List[Dict]:
+        sql = self._storage.find_statement(self.name, field, ignore_case)
+        if ignore_case and isinstance(value, str):
+            value = value.lower()
+        with self._storage.pool.connection() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, (value,))]
+
+    def count(self, field: str, value) -> int:
+        sql = self._storage.count_statement(self.name, field)
+        with self._storage.pool.connection() as conn:
+            return conn.execute(sql, (value,)).fetchone()[0]
+
+    def find_page(self, field: str, value, sort_field: str, limit: int,
+                  before: Optional[Tuple[Any, str]] = None) -> List[Dict]:
+        sql = self._storage.page_statement(self.name, field, sort_field, before is not None)
+        params = (*(before if before is not None else (None, None)), value, limit)
+        with self._storage.pool.connection() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def distinct(self, field: str, ignore_case: bool = False) -> Set:
+        sql = self._storage.distinct_statement(self.name, field, ignore_case)
+        with self._storage.pool.connection() as conn:
+            return {row[0] for row in conn.execute(sql) if row[0] is not None}
+
+    def search(self, terms: List[str], fields: Mapping[str, float], filters: Sequence[Filter] = (),
+               boosts: Optional[Boosts] = None, limit: Optional[int] = None, offset: int = 0,
+               prefix: bool = True) -> List[Dict]:
+        # Each term as a quoted FTS5 (prefix) query, any of them matching in one of the fields
+        match = " OR ".join(f'"{term}"' + ("*" if prefix else "") for term in terms if _WORD_RE.fullmatch(term))
+        if terms and not match:
+            return []
+        if match:
+            _check_names(*fields)
+            match = f"{{{' '.join(fields)}}} : ({match})"
+        sql = self._storage.search_statement(self.name, fields, [(field, op) for field, op, _ in filters],
+                                             boosts, bool(match))
+        values = [value.lower() if op == "ieq" and isinstance(value, str) else value for _, op, value in filters]
+        params = ([match] if match else []) + values + [-1 if limit is None else limit, offset]
+        with self._storage.pool.connection() as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, params)]
+
+    def modify(self, key: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        with self._storage.pool.connection() as conn:
+            # BEGIN IMMEDIATE takes the database write lock up front, so the read below
+            # cannot go stale before the write, across threads and processes alike
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(self._GET, (self.name, key)).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                record = json.loads(row[0])
+                updated = change(record)
+                if updated is not None:
+                    conn.execute(self._UPSERT, (self.name, key, _dumps(updated)))
+                conn.execute("COMMIT")
+                return updated if updated is not None else json.loads(row[0])
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def seed(self, records: Mapping[str, Dict]) -> bool:
+        rows = [(self.name, key, _dumps(record)) for key, record in records.items()]
+        with self._storage.pool.connection() as conn:
+            # BEGIN IMMEDIATE takes the write lock, so concurrent processes seed at most once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute(self._COUNT, (self.name,)).fetchone()[0]:
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.executemany(self._UPSERT, rows)
+                conn.execute("COMMIT")
+                return True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+class SQLiteStorage(Storage):
+    """Persistent storage in a SQLite database file (WAL mode, pooled connections)"""
+
+    shared = True
+
+    # Secondary lookups served by expression indexes, as (collection, field, ignore_case)
+    INDEXED_FIELDS = [
+        ("orders", "customer_id", False),
+        ("orders", "status", False),
+        ("products", "category", True),
+        ("customers", "email", True),
+        ("returns", "order_id", False),
+        ("returns", "customer_id", False),
+    ]
+    # Keyset pages served by composite indexes, as (collection, field, sort field);
+    # page_statement needs a matching entry since it names the index
+    PAGED_FIELDS = [
+        ("orders", "customer_id", "order_date"),
+    ]
+    # Ranked searches served by an FTS5 table per collection, kept in sync by triggers;
+    # collection -> searchable fields
+    SEARCH_FIELDS = {
+        "products": ["name", "category", "features", "description"],
+    }
+
+    def __init__(self, path: str, pool_size: int = 8):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.pool = _ConnectionPool(path, pool_size)
+        self._collections: Dict[str, SQLiteCollection] = {}
+        self._lock = threading.Lock()
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("""CREATE TABLE IF NOT EXISTS records (
+                    collection TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (collection, key)
+                ) WITHOUT ROWID""")
+                for collection, field, ignore_case in self.INDEXED_FIELDS:
+                    suffix = "_nocase" if ignore_case else ""
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{collection}_{field}{suffix} "
+                                 f"ON records ({_field_sql(field, ignore_case)}) WHERE collection = '{collection}'")
+                for collection, field, sort_field in self.PAGED_FIELDS:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{collection}_{field}_{sort_field} "
+                                 f"ON records ({_field_sql(field)}, {_field_sql(sort_field)}, key) "
+                                 f"WHERE collection = '{collection}'")
+                for collection, fields in self.SEARCH_FIELDS.items():
+                    self._create_search_table(conn, collection, fields)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _create_search_table(conn: sqlite3.Connection, collection: str, fields: List[str]):
+        table = f"fts_{collection}"
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+        if exists:
+            return
+        columns = ", ".join(fields)
+        conn.execute(f"CREATE VIRTUAL TABLE {table} USING fts5(key UNINDEXED, {columns}, tokenize = 'unicode61')")
+        # Triggers keep the search table in step with writes from every process
+        values = ", ".join(_field_sql(field, column="new.data") for field in fields)
+        conn.execute(f"""CREATE TRIGGER {table}_insert AFTER INSERT ON records WHEN new.collection = '{collection}'
+            BEGIN INSERT INTO {table} (key, {columns}) VALUES (new.key, {values}); END""")
+        conn.execute(f"""CREATE TRIGGER {table}_update AFTER UPDATE ON records WHEN new.collection = '{collection}'
+            BEGIN DELETE FROM {table} WHERE key = old.key;
+                  INSERT INTO {table} (key, {columns}) VALUES (new.key, {values}); END""")
+        conn.execute(f"""CREATE TRIGGER {table}_delete AFTER DELETE ON records WHEN old.collection = '{collection}'
+            BEGIN DELETE FROM {table} WHERE key = old.key; END""")
+        conn.execute(f"INSERT INTO {table} (key, {columns}) SELECT key, "
+                     f"{', '.join(_field_sql(field) for field in fields)} FROM records WHERE collection = '{collection}'")
+
+    # Statements inline the collection and field names as literals so SQLite can
+    # match the partial expression indexes; values are always bound parameters
+
+    def find_statement(self, collection: str, field: str, ignore_case: bool = False) -> str:
+        """SQL for an equality lookup on a field, written to match its index"""
+        _check_names(collection, field)
+        return (f"SELECT data FROM records WHERE collection = '{collection}' "
+                f"AND {_field_sql(field, ignore_case)} = ? ORDER BY key")
+
+    def count_statement(self, collection: str, field: str) -> str:
+        """SQL counting the records whose field equals a value"""
+        _check_names(collection, field)
+        return f"SELECT COUNT(*) FROM records WHERE collection = '{collection}' AND {_field_sql(field)} = ?"
+
+    def page_statement(self, collection: str, field: str, sort_field: str, after_cursor: bool) -> str:
+        """SQL for a newest-first keyset page, optionally starting below a (sort value, key) cursor"""
+        _check_names(collection, field, sort_field)
+        sort = _field_sql(sort_field)
+        # Spelled as a range on the sort expression so the cursor seeks into the index
+        cursor = f"AND {sort} <= ?1 AND ({sort} < ?1 OR key < ?2) " if after_cursor else ""
+        return (f"SELECT data FROM records INDEXED BY idx_{collection}_{field}_{sort_field} "
+                f"WHERE collection = '{collection}' AND {_field_sql(field)} = ?3 {cursor}"
+                f"ORDER BY {sort} DESC, key DESC LIMIT ?4")
+
+    def distinct_statement(self, collection: str, field: str, ignore_case: bool = False) -> str:
+        """SQL for the distinct values of a field, skipping through its index when it has one"""
+        _check_names(collection, field)
+        expression = _field_sql(field, ignore_case)
+        if (collection, field, ignore_case) not in self.INDEXED_FIELDS:
+            return f"SELECT DISTINCT {expression} FROM records WHERE collection = '{collection}'"
+        # One index seek per distinct value instead of a scan over every record
+        suffix = "_nocase" if ignore_case else ""
+        source = f"records INDEXED BY idx_{collection}_{field}{suffix} WHERE collection = '{collection}'"
+        return (f"WITH RECURSIVE seen(value) AS (SELECT (SELECT min({expression}) FROM {source}) "
+                f"UNION ALL SELECT (SELECT min({expression}) FROM {source} AND {expression} > seen.value) "
+                f"FROM seen WHERE seen.value IS NOT NULL) SELECT value FROM seen")
+
+    def search_statement(self, collection: str, fields: Mapping[str, float], filters: Sequence[Tuple[str, str]],
+                         boosts: Optional[Boosts], with_terms: bool) -> str:
+        """SQL for a ranked search: FTS5 bm25 relevance over fields plus boosts, filtered and paged
+
+        Parameters are the MATCH query (with_terms only), one value per (field, op)
+        filter, then limit and offset.
+        """
+        searchable = self.SEARCH_FIELDS.get(collection, [])
+        unknown = set(fields) - set(searchable)
+        if unknown:
+            raise ValueError(f"Fields not searchable in {collection}: {', '.join(sorted(unknown))}")
+        _check_names(collection, *(field for field, _ in filters), *(boosts or {}))
+        # Boost weights are part of the statement, so they must be plain literals
+        score = " + ".join(_boost_sql(field, boost) for field, boost in (boosts or {}).items()) or "0"
+        where = "".join(f"AND {_field_sql(field, op == 'ieq')} {_FILTER_OPS[op][1]} ? " for field, op in filters)
+        if not with_terms:
+            return (f"SELECT data, {score} AS score FROM records WHERE collection = '{collection}' {where}"
+                    f"ORDER BY score DESC, key LIMIT ? OFFSET ?")
+        table = f"fts_{collection}"
+        # bm25() is lower for better matches, with one weight per column (key first)
+        weights = ", ".join(repr(float(weight)) for weight in [0.0] + [fields.get(field, 0.0) for field in searchable])
+        # CROSS JOIN keeps the full-text match as the outer loop
+        return (f"SELECT data, {score} - bm25({table}, {weights}) AS score FROM {table} "
+                f"CROSS JOIN records ON records.collection = '{collection}' AND records.key = {table}.key "
+                f"WHERE {table} MATCH ? {where}ORDER BY score DESC, records.key LIMIT ? OFFSET ?")
+
+    def collection(self, name: str) -> SQLiteCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = SQLiteCollection(self, name)
+            return self._collections[name]
+
+    def close(self):
+        self.pool.close()
+
+def _check_names(*names: str):
+    if not all(name.isidentifier() for name in names):
+        raise ValueError(f"Invalid collection or field name: {'.'.join(names)}")
+
+def _field_sql(field: str, ignore_case: bool = False, column: str = "data") -> str:
+    expression = f"json_extract({column}, '$.{field}')"
+    return f"lower({expression})" if ignore_case else expression
+
+def _boost_sql(field: str, boost: Union[float, Mapping[Any, float]]) -> str:
+    if not isinstance(boost, Mapping):
+        return f"{float(boost)!r} * coalesce({_field_sql(field)}, 0)"
+    cases = " ".join(f"WHEN {_literal_sql(value)} THEN {float(score)!r}" for value, score in boost.items())
+    return f"(CASE {_field_sql(field)} {cases} ELSE 0 END)"
+
+def _literal_sql(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(value)
+    raise ValueError(f"Unsupported boost value: {value!r}")
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, separators=(",", ":"))
+
+_default_storage: Optional[Storage] = None
+_default_storage_lock = threading.Lock()
+
+def get_storage() -> Storage:
+    """Get the process-wide storage backend configured by STORAGE_BACKEND"""
+    global _default_storage
+    with _default_storage_lock:
+        if _default_storage is None:
+            backend = os.getenv("STORAGE_BACKEND", "memory").lower()
+            if backend == "sqlite":
+                _default_storage = SQLiteStorage(
+                    os.getenv("SQLITE_PATH", os.path.join("data", "ecommerce.db")),
+                    pool_size=int(os.getenv("SQLITE_POOL_SIZE", "8"))
+                )
+            elif backend == "memory":
+                _default_storage = InMemoryStorage()
+            else:
+                raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+        return _default_storage
@@ -0,0 +1,54 @@
+"""Product updates and the in-memory search indexes"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_databases import MockProductDatabase
+
+
+def test_update_replaces_the_record_and_moves_its_index_entries():
+    product_db = MockProductDatabase()
+    before = product_db.get_product_details("PROD007")
+
+    updated = product_db.update_product("PROD007", {"name": "Shower Radio", "category": "Audio", "rating": 5.0,
+                                                      "description": "Waterproof radio"})
+
+    assert before["name"] == "Bluetooth Speaker"
+    assert updated is not before and updated["name"] == "Shower Radio"
+    assert [p["product_id"] for p in product_db.search_products("radio")] == ["PROD007"]
+    assert "PROD007" not in [p["product_id"] for p in product_db.search_products("speaker")]
+    assert "audio" in product_db.categories()
+    assert product_db.get_recommendations()[0]["product_id"] == "PROD007"
+    assert product_db.update_product("PROD999", {"price": 1.0}) is None
+
+
+def test_searches_during_updates_see_whole_products():
+    product_db = MockProductDatabase()
+    product_db.update_product("PROD001", {"description": "Wireless Headphones"})
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                for product in product_db.search_products("headphones") + product_db.search_products("electronics"):
+                    if product["product_id"] == "PROD001":
+                        assert product["description"] == product["name"]
+                product_db.get_recommendations("Electronics")
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    readers = [threading.Thread(target=search) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(500):
+        name = "Studio Headphones" if i % 2 else "Wireless Headphones"
+        product_db.update_product("PROD001", {"name": name, "description": name, "rating": 4.0 + (i % 10) / 10})
+    stop.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
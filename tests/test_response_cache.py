@@ -0,0 +1,41 @@
+"""Invalidation of cached agent answers"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.agents import AgentAction
+
+from events import change_events
+from mock_databases import MockProductDatabase
+from response_cache import ResponseCache
+
+
+def test_answer_without_ids_is_evicted_by_stock_update_of_looked_up_product():
+    product_db = MockProductDatabase()
+    cache = ResponseCache().subscribe()
+    try:
+        steps = [(AgentAction("product_details", "PROD007", ""), "- Bluetooth Speaker (PROD007) | $34.99 | in stock")]
+        message = "Tell me about your bluetooth speaker"
+        cache.put(message, {"customer_id": "CUST001"}, "The Bluetooth Speaker is $34.99 and waterproof.",
+                  steps=steps)
+        assert cache.get(message, {"customer_id": "CUST001"}) is not None
+
+        product_db.update_product("PROD007", {"stock_count": 0, "availability": "out_of_stock"})
+
+        assert cache.get(message, {"customer_id": "CUST001"}) is None
+    finally:
+        for topic, callback in (("order.updated", cache._on_order_updated),
+                                ("return.updated", cache._on_return_updated),
+                                ("product.updated", cache._on_product_updated),
+                                ("customer.updated", cache._on_customer_updated)):
+            change_events.unsubscribe(topic, callback)
+
+
+def test_search_observation_ids_tag_the_answer():
+    cache = ResponseCache()
+    steps = [(AgentAction("search_products", {"query": "speaker"}, ""),
+              "- Bluetooth Speaker (PROD007) | $34.99\n- Smart Speaker (PROD011) | $59.99")]
+    cache.put("any speakers?", None, "We have a couple of speakers.", steps=steps)
+    cache.invalidate("PROD011")
+    assert cache.get("any speakers?") is None
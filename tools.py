@@ -1,265 +1,502 @@
-"""
-Tool implementations for the e-commerce chatbot
-"""
-from typing import Type, Dict, List, Any, Optional
-import os
-import requests
-from langchain.tools import BaseTool
-from pydantic import BaseModel, Field
-from mock_databases import MockOrderDatabase, MockProductDatabase, MockCustomerDatabase
-
-# Initialize mock databases
-order_db = MockOrderDatabase()
-product_db = MockProductDatabase()
-customer_db = MockCustomerDatabase()
-
-# ====================== Input Schemas ======================
-
-class OrderStatusInput(BaseModel):
-    order_id: str = Field(description="The order ID to check status for")
-
-class OrderCancelInput(BaseModel):
-    order_id: str = Field(description="The order ID to cancel")
-
-class ReturnProcessInput(BaseModel):
-    order_id: str = Field(description="The order ID to process return for")
-    reason: str = Field(description="Reason for return", default="")
-
-class ProductSearchInput(BaseModel):
-    query: str = Field(description="Search query for products")
-    category: Optional[str] = Field(description="Optional category filter", default=None)
-
-class ProductDetailsInput(BaseModel):
-    product_id: str = Field(description="Product ID to get details for")
-
-class CustomerInfoInput(BaseModel):
-    customer_id: Optional[str] = Field(description="Customer ID", default=None)
-    email: Optional[str] = Field(description="Customer email", default=None)
-
-class CustomerOrdersInput(BaseModel):
-    customer_id: str = Field(description="Customer ID to get orders for")
-
-class SearchOrdersByEmailInput(BaseModel):
-    email: str = Field(description="Customer email to search orders")
-
-class UpdatePreferencesInput(BaseModel):
-    customer_id: str = Field(description="Customer ID")
-    preferences: Dict[str, Any] = Field(description="Preferences to update")
-
-class WeatherInput(BaseModel):
-    city: str = Field(description="City name to get weather for")
-
-class RecommendationInput(BaseModel):
-    category: Optional[str] = Field(description="Product category", default=None)
-    weather_condition: Optional[str] = Field(description="Current weather condition", default=None)
-
-# ====================== Tool Implementations ======================
-
-class OrderStatusTool(BaseTool):
-    name : str = "order_status"
-    description : str = "Check the status of an order by order ID.Use this when customers ask about their order status, tracking, or delivery information"
-    args_schema : Type[BaseModel]= OrderStatusInput
-
-    def _run(self, order_id: str) -> str:
-        order = order_db.get_order_status(order_id)
-        if not order:
-            return f"RESULT: Order {order_id} not found. This order ID does not exist in our system. Please verify the order ID or ask the customer for their email to search for orders differently."
-        msg = f"""RESULT: Order Details Found
-Order ID: {order['order_id']}
-Status: {order['status'].title()}
-Order Date: {order['order_date']}
-Total: ${order['total']:.2f}
-Items:"""
-        for item in order['items']:
-            msg += f"\n  - {item['name']} (Qty: {item['quantity']}) - ${item['price']:.2f}"
-        msg += f"\nShipping Address: {order['shipping_address']}"
-        if order.get('tracking_number'):
-            msg += f"\nTracking Number: {order['tracking_number']}"
-        return msg
-
-class OrderCancelTool(BaseTool):
-    name: str  = "cancel_order"
-    description : str = "Cancel an order if it's still possible. Use this when customers want to cancel their orders."
-    args_schema : Type[BaseModel]= OrderCancelInput
-
-    def _run(self, order_id: str) -> str:
-        result = order_db.cancel_order(order_id)
-        return f"RESULT: {result['message']}"
-
-class ReturnProcessTool(BaseTool):
-    name: str  = "process_return"
-    description: str  = "Process a return request for a delivered order. Use this when customers want to return items."
-    args_schema : Type[BaseModel]= ReturnProcessInput
-
-    def _run(self, order_id: str, reason: str = "") -> str:
-        result = order_db.process_return(order_id, reason)
-        return f"RESULT: {result['message']}"
-
-class ProductSearchTool(BaseTool):
-    name: str  = "search_products"
-    description: str  = "Search for products by name or category. Use this when customers are looking for specific products or browsing categories."
-    args_schema: Type[BaseModel] = ProductSearchInput
-
-    def _run(self, query: str, category: Optional[str] = None) -> str:
-        products = product_db.search_products(query, category)
-        if not products:
-            return f"RESULT: No products found for '{query}'" + (f" in category '{category}'" if category else "") + "You might want to try different search terms or browse our categories."
-        result = f"RESULT: Found {len(products)} product(s):\n\n"
-        for p in products:
-            result += f"**{p['name']}** (ID: {p['product_id']})\nCategory: {p['category']}\nPrice: ${p['price']:.2f}\nAvailability: {p['availability'].replace('_', ' ').title()}\nRating: {p['rating']}/5.0\nDescription: {p['description']}\n\n"
-        return result.strip()
-
-class ProductDetailsTool(BaseTool):
-    name : str = "product_details"
-    description: str  = "Get detailed information about a specific product by product ID. Use this when customers need detailed product information."
-    args_schema: Type[BaseModel] = ProductDetailsInput
-
-    def _run(self, product_id: str) -> str:
-        product = product_db.get_product_details(product_id)
-        if not product:
-            return f"RESULT: Product {product_id} not found.This product ID does not exist in our catalog. Please verify the product ID or ask the customer for their email to search for products differently."
-        result = f"""RESULT: Product Details Found
-**{product['name']}** (ID: {product['product_id']})
-Category: {product['category']}
-Price: ${product['price']:.2f}
-Availability: {product['availability'].replace('_', ' ').title()}
-Stock: {product['stock_count']} units
-Rating: {product['rating']}/5.0
-Description: {product['description']}
-
-Features:"""
-        for f in product['features']:
-            result += f"\n  • {f}"
-        return result
-
-class CustomerInfoTool(BaseTool):
-    name : str = "customer_info"
-    description: str  = "Get customer information by customer ID or email. Returns DEFINITIVE result - do not retry if customer not found. Use this if a customer provides customer ID"
-    args_schema: Type[BaseModel] = CustomerInfoInput
-
-    def _run(self, customer_id: Optional[str] = None, email: Optional[str] = None) -> str:
-        customer = None
-        if customer_id:
-            customer = customer_db.get_customer_info(customer_id)
-        elif email:
-            customer = customer_db.get_customer_by_email(email)
-        if not customer:
-            return "RESULT: Customer not found."
-        preferences = customer['preferences']
-        return f"""RESULT: Customer Information
-Name: {customer['name']}
-Email: {customer['email']}
-Phone: {customer['phone']}
-Address: {customer['address']}
-Loyalty Points: {customer['loyalty_points']}
-Tier: {customer['tier']}
-Preferences: Categories - {', '.join(preferences['categories'])}; Brands - {', '.join(preferences['brands'])}; Communication - {preferences['communication']}
-Recent Orders: {', '.join(customer['order_history'])}"""
-
-class CustomerOrdersTool(BaseTool):
-    name : str = "get_customer_orders"
-    description : str = "Get all orders for a customer by customer ID. Use this when customer forgets their order IDs or wants to see all their orders"
-    args_schema : Type[BaseModel]= CustomerOrdersInput
-
-    def _run(self, customer_id: str) -> str:
-        customer = customer_db.get_customer_info(customer_id)
-        if not customer:
-            return f"RESULT: Customer ID {customer_id} not found.Cannot retrieve orders for non-existent customer. Ask customer for email address to search alternatively."
-        orders = customer.get('order_history', [])
-        if not orders:
-            return f"RESULT: No orders found for customer {customer_id}.This customer has not placed any orders yet."
-        result = f"RESULT: Orders for {customer['name']}:\n"
-        for oid in orders:
-            order = order_db.get_order_status(oid)
-            if order:
-                result += f"Order {oid}: {order['status'].title()} - ${order['total']:.2f} (Date: {order['order_date']})\n"
-        return result
-
-class SearchOrdersByEmailTool(BaseTool):
-    name : str = "search_orders_by_email"
-    description : str = "Search for orders using customer email when customer ID lookup fails. Alternative way to find customer orders."
-    args_schema : Type[BaseModel]= SearchOrdersByEmailInput
-
-    def _run(self, email: str) -> str:
-        customer = customer_db.get_customer_by_email(email)
-        if not customer:
-            return f"RESULT: No customer found with email {email}. This email is not registered in our system."
-        orders = customer.get('order_history', [])
-        if not orders:
-            return f"RESULT: Customer with email {email} exists but has no orders yet."
-        result = f"RESULT: Orders for {email}:\n"
-        for oid in orders:
-            order = order_db.get_order_status(oid)
-            if order:
-                result += f"Order {oid}: {order['status'].title()} - ${order['total']:.2f} (Date: {order['order_date']})\n"
-        return result
-
-class UpdatePreferencesTool(BaseTool):
-    name : str = "update_preferences"
-    description : str = "Update customer preferences such as preferred categories, brands, or communication methods."
-    args_schema : Type[BaseModel]= UpdatePreferencesInput
-
-    def _run(self, customer_id: str, preferences: Dict[str, Any]) -> str:
-        result = customer_db.update_preferences(customer_id, preferences)
-        return f"RESULT: {result['message']}"
-
-class WeatherTool(BaseTool):
-    name : str = "get_weather"
-    description: str  = "Get current weather information for a city. MANDATORY: You MUST call this tool for ANY weather-related query, Do NOT provide weather information without calling this tool first. Input should be the location name, if there is no location name retreive the location from the customer info tool, if there is no customer info tool, return a message asking for the location name."
-
-    def _run(self, city: str) -> str:
-        api_key = os.getenv("WEATHER_API_KEY")
-        if not api_key:
-            print("yes")# fallback to mock
-            conditions = ["sunny", "rainy", "cloudy", "stormy"]
-            condition = conditions[hash(city) % len(conditions)]
-            temp = 20 + (hash(city) % 15)
-            return f"RESULT: Weather in {city}: {condition.title()}, {temp}°C."\
-             f"{'Good conditions for shipping.' if condition in ['sunny', 'cloudy'] else 'Potential shipping delays due to weather.'}"
-        
-        try:
-            url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-            r = requests.get(url, timeout=5)
-            data = r.json()
-            weather = data['weather'][0]['description']
-            temp = data['main']['temp']
-            return f"RESULT: Weather in {city}: {weather.title()}, {temp}°C."
-        except Exception as e:
-            return f"RESULT: Failed to retrieve weather. Error: {str(e)}"
-
-    def _run(self, **kwargs) -> str:
-        return "RESULT: Could you please provide more details or clarify your request so I can assist you better?"
-class ProductRecommendationTool(BaseTool):
-    name: str = "product_recommendations"
-    description: str = "Get product recommendations based on category or weather conditions. Use this to suggest products to customers."
-    args_schema: Type[BaseModel] = RecommendationInput
-    
-    def _run(self, category: str = None, weather_condition: str = None) -> str:
-        recommendations = product_db.get_recommendations(category, weather_condition)
-        
-        if not recommendations:
-            return "RESULT: No recommendations available at the moment."
-        
-        result = "RESULT: Here are some recommended products:\n\n"
-        for product in recommendations[:5]:
-            result += f"**{product['name']}** - ${product['price']:.2f}\n"
-            result += f"{product['description']}\n"
-            result += f"Rating: {product['rating']}/5.0\n\n"
-        
-        return result.strip()
-# List of all tools
-def get_tools():
-    return [
-        OrderStatusTool(),
-        OrderCancelTool(),
-        ReturnProcessTool(),
-        ProductSearchTool(),
-        ProductDetailsTool(),
-        CustomerInfoTool(),
-        CustomerOrdersTool(),  # New tool for getting customer orders
-        SearchOrdersByEmailTool(),  # New tool for email-based order search
-        UpdatePreferencesTool(),
-        WeatherTool(),
-        ProductRecommendationTool(),
-       
-    ]
\ No newline at end of file
+"""
+Tool implementations for the e-commerce chatbot
+
+Tool results are fed back into the agent's scratchpad on every later ReAct
+iteration, so they are kept compact: lists show the top results one line
+each with a cursor for more, optional field projection drops what the
+question does not need, and every observation is capped at a per-tool
+token budget (TOOL_TOKEN_CAPS="search_products=200,..." overrides).
+"""
+from typing import Type, Dict, List, Any, Optional, Sequence, Tuple
+import asyncio
+import os
+import re
+from langchain.tools import BaseTool
+from langchain_core.messages import ToolMessage
+from pydantic import BaseModel, Field
+from metrics import estimate_tokens, metrics
+from mock_databases import MockOrderDatabase, MockProductDatabase, MockCustomerDatabase
+from recommender import PersonalizedRecommender
+from storage import get_storage
+from weather import get_weather_client
+
+# Initialize mock databases (STORAGE_BACKEND=sqlite shares them between processes)
+storage = get_storage()
+order_db = MockOrderDatabase(storage)
+product_db = MockProductDatabase(storage)
+customer_db = MockCustomerDatabase(storage)
+# Other processes' writes raise no local events, so shared snapshots also expire
+recommender = PersonalizedRecommender(product_db, order_db, customer_db,
+                                      max_age=float(os.getenv("RECOMMENDER_MAX_AGE", "60")) if storage.shared else None).subscribe()
+
+# ====================== Input Schemas ======================
+
+class OrderStatusInput(BaseModel):
+    order_id: str = Field(description="The order ID to check status for")
+
+IDEMPOTENCY_KEY_DESCRIPTION = "Optional key identifying this request; retrying with the same key returns the first result"
+
+class OrderCancelInput(BaseModel):
+    order_id: str = Field(description="The order ID to cancel")
+    idempotency_key: Optional[str] = Field(description=IDEMPOTENCY_KEY_DESCRIPTION, default=None)
+
+class ReturnProcessInput(BaseModel):
+    order_id: str = Field(description="The order ID to process return for")
+    reason: str = Field(description="Reason for return", default="")
+    idempotency_key: Optional[str] = Field(description=IDEMPOTENCY_KEY_DESCRIPTION, default=None)
+
+class ReturnStatusInput(BaseModel):
+    return_id: Optional[str] = Field(description="The return ID, like RET000012", default=None)
+    order_id: Optional[str] = Field(description="The order ID, to list the returns for that order", default=None)
+
+class ProductSearchInput(BaseModel):
+    query: str = Field(description="Search query for products")
+    category: Optional[str] = Field(description="Optional category filter", default=None)
+    min_price: Optional[float] = Field(description="Optional minimum price", default=None)
+    max_price: Optional[float] = Field(description="Optional maximum price", default=None)
+    in_stock_only: bool = Field(description="Only show products that are in stock", default=False)
+    min_rating: Optional[float] = Field(description="Optional minimum rating out of 5", default=None)
+    fields: Optional[List[str]] = Field(description="Optional product fields to show, e.g. [\"price\", \"rating\"]", default=None)
+    cursor: Optional[str] = Field(description="Cursor from a previous result to get more products", default=None)
+
+class ProductDetailsInput(BaseModel):
+    product_id: str = Field(description="Product ID to get details for")
+    fields: Optional[List[str]] = Field(description="Optional product fields to show, e.g. [\"features\"]", default=None)
+
+class CustomerInfoInput(BaseModel):
+    customer_id: Optional[str] = Field(description="Customer ID", default=None)
+    email: Optional[str] = Field(description="Customer email", default=None)
+
+class CustomerOrdersInput(BaseModel):
+    customer_id: str = Field(description="Customer ID to get orders for")
+    cursor: Optional[str] = Field(description="Cursor from a previous result to get older orders", default=None)
+
+class SearchOrdersByEmailInput(BaseModel):
+    email: str = Field(description="Customer email to search orders")
+    cursor: Optional[str] = Field(description="Cursor from a previous result to get older orders", default=None)
+
+class UpdatePreferencesInput(BaseModel):
+    customer_id: str = Field(description="Customer ID")
+    preferences: Dict[str, Any] = Field(description="Preferences to update: categories (list), brands (list) and/or communication (email, sms, phone or none)")
+
+class WeatherInput(BaseModel):
+    city: str = Field(description="City name to get weather for")
+
+class RecommendationInput(BaseModel):
+    category: Optional[str] = Field(description="Product category", default=None)
+    weather_condition: Optional[str] = Field(description="Current weather condition", default=None)
+    customer_id: Optional[str] = Field(description="Customer ID, to personalize recommendations", default=None)
+
+# ====================== Observation Compaction ======================
+
+ORDERS_PAGE_SIZE = 10
+PRODUCTS_PAGE_SIZE = 5
+
+DEFAULT_TOKEN_CAP = 400
+TOOL_TOKEN_CAPS = {
+    "order_status": 200,
+    "return_status": 250,
+    "search_products": 300,
+    "product_details": 250,
+    "customer_info": 200,
+    "get_customer_orders": 300,
+    "search_orders_by_email": 300,
+    "product_recommendations": 250,
+}
+
+# Product fields in display order, with their compact rendering
+PRODUCT_FIELDS = {
+    "category": lambda p: p["category"],
+    "price": lambda p: f"${p['price']:.2f}",
+    "availability": lambda p: p["availability"].replace("_", " "),
+    "stock_count": lambda p: f"{p['stock_count']} units",
+    "rating": lambda p: f"{p['rating']}/5",
+    "description": lambda p: p["description"],
+    "features": lambda p: ", ".join(p.get("features", [])),
+}
+SEARCH_FIELDS = ["category", "price", "availability", "rating"]
+
+ORDER_ID_RE = re.compile(r"ORD\d+", re.IGNORECASE)
+PRICE_LIMIT_RE = re.compile(r"\b(?P<direction>under|below|less than|cheaper than|over|above|more than)\s+"
+                            r"\$?(?P<price>\d[\d,]*(?:\.\d+)?)", re.IGNORECASE)
+
+def _token_caps() -> Dict[str, int]:
+    caps = dict(TOOL_TOKEN_CAPS)
+    for entry in filter(None, os.getenv("TOOL_TOKEN_CAPS", "").split(",")):
+        name, _, cap = entry.partition("=")
+        caps[name.strip()] = int(cap)
+    return caps
+
+_caps = _token_caps()
+
+def compact_observation(tool_name: str, observation: str) -> str:
+    """Cap an observation at its tool's token budget, cutting at line boundaries"""
+    cap = _caps.get(tool_name, DEFAULT_TOKEN_CAP)
+    tokens = estimate_tokens(observation)
+    if tokens > cap:
+        lines, kept, used = observation.splitlines(), [], 0
+        for line in lines:
+            line_tokens = estimate_tokens(line + "\n")
+            if used + line_tokens > cap - 10:
+                break
+            kept.append(line)
+            used += line_tokens
+        if not kept:
+            kept = [observation[:(cap - 10) * 4]]
+        observation = "\n".join(kept) + f"\n… truncated ({len(lines) - len(kept)} more lines)"
+        metrics.increment(f"tool.truncated.{tool_name}")
+        tokens = estimate_tokens(observation)
+    metrics.increment(f"tool.calls.{tool_name}")
+    metrics.increment(f"tool.observation_tokens.{tool_name}", tokens)
+    return observation
+
+def observation_stats() -> Dict[str, float]:
+    """Mean observation tokens per call, by tool"""
+    counters = metrics.snapshot()["counters"]
+    return {name[len("tool.calls."):]: counters.get(f"tool.observation_tokens.{name[len('tool.calls.'):]}", 0) / calls
+            for name, calls in counters.items() if name.startswith("tool.calls.") and calls}
+
+def _project_fields(fields: Optional[List[str]], default: List[str]) -> List[str]:
+    """Requested product fields in display order, or the default set"""
+    requested = {field.strip().lower() for field in fields or []} & set(PRODUCT_FIELDS)
+    return [field for field in PRODUCT_FIELDS if field in requested] if requested else default
+
+def _format_product_line(product: Dict[str, Any], fields: List[str]) -> str:
+    """One product as a single compact line"""
+    return " | ".join([f"- {product['name']} ({product['product_id']})"]
+                      + [PRODUCT_FIELDS[field](product) for field in fields])
+
+def _extract_price_filters(query: str) -> Tuple[str, Optional[float], Optional[float]]:
+    """Pull "under $100" / "over $50" style price limits out of a search query"""
+    min_price = max_price = None
+    for match in PRICE_LIMIT_RE.finditer(query):
+        price = float(match.group("price").replace(",", ""))
+        if match.group("direction").lower() in ("over", "above", "more than"):
+            min_price = price
+        else:
+            max_price = price
+    return PRICE_LIMIT_RE.sub(" ", query).strip(), min_price, max_price
+
+def _parse_offset(cursor: Optional[str]) -> Optional[int]:
+    """Offset encoded in a list cursor, None if malformed"""
+    if not cursor:
+        return 0
+    return int(cursor) if cursor.strip().isdigit() else None
+
+# ====================== Tool Implementations ======================
+
+class EcommerceTool(BaseTool):
+    """Base for the chatbot's tools: observations are compacted and measured"""
+
+    def run(self, *args: Any, **kwargs: Any) -> Any:
+        with metrics.timer(f"tool.latency.{self.name}"):
+            output = super().run(*args, **kwargs)
+        return self._compacted(output)
+
+    async def arun(self, *args: Any, **kwargs: Any) -> Any:
+        with metrics.timer(f"tool.latency.{self.name}"):
+            output = await super().arun(*args, **kwargs)
+        return self._compacted(output)
+
+    def _compacted(self, output: Any) -> Any:
+        if isinstance(output, ToolMessage) and isinstance(output.content, str):
+            output.content = compact_observation(self.name, output.content)
+            return output
+        return compact_observation(self.name, output) if isinstance(output, str) else output
+
+class DatabaseTool(EcommerceTool):
+    """Base for tools that only read or write the mock databases"""
+
+    async def _arun(self, *args: Any, **kwargs: Any) -> str:
+        # In-memory lookups take microseconds, cheaper inline than a thread hop
+        if not storage.shared:
+            return self._run(*args, **kwargs)
+        return await asyncio.to_thread(self._run, *args, **kwargs)
+
+def _format_order_page(title: str, customer_id: str, cursor: Optional[str], empty: str) -> str:
+    """Fetch and format a page from order_db.get_orders_for_customer"""
+    try:
+        page = order_db.get_orders_for_customer(customer_id, limit=ORDERS_PAGE_SIZE, cursor=cursor)
+    except ValueError as e:
+        if cursor:
+            return f"ERROR: {e}. Call this tool again without a cursor to start from the newest orders."
+        return f"ERROR: {e}"
+    if not page['orders']:
+        return f"RESULT: {empty}"
+    result = f"RESULT: {title}:\n"
+    for order in page['orders']:
+        result += f"Order {order['order_id']}: {order['status'].title()} - ${order['total']:.2f} (Date: {order['order_date']})\n"
+    if page['next_cursor']:
+        result += f"Showing {len(page['orders'])} of {page['total']} orders. Older orders available with cursor: {page['next_cursor']}\n"
+    return result
+
+class OrderStatusTool(DatabaseTool):
+    name : str = "order_status"
+    description : str = "Check the status of an order by order ID.Use this when customers ask about their order status, tracking, or delivery information"
+    args_schema : Type[BaseModel]= OrderStatusInput
+
+    def _run(self, order_id: str) -> str:
+        order = order_db.get_order_status(order_id)
+        if not order:
+            return f"RESULT: Order {order_id} not found. This order ID does not exist in our system. Please verify the order ID or ask the customer for their email to search for orders differently."
+        msg = f"""RESULT: Order Details Found
+Order ID: {order['order_id']}
+Status: {order['status'].title()}
+Order Date: {order['order_date']}
+Total: ${order['total']:.2f}
+Items:"""
+        for item in order['items']:
+            msg += f"\n  - {item['name']} (Qty: {item['quantity']}) - ${item['price']:.2f}"
+        msg += f"\nShipping Address: {order['shipping_address']}"
+        if order.get('tracking_number'):
+            msg += f"\nTracking Number: {order['tracking_number']}"
+        return msg
+
+class OrderCancelTool(DatabaseTool):
+    name: str  = "cancel_order"
+    description : str = "Cancel an order if it's still possible. Use this when customers want to cancel their orders."
+    args_schema : Type[BaseModel]= OrderCancelInput
+
+    def _run(self, order_id: str, idempotency_key: Optional[str] = None) -> str:
+        result = order_db.cancel_order(order_id, idempotency_key)
+        return f"RESULT: {result['message']}"
+
+class ReturnProcessTool(DatabaseTool):
+    name: str  = "process_return"
+    description: str  = "Process a return request for a delivered order. Use this when customers want to return items."
+    args_schema : Type[BaseModel]= ReturnProcessInput
+
+    def _run(self, order_id: str, reason: str = "", idempotency_key: Optional[str] = None) -> str:
+        result = order_db.process_return(order_id, reason, idempotency_key)
+        return f"RESULT: {result['message']}"
+
+def _format_return(record: Dict[str, Any]) -> str:
+    msg = (f"Return {record['return_id']} for order {record['order_id']}: {record['status'].replace('_', ' ').title()} "
+           f"(requested {record['created_at'][:10]}, last update {record['updated_at'][:10]})\n"
+           f"Refund amount: ${record['refund_amount']:.2f}\n")
+    if record.get("reason"):
+        msg += f"Reason: {record['reason']}\n"
+    return msg
+
+class ReturnStatusTool(DatabaseTool):
+    name: str = "return_status"
+    description: str = "Check the status of a return by return ID, or list the returns of an order by order ID. Use this when customers ask about a return they already started, instead of processing it again."
+    args_schema: Type[BaseModel] = ReturnStatusInput
+
+    def _run(self, return_id: Optional[str] = None, order_id: Optional[str] = None) -> str:
+        # A ReAct Action Input is a single string and arrives as return_id, even when it is an order id
+        if return_id and ORDER_ID_RE.fullmatch(return_id.strip()):
+            return_id, order_id = None, return_id
+        if return_id:
+            record = order_db.get_return(return_id.strip().upper())
+            if not record:
+                return f"RESULT: Return {return_id} not found. Please verify the return ID, or look it up by order ID."
+            return "RESULT: " + _format_return(record)
+        if order_id:
+            records = order_db.get_returns_for_order(order_id.strip().upper())
+            if not records:
+                return f"RESULT: No returns found for order {order_id}."
+            return "RESULT: " + "".join(_format_return(record) for record in records)
+        return "RESULT: Please provide a return ID or an order ID."
+
+class ProductSearchTool(DatabaseTool):
+    name: str  = "search_products"
+    description: str  = "Search for products by keywords or category, optionally by price range, stock or minimum rating. Use this when customers are looking for specific products or browsing categories. Shows the best matches first; pass the returned cursor to see more."
+    args_schema: Type[BaseModel] = ProductSearchInput
+
+    def _run(self, query: str, category: Optional[str] = None, min_price: Optional[float] = None,
+             max_price: Optional[float] = None, in_stock_only: bool = False, min_rating: Optional[float] = None,
+             fields: Optional[List[str]] = None, cursor: Optional[str] = None) -> str:
+        offset = _parse_offset(cursor)
+        if offset is None:
+            return f"RESULT: Cursor {cursor} is not valid. Search again without a cursor to start from the first results."
+        terms, query_min, query_max = _extract_price_filters(query)
+        min_price = min_price if min_price is not None else query_min
+        max_price = max_price if max_price is not None else query_max
+        # One extra result tells whether there is a next page
+        products = product_db.search_products(terms, category, min_price=min_price, max_price=max_price,
+                                              in_stock_only=in_stock_only, min_rating=min_rating,
+                                              limit=PRODUCTS_PAGE_SIZE + 1, offset=offset)
+        if not products:
+            if offset:
+                return f"RESULT: No more products found for '{query}'."
+            return f"RESULT: No products found for '{query}'" + (f" in category '{category}'" if category else "") + ". You might want to try different search terms or browse our categories."
+        page = products[:PRODUCTS_PAGE_SIZE]
+        columns = _project_fields(fields, SEARCH_FIELDS)
+        result = f"RESULT: Best matching products {offset + 1}-{offset + len(page)}:\n"
+        result += "\n".join(_format_product_line(p, columns) for p in page)
+        if len(products) > PRODUCTS_PAGE_SIZE:
+            result += f"\nMore available with cursor: {offset + len(page)}"
+        return result
+
+class ProductDetailsTool(DatabaseTool):
+    name : str = "product_details"
+    description: str  = "Get detailed information about a specific product by product ID. Use this when customers need detailed product information."
+    args_schema: Type[BaseModel] = ProductDetailsInput
+
+    def _run(self, product_id: str, fields: Optional[List[str]] = None) -> str:
+        product = product_db.get_product_details(product_id)
+        if not product:
+            return f"RESULT: Product {product_id} not found.This product ID does not exist in our catalog. Please verify the product ID or ask the customer for their email to search for products differently."
+        result = f"RESULT: **{product['name']}** (ID: {product['product_id']})"
+        for field in _project_fields(fields, list(PRODUCT_FIELDS)):
+            result += f"\n{field.replace('_', ' ').title()}: {PRODUCT_FIELDS[field](product)}"
+        return result
+
+class CustomerInfoTool(DatabaseTool):
+    name : str = "customer_info"
+    description: str  = "Get customer information by customer ID or email. Returns DEFINITIVE result - do not retry if customer not found. Use this if a customer provides customer ID"
+    args_schema: Type[BaseModel] = CustomerInfoInput
+
+    def _run(self, customer_id: Optional[str] = None, email: Optional[str] = None) -> str:
+        customer = None
+        if customer_id:
+            customer = customer_db.get_customer_info(customer_id)
+        elif email:
+            customer = customer_db.get_customer_by_email(email)
+        if not customer:
+            return "RESULT: Customer not found."
+        preferences = customer['preferences']
+        return f"""RESULT: Customer Information
+Name: {customer['name']}
+Email: {customer['email']}
+Phone: {customer['phone']}
+Address: {customer['address']}
+Loyalty Points: {customer['loyalty_points']}
+Tier: {customer['tier']}
+Preferences: Categories - {', '.join(preferences['categories'])}; Brands - {', '.join(preferences['brands'])}; Communication - {preferences['communication']}
+Recent Orders: {', '.join(customer['order_history'])}"""
+
+class CustomerOrdersTool(DatabaseTool):
+    name : str = "get_customer_orders"
+    description : str = "Get all orders for a customer by customer ID. Use this when customer forgets their order IDs or wants to see all their orders"
+    args_schema : Type[BaseModel]= CustomerOrdersInput
+
+    def _run(self, customer_id: str, cursor: Optional[str] = None) -> str:
+        customer = customer_db.get_customer_info(customer_id)
+        if not customer:
+            return f"RESULT: Customer ID {customer_id} not found.Cannot retrieve orders for non-existent customer. Ask customer for email address to search alternatively."
+        return _format_order_page(f"Orders for {customer['name']}", customer_id, cursor,
+                                  f"No orders found for customer {customer_id}.This customer has not placed any orders yet.")
+
+class SearchOrdersByEmailTool(DatabaseTool):
+    name : str = "search_orders_by_email"
+    description : str = "Search for orders using customer email when customer ID lookup fails. Alternative way to find customer orders."
+    args_schema : Type[BaseModel]= SearchOrdersByEmailInput
+
+    def _run(self, email: str, cursor: Optional[str] = None) -> str:
+        customer = customer_db.get_customer_by_email(email)
+        if not customer:
+            return f"RESULT: No customer found with email {email}. This email is not registered in our system."
+        return _format_order_page(f"Orders for {email}", customer['customer_id'], cursor,
+                                  f"Customer with email {email} exists but has no orders yet.")
+
+class UpdatePreferencesTool(DatabaseTool):
+    name : str = "update_preferences"
+    description : str = "Update customer preferences such as preferred categories, brands, or communication methods."
+    args_schema : Type[BaseModel]= UpdatePreferencesInput
+
+    def _run(self, customer_id: str, preferences: Dict[str, Any]) -> str:
+        result = customer_db.update_preferences(customer_id, preferences)
+        return f"RESULT: {result['message']}"
+
+def _mock_weather(city: str) -> str:
+    """Deterministic stand-in used when no WEATHER_API_KEY is configured"""
+    conditions = ["sunny", "rainy", "cloudy", "stormy"]
+    condition = conditions[hash(city) % len(conditions)]
+    temp = 20 + (hash(city) % 15)
+    return f"RESULT: Weather in {city}: {condition.title()}, {temp}°C."\
+     f"{'Good conditions for shipping.' if condition in ['sunny', 'cloudy'] else 'Potential shipping delays due to weather.'}"
+
+def _format_weather(city: str, data: Dict[str, Any]) -> str:
+    weather = data['weather'][0]['description']
+    temp = data['main']['temp']
+    return f"RESULT: Weather in {city}: {weather.title()}, {temp}°C."
+
+class WeatherTool(EcommerceTool):
+    name : str = "get_weather"
+    description: str  = "Get current weather information for a city. MANDATORY: You MUST call this tool for ANY weather-related query, Do NOT provide weather information without calling this tool first. Input should be the location name, if there is no location name retreive the location from the customer info tool, if there is no customer info tool, return a message asking for the location name."
+    args_schema: Type[BaseModel] = WeatherInput
+
+    def _run(self, city: str) -> str:
+        client = get_weather_client()
+        if client is None:
+            return _mock_weather(city)
+        
+        try:
+            return _format_weather(city, client.get(city))
+        except Exception as e:
+            return f"RESULT: Failed to retrieve weather. Error: {str(e)}"
+
+    async def _arun(self, city: str) -> str:
+        client = get_weather_client()
+        if client is None:
+            return _mock_weather(city)
+
+        try:
+            return _format_weather(city, await client.aget(city))
+        except Exception as e:
+            return f"RESULT: Failed to retrieve weather. Error: {str(e)}"
+
+class ProductRecommendationTool(DatabaseTool):
+    name: str = "product_recommendations"
+    description: str = "Get product recommendations based on category or weather conditions, personalized when a customer ID is given. Use this to suggest products to customers."
+    args_schema: Type[BaseModel] = RecommendationInput
+    
+    def _run(self, category: str = None, weather_condition: str = None, customer_id: str = None) -> str:
+        recommendations = []
+        # Weather drives the suggestions when given; otherwise use what we know about the customer
+        if customer_id and not weather_condition:
+            recommendations = recommender.recommend(customer_id, PRODUCTS_PAGE_SIZE, category)
+        if not recommendations:
+            recommendations = product_db.get_recommendations(category, weather_condition, limit=PRODUCTS_PAGE_SIZE)
+        
+        if not recommendations:
+            return "RESULT: No recommendations available at the moment."
+        
+        result = "RESULT: Here are some recommended products:\n"
+        result += "\n".join(_format_product_line(product, ["price", "rating", "description"])
+                             for product in recommendations)
+        return result
+# List of all tools
+def get_tools():
+    return [
+        OrderStatusTool(),
+        OrderCancelTool(),
+        ReturnProcessTool(),
+        ReturnStatusTool(),
+        ProductSearchTool(),
+        ProductDetailsTool(),
+        CustomerInfoTool(),
+        CustomerOrdersTool(),  # New tool for getting customer orders
+        SearchOrdersByEmailTool(),  # New tool for email-based order search
+        UpdatePreferencesTool(),
+        WeatherTool(),
+        ProductRecommendationTool(),
+       
+    ]
+
+# Tools that change records; answers from runs that called them must not be replayed
+MUTATING_TOOLS = frozenset({"cancel_order", "process_return", "update_preferences"})
+
+def called_mutating_tool(intermediate_steps: Sequence[Tuple[Any, Any]]) -> bool:
+    """Whether an executor run's intermediate steps include a state-changing tool call"""
+    return any(getattr(action, "tool", None) in MUTATING_TOOLS for action, _ in intermediate_steps)
+
+async def arun_tools(calls: Sequence[Tuple[str, Dict[str, Any]]], tools: Optional[Sequence[BaseTool]] = None,
+                     raise_errors: bool = False) -> List[str]:
+    """Run independent (tool name, input) calls concurrently, results in call order
+
+    A failing call yields an error observation, or raises if raise_errors is set.
+    """
+    by_name = {tool.name: tool for tool in (tools or get_tools())}
+
+    async def run(name: str, tool_input: Dict[str, Any]) -> str:
+        try:
+            return await by_name[name].arun(tool_input)
+        except Exception as e:
+            if raise_errors:
+                raise
+            return f"RESULT: {name} failed. Error: {str(e)}"
+
+    return list(await asyncio.gather(*(run(name, tool_input) for name, tool_input in calls)))
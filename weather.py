@@ -0,0 +1,112 @@
+"""
+OpenWeatherMap client with per-city caching and request coalescing
+
+Weather for a city barely changes within minutes and customers cluster in a
+few cities, so answers are cached per city for a TTL. Concurrent lookups for
+the same city share one in-flight request, and all requests go through one
+keep-alive session. Point WEATHER_API_URL at a local stub server to test it.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+WEATHER_API_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+class WeatherClient:
+    """Cached, coalescing, connection-pooled weather lookups"""
+
+    def __init__(self, api_key: str, base_url: str = WEATHER_API_URL, ttl: float = 600,
+                 max_entries: int = 256, timeout: float = 5, pool_size: int = 10):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+
+    def _fetch(self, city: str) -> Dict[str, Any]:
+        metrics.increment("weather.upstream_request")
+        with metrics.timer("weather.upstream_latency"):
+            r = self.session.get(self.base_url, params={"q": city, "appid": self.api_key, "units": "metric"},
+                                 timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def get(self, city: str) -> Dict[str, Any]:
+        """Get the OpenWeatherMap current-weather payload for a city"""
+        key = " ".join(city.lower().split())
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                metrics.increment("weather.cache_hit")
+                return cached[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if not owner:
+            metrics.increment("weather.coalesced")
+            return future.result(timeout=self.timeout * 2)
+
+        metrics.increment("weather.cache_miss")
+        try:
+            data = self._fetch(city)
+        except Exception as e:
+            # Failures are shared with waiters but never cached
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._in_flight.pop(key, None)
+        future.set_result(data)
+        return data
+
+    async def aget(self, city: str) -> Dict[str, Any]:
+        """Async get, sharing the cache and in-flight requests with sync callers"""
+        return await asyncio.to_thread(self.get, city)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+_weather_client: Optional[WeatherClient] = None
+_weather_client_lock = threading.Lock()
+
+def get_weather_client() -> Optional[WeatherClient]:
+    """Get the process-wide client, or None when WEATHER_API_KEY is not configured"""
+    global _weather_client
+    api_key = os.getenv("WEATHER_API_KEY")
+    if not api_key:
+        return None
+    with _weather_client_lock:
+        if _weather_client is None or _weather_client.api_key != api_key:
+            _weather_client = WeatherClient(
+                api_key,
+                base_url=os.getenv("WEATHER_API_URL", WEATHER_API_URL),
+                ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+                max_entries=int(os.getenv("WEATHER_CACHE_SIZE", "256"))
+            )
+        return _weather_client